@@ -1,10 +1,19 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 import os
+import time
 from collections import defaultdict
-from mpich_parser import MPICHParser
-from hpc_topology import format_id_ranges, format_id_ranges_as_list
+from contextlib import nullcontext
+from mpich_parser import MPICHParser, PARSER_VERSION, LINE_PREFIXES, expand_input_files, parse_shards, add_l3_argument
+from input_formats import FORMATS, parse_runs
+from log_reader import follow_log_lines
+from parse_cache import add_cache_arguments, cache_from_args
+from topology_import import add_topology_argument, topology_from_args
+from profiler import Profiler, add_profile_argument
+from hpc_topology import format_id_ranges_as_list
+from mpich_lint import lint_job
 
 def get_total_cores_per_node(cluster):
     """Calculate the total number of physical cores per node."""
@@ -33,21 +42,19 @@ def count_unique_nics(cluster):
 
 def get_task_cores(task):
     """Get a formatted list of cores used by an MPI task."""
-    cpu_ids = sorted([cpu.id for cpu in task.logical_cpus])
-    return format_id_ranges(cpu_ids)
+    return task.cpu_set.format_ranges()
 
 def get_task_numa_domains(task):
     """Get a list of NUMA domains used by an MPI task."""
-    numa_domains = set()
-    for cpu in task.logical_cpus:
-        numa_domains.add(cpu.core.numa_domain.id)
+    # Intersect the task's CPU bitmask with each NUMA domain's bitmask
+    numa_domains = task.node.get_numa_domains(task.cpu_set)
     
     # No warning here anymore - we only want warnings for NIC-core NUMA mismatches
-    return ", ".join(map(str, sorted(numa_domains)))
+    return ", ".join(str(numa.id) for numa in sorted(numa_domains, key=lambda n: n.id))
 
 def get_cores_count(task):
     """Get the count of logical CPUs used by an MPI task."""
-    return len(task.logical_cpus)
+    return len(task.cpu_set)
 
 def check_nic_numa_mismatch(task, nic):
     """Check if task's selected NIC is on different NUMA domain than its cores.
@@ -66,17 +73,96 @@ def check_nic_numa_mismatch(task, nic):
         return ""
         
     # Get all NUMA domains used by this task's CPUs
-    task_numa_domains = set()
-    for cpu in task.logical_cpus:
-        task_numa_domains.add(cpu.core.numa_domain.id)
+    task_numa_domains = task.node.get_numa_domains(task.cpu_set)
     
     # Check if the NIC's NUMA domain matches any of the task's NUMA domains
-    nic_numa = nic.numa_domain.id
-    if nic_numa not in task_numa_domains:
+    if not any(numa.id == nic.numa_domain.id for numa in task_numa_domains):
         return " *"  # Using simple ASCII character instead of emoji
     
     return ""
 
+def check_l3_split(task):
+    """Check if task's cores span more L3 cache domains (CCDs) than their number requires.
+    
+    The threads of a rank share data through the L3 cache; cores spread over more L3
+    domains than needed (e.g. 4 cores on two 8-core CCDs) split that cache and lose
+    bandwidth. Ranks larger than one L3 domain are only flagged when they could fit
+    in fewer domains.
+    
+    Returns:
+        A warning string if the cores are split, otherwise an empty string.
+    """
+    cache_domains = task.node.get_cache_domains(task.cpu_set)
+    if len(cache_domains) < 2:
+        return ""
+    
+    cores_per_l3 = max(len(cache.cores) for cache in cache_domains)
+    core_count = len({cpu.core.id for cpu in task.logical_cpus})
+    if len(cache_domains) > -(-core_count // cores_per_l3):
+        return " ~"
+    
+    return ""
+
+def count_unique_gpus(cluster):
+    """Count the number of distinct GPU device indices across all nodes."""
+    return len({gpu_id for node in cluster.nodes for gpu_id in node.node_type.gpu_index})
+
+def check_gpu_numa_mismatch(task, nic):
+    """Check if task's GPU, cores and selected NIC are not all on the same NUMA domain.
+    
+    On LUMI-G style nodes each GPU (GCD) is attached to one NUMA domain, next to one
+    NIC. A GPU on another NUMA domain than the rank's cores makes host-device copies
+    cross the Infinity Fabric, and a GPU on another NUMA domain than the NIC does the
+    same for device-to-network (GPU-aware MPI) traffic.
+    
+    Returns:
+        A warning string if there's a mismatch, otherwise an empty string.
+    """
+    if not task.gpus:
+        return ""
+    
+    task_numa_ids = {numa.id for numa in task.node.get_numa_domains(task.cpu_set)}
+    for gpu in task.gpus:
+        gpu_numa_id = gpu.numa_domain.id
+        if task_numa_ids and gpu_numa_id not in task_numa_ids:
+            return " !"
+        if nic and nic.numa_domain.id != gpu_numa_id:
+            return " !"
+    
+    return ""
+
+def format_node_list(node_names, max_names=4):
+    """Format a list of node names, truncated to the first few names."""
+    names = sorted(node_names)
+    if len(names) > max_names:
+        return ", ".join(names[:max_names]) + f", ... ({len(names)} nodes)"
+    return ", ".join(names)
+
+def print_node_classes(cluster):
+    """Print the distinct node layouts (node classes) when the job runs on heterogeneous nodes."""
+    node_classes = cluster.get_node_classes()
+    if len(node_classes) < 2:
+        return
+    
+    print(f"\nNode classes ({len(node_classes)} distinct layouts):")
+    for i, (node_type, nodes) in enumerate(node_classes):
+        nic_count = len(node_type.nic_index)
+        numa_count = len(node_type.numa_domains)
+        print(f"  [{chr(ord('A') + i)}] {numa_count} NUMA domains - {node_type.core_count} cores, "
+              f"{node_type.logical_cpu_count} CPUs, {nic_count} NICs (type {node_type.signature or 'unknown'}): "
+              f"{format_node_list(node.name for node in nodes)}")
+
+def print_settings_findings(cluster, job):
+    """Print the MPICH settings flagged by the lint rules for the shape of this job (nothing when none is)."""
+    findings = lint_job(cluster, job)
+    if not findings:
+        return
+    
+    print("\nMPICH settings warnings:")
+    for finding in findings:
+        print(f"  [{finding.rule}] {finding.setting}: {finding.message}")
+        print(f"      -> {finding.suggestion}")
+
 def truncate_core_list(core_list_str):
     """Truncate a core list string if it exceeds a certain length."""
     max_length = 25  # Increased from 10 to show more of the core list
@@ -85,16 +171,77 @@ def truncate_core_list(core_list_str):
         return core_list_str[:max_length-3] + "..."
     return core_list_str
 
-def generate_table(filename):
-    """Generate a tabular view of the MPI job topology."""
-    # Parse the input file
-    parser = MPICHParser(filename)
-    cluster, job = parser.parse()
+def generate_table(paths, cache=None, jobs=None, profiler=None, input_format=None, cores_per_l3=None, topology=None):
+    """
+    Generate a tabular view of the MPI job topology.
     
+    Args:
+        paths: Output file, or list of the shard files of one MPICH job
+        cache: Optional ParseCache
+        jobs: Number of worker processes used to parse shards and large files
+        profiler: Optional Profiler recording phase times and counters
+        input_format: Name of the input format (default: detected from the file)
+        cores_per_l3: Physical cores per L3 cache domain (default: from the CPU model line)
+        topology: Optional TopologyTemplate giving the node layout (see topology_import)
+    """
+    # Parse the input file(s); a file may hold several runs (e.g. the srun steps of an xthi output)
+    filenames = expand_input_files([paths] if isinstance(paths, str) else paths)
+    if len(filenames) > 1:
+        if input_format not in (None, "mpich"):
+            raise ValueError(f"Only MPICH outputs can be given as shards, not {input_format}")
+        runs = [(None, *parse_shards(filenames, cache=cache, jobs=jobs, profiler=profiler, cores_per_l3=cores_per_l3,
+                                     topology=topology))]
+    else:
+        runs = parse_runs(filenames[0], input_format, cache=cache, jobs=jobs or os.cpu_count() or 1, profiler=profiler,
+                          cores_per_l3=cores_per_l3, topology=topology)
+    
+    if not runs:
+        print(f"No binding information found in {filenames[0]}")
+    for step, (title, cluster, job) in enumerate(runs, 1):
+        if title:
+            print(f"\nStep {step}: {title}")
+        with profiler.phase("render") if profiler else nullcontext():
+            print_table(cluster, job)
+
+def follow_table(filename, poll_interval=2.0, idle_timeout=None, cores_per_l3=None, topology=None):
+    """
+    Follow the output of a running job and redraw the table as lines are appended.
+    
+    Only the new lines are read and tokenized at each poll; the model is rebuilt from
+    the accumulated records and the table is redrawn in place on a terminal.
+    
+    Args:
+        filename: Path to the job output file (it may not exist yet)
+        poll_interval: Seconds between two polls of the file
+        idle_timeout: Stop after this many seconds without new lines (None: until Ctrl-C)
+        cores_per_l3: Physical cores per L3 cache domain (default: from the CPU model line)
+        topology: Optional TopologyTemplate giving the node layout (see topology_import)
+    """
+    parser = MPICHParser(filename, cores_per_l3=cores_per_l3, topology=topology)
+    redraw_in_place = sys.stdout.isatty()
+    try:
+        for lines in follow_log_lines(filename, prefixes=LINE_PREFIXES,
+                                      poll_interval=poll_interval, idle_timeout=idle_timeout):
+            parser.feed(lines)
+            cluster, job = parser.build()
+            if redraw_in_place:
+                # Move the cursor home and clear the screen
+                sys.stdout.write("\033[H\033[2J")
+            print(f"Following {filename}: {len(job.mpi_tasks)} MPI ranks on {len(cluster.nodes)} nodes "
+                  f"(updated {time.strftime('%H:%M:%S')})")
+            print_table(cluster, job)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+def print_table(cluster, job):
+    """Print the tabular view of a parsed cluster and job."""
     # Get summary information
     cores_per_node = get_total_cores_per_node(cluster)
     threads_per_core = get_threads_per_core(cluster)
     nic_count = count_unique_nics(cluster)
+    # The GPU columns are only shown when the output printed GPU bindings
+    has_gpus = any(task.gpu_ids for task in job.mpi_tasks)
     
     # Column definitions with reasonable widths
     columns = [
@@ -105,6 +252,11 @@ def generate_table(filename):
         {"name": "NIC ID", "min_width": 12, "max_width": 12},
         {"name": "NIC NUMA", "min_width": 8, "max_width": 10}
     ]
+    if has_gpus:
+        columns += [
+            {"name": "GPU ID", "min_width": 6, "max_width": 10},
+            {"name": "GPU NUMA", "min_width": 8, "max_width": 10}
+        ]
     
     # Prepare data rows
     rows = []
@@ -116,7 +268,7 @@ def generate_table(filename):
         cores = get_task_cores(task)
         cores_truncated = truncate_core_list(cores)
         cores_count = get_cores_count(task)
-        numa_domains = get_task_numa_domains(task)
+        numa_domains = get_task_numa_domains(task) + check_l3_split(task)
         
         # Get selected NIC for this task (assuming one NIC per task for simplicity)
         selected_nic = task.selected_nics[0] if task.selected_nics else None
@@ -129,6 +281,12 @@ def generate_table(filename):
         
         # Create a row for this task
         row = [node_name, rank, f"{cores_truncated} ({cores_count})", numa_domains, nic_id, nic_numa]
+        
+        # GPUs visible to the task, flagged when their NUMA domain differs from the cores' or the NIC's
+        if has_gpus:
+            gpu_id = ",".join(str(gpu_id) for gpu_id in task.gpu_ids) + check_gpu_numa_mismatch(task, selected_nic)
+            gpu_numa = ",".join(str(gpu.numa_domain.id) for gpu in task.gpus)
+            row += [gpu_id, gpu_numa]
         rows.append(row)
     
     # Calculate column widths based on content and configured min/max widths
@@ -139,13 +297,19 @@ def generate_table(filename):
         # Use the larger of minimum width or max data width, but cap at max_width
         col_widths.append(min(max(col["min_width"], max_data_width), col["max_width"]))
     
-    # Define header groups with proper column spans
+    # Define header groups with proper column spans (some inputs, like xthi outputs, do not print the node layout)
+    if cores_per_node:
+        cores_title = f"{len(cluster.nodes)} x {cores_per_node} cores x {threads_per_core} threads"
+    else:
+        cores_title = f"{len(cluster.nodes)} nodes, layout unknown"
     header_groups = [
         {"title": "Node", "columns": [0]},
         {"title": "MPI", "columns": [1]},
-        {"title": f"{len(cluster.nodes)} x {cores_per_node} cores x {threads_per_core} threads", "columns": [2, 3]},
+        {"title": cores_title, "columns": [2, 3]},
         {"title": f"NIC ({nic_count} avail)", "columns": [4, 5]}
     ]
+    if has_gpus:
+        header_groups.append({"title": f"GPU ({count_unique_gpus(cluster) or '?'} avail)", "columns": [6, 7]})
     
     # Calculate total width of the table
     total_width = sum(col_widths) + len(col_widths) * 3 + 1
@@ -159,21 +323,10 @@ def generate_table(filename):
     parts = []
     parts.append("|")
     
-    # First group - Node
-    node_width = col_widths[0]
-    parts.append(f" {header_groups[0]['title']:{node_width}} |")
-    
-    # Second group - MPI
-    mpi_width = col_widths[1]
-    parts.append(f" {header_groups[1]['title']:{mpi_width}} |")
-    
-    # Third group - Cores and NUMA (spans 2 columns)
-    cores_numa_width = col_widths[2] + col_widths[3] + 3  # +3 for separator and spaces
-    parts.append(f" {header_groups[2]['title']:{cores_numa_width}} |")
-    
-    # Fourth group - NIC (spans 2 columns)
-    nic_width = col_widths[4] + col_widths[5] + 3  # +3 for separator and spaces
-    parts.append(f" {header_groups[3]['title']:{nic_width}} |")
+    # Each group spans its columns and the separators between them (+3 per separator and spaces)
+    for group in header_groups:
+        group_width = sum(col_widths[i] for i in group["columns"]) + 3 * (len(group["columns"]) - 1)
+        parts.append(f" {group['title']:{group_width}} |")
     
     # Join parts without newlines
     header1 = "".join(parts)
@@ -204,21 +357,67 @@ def generate_table(filename):
     # Bottom border
     print(border)
     
-    # Only show legend for NIC-core NUMA mismatches
+    # Only show legend for NIC-core and GPU NUMA mismatches
     has_nic_numa_warnings = any("*" in row[4] for row in rows)
+    has_gpu_numa_warnings = has_gpus and any("!" in row[6] for row in rows)
+    has_l3_warnings = any("~" in row[3] for row in rows)
     
-    if has_nic_numa_warnings:
+    if has_nic_numa_warnings or has_gpu_numa_warnings or has_l3_warnings:
         print("\nLegend:")
+    if has_nic_numa_warnings:
         print("* - MPI task's selected NIC is on a different NUMA domain than its cores (NUMA domain mismatch, potential performance issue)")
+    if has_gpu_numa_warnings:
+        print("! - MPI task's GPU is on a different NUMA domain than its cores or its NIC (traffic crosses the Infinity Fabric)")
+    if has_l3_warnings:
+        print("~ - MPI task's cores span more L3 cache domains (CCDs) than needed (its threads do not share one L3 cache)")
+    
+    # Report the node classes of heterogeneous jobs
+    print_node_classes(cluster)
+    
+    # Report the MPICH settings that are slow for this job shape
+    print_settings_findings(cluster, job)
 
 def main():
     """Main function to parse arguments and generate the table."""
-    if len(sys.argv) < 2:
-        print("Usage: python advisor.py <input_file>")
-        sys.exit(1)
+    arg_parser = argparse.ArgumentParser(description="Tabular view of an MPI job topology with NUMA mismatch warnings.")
+    arg_parser.add_argument("input_files", nargs="+",
+                            help="MPICH output file (plain, .gz, .xz, .bz2 or .zst), or the per-node shards of one job (files or glob)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes used to parse shards and large files (default: number of CPUs)")
+    arg_parser.add_argument("--format", choices=list(FORMATS), default=None,
+                            help="input format (default: detected from the first few KB of the file)")
+    add_l3_argument(arg_parser)
+    add_topology_argument(arg_parser)
+    add_cache_arguments(arg_parser)
+    arg_parser.add_argument("-f", "--follow", action="store_true",
+                            help="follow the output of a running job and update the table as lines are appended")
+    arg_parser.add_argument("--interval", type=float, default=2.0,
+                            help="seconds between two polls in follow mode (default: %(default)s)")
+    arg_parser.add_argument("--idle-timeout", type=float, default=None,
+                            help="in follow mode, stop after this many seconds without new lines (default: run until Ctrl-C)")
+    add_profile_argument(arg_parser)
+    args = arg_parser.parse_args()
+    topology = topology_from_args(args)
     
-    filename = sys.argv[1]
-    generate_table(filename)
+    if args.follow:
+        if args.cache or args.cache_dir or args.profile:
+            arg_parser.error("--cache and --profile cannot be used with --follow")
+        if len(args.input_files) > 1:
+            arg_parser.error("--follow takes a single file")
+        follow_table(args.input_files[0], poll_interval=args.interval, idle_timeout=args.idle_timeout,
+                     cores_per_l3=args.l3_cores, topology=topology)
+        return
+    
+    profiler = None
+    if args.profile:
+        profiler = Profiler(tool="advisor", inputs=args.input_files, parser_version=PARSER_VERSION)
+    try:
+        generate_table(args.input_files, cache=cache_from_args(args, PARSER_VERSION), jobs=args.jobs,
+                       profiler=profiler, input_format=args.format, cores_per_l3=args.l3_cores, topology=topology)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if profiler:
+        profiler.write_json(args.profile)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
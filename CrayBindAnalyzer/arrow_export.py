@@ -0,0 +1,241 @@
+"""
+Export of a parsed job as Arrow tables, written as Parquet or Arrow IPC files.
+
+The tables are normalized like the model: the hardware layout is shared by the
+nodes of a type, so the numa_domains, cpus, nics and gpus tables have one set
+of rows per node type, joined to the nodes on node_type:
+- nodes: node index, name, node_type, ranks
+- numa_domains, cpus, nics, gpus: layout of every node type
+- ranks: node, selected NIC, GPUs, counts and advisor flags of every rank
+- threads: OpenMP threads of every rank with their CPU lists
+- rank_cpus: one (rank, cpu) row per bound CPU
+Every table carries the job id, so the exports of many jobs can be scanned as
+one dataset (e.g. read_parquet('*/ranks.parquet') in DuckDB).
+
+The columns are built as whole arrays from the columnar view of the job
+(job_columns) rather than row by row, and the rank tables are sorted by rank
+so that the row group statistics let readers skip the row groups of a rank
+range. pyarrow (and NumPy) are optional: they are only imported on export.
+"""
+
+import os
+from advisor import check_gpu_numa_mismatch
+from job_columns import job_columns, job_metrics, _numpy
+
+# Names of the exported tables, one file per table
+TABLES = ("nodes", "numa_domains", "cpus", "nics", "gpus", "ranks", "threads", "rank_cpus")
+
+# Output formats: file extension of the tables
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# Rows per Parquet row group (or Arrow record batch): small enough for the row group
+# statistics to skip most of a large table on a filter, large enough to compress well
+ROW_GROUP_SIZE = 128 * 1024
+
+def _pyarrow():
+    """Import pyarrow, with an explicit message when it is not installed."""
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("the Arrow/Parquet export needs pyarrow: install the 'pyarrow' package") from None
+    return pyarrow
+
+def _optional(values):
+    """Arrow array of integer ids where -1 marks a missing id (null)."""
+    pa = _pyarrow()
+    return pa.array(values, mask=values < 0)
+
+def _list_array(offsets, values):
+    """Arrow list<int32> array from the end offsets of each list and the flattened values."""
+    pa = _pyarrow()
+    np = _numpy()
+    return pa.ListArray.from_arrays(pa.array(np.concatenate(([0], offsets)), type=pa.int32()),
+                                    pa.array(values, type=pa.int32()))
+
+def _node_types(cluster, job, columns):
+    """Return the NodeType of each row of the lookup tables of columns (see job_columns)."""
+    nodes = {node.name: node for node in cluster.nodes}
+    nodes.update((task.node.name, task.node) for task in job.mpi_tasks)
+    node_types = {}
+    for name, row in zip(columns.node_names, columns.node_type.tolist()):
+        node_types.setdefault(row, nodes[name].node_type)
+    return [node_types[row] for row in range(len(node_types))]
+
+def _table(job_id, **arrays):
+    """Arrow table of the given columns, preceded by a constant job_id column."""
+    pa = _pyarrow()
+    np = _numpy()
+    row_count = len(next(iter(arrays.values()))) if arrays else 0
+    arrays = {'job_id': np.full(row_count, job_id, dtype=np.int64), **arrays}
+    return pa.table(arrays)
+
+def layout_tables(cluster, job, columns):
+    """
+    Build the nodes, numa_domains, cpus, nics and gpus tables of a job.
+
+    Args:
+        cluster: Cluster of the job
+        job: Job
+        columns: JobColumns of the job
+
+    Returns:
+        A dictionary of table name -> pyarrow.Table
+    """
+    pa = _pyarrow()
+    np = _numpy()
+    node_types = _node_types(cluster, job, columns)
+
+    # The layout objects are few (a few hundred per node type): their columns are gathered in lists
+    numa_rows = [(row, numa) for row, layout in enumerate(node_types) for numa in layout.numa_domains]
+    nic_rows = [(row, numa, nic) for row, numa in numa_rows for nic in numa.nics]
+    gpu_rows = [(row, numa, gpu) for row, numa in numa_rows for gpu in numa.gpus]
+
+    type_rows, cpu_ids = np.nonzero(columns.cpu_numa >= 0)
+    return {
+        'nodes': _table(job.id,
+                        node=np.arange(len(columns.node_names), dtype=np.int32),
+                        name=columns.node_names,
+                        node_type=columns.node_type,
+                        ranks=np.bincount(columns.rank_node, minlength=len(columns.node_names)).astype(np.int32)),
+        'numa_domains': _table(job.id,
+                               node_type=pa.array([row for row, _ in numa_rows], type=pa.int32()),
+                               numa=pa.array([numa.id for _, numa in numa_rows], type=pa.int32()),
+                               cores=pa.array([numa.get_core_count() for _, numa in numa_rows], type=pa.int32()),
+                               cpus=pa.array([numa.get_logical_cpu_count() for _, numa in numa_rows], type=pa.int32()),
+                               l3_domains=pa.array([len(numa.cache_domains) for _, numa in numa_rows], type=pa.int32())),
+        'cpus': _table(job.id,
+                       node_type=type_rows.astype(np.int32),
+                       cpu=cpu_ids.astype(np.int32),
+                       core=columns.cpu_core[type_rows, cpu_ids],
+                       numa=columns.cpu_numa[type_rows, cpu_ids],
+                       l3=_optional(columns.cpu_l3[type_rows, cpu_ids])),
+        'nics': _table(job.id,
+                       node_type=pa.array([row for row, _, _ in nic_rows], type=pa.int32()),
+                       nic=pa.array([nic.id for _, _, nic in nic_rows], type=pa.string()),
+                       numa=pa.array([numa.id for _, numa, _ in nic_rows], type=pa.int32()),
+                       address=pa.array([nic.address for _, _, nic in nic_rows], type=pa.string())),
+        'gpus': _table(job.id,
+                       node_type=pa.array([row for row, _, _ in gpu_rows], type=pa.int32()),
+                       gpu=pa.array([gpu.id for _, _, gpu in gpu_rows], type=pa.int32()),
+                       numa=pa.array([numa.id for _, numa, _ in gpu_rows], type=pa.int32()),
+                       bus_id=pa.array([gpu.bus_id for _, _, gpu in gpu_rows], type=pa.string())),
+    }
+
+def rank_tables(job, columns, metrics):
+    """
+    Build the ranks, threads and rank_cpus tables of a job, sorted by rank.
+
+    Args:
+        job: Job
+        columns: JobColumns of the job
+        metrics: Metrics of the job (see job_metrics)
+
+    Returns:
+        A dictionary of table name -> pyarrow.Table
+    """
+    pa = _pyarrow()
+    np = _numpy()
+    order = np.argsort(columns.rank_ids, kind='stable')
+    tasks = [job.mpi_tasks[index] for index in order.tolist()]
+    rank_ids = columns.rank_ids[order]
+    rank_node = columns.rank_node[order]
+    rank_nic = columns.rank_nic[order]
+
+    # The node and NIC names are dictionary encoded: one string per node or NIC, an index per rank
+    node_names = pa.DictionaryArray.from_arrays(pa.array(rank_node), pa.array(columns.node_names, type=pa.string()))
+    nic_names = pa.DictionaryArray.from_arrays(_optional(rank_nic), pa.array(columns.nic_names, type=pa.string()))
+    has_nic = rank_nic >= 0
+    nic_numa = np.full(len(tasks), -1, dtype=np.int32)
+    nic_numa[has_nic] = columns.nic_numa[columns.node_type[rank_node[has_nic]], rank_nic[has_nic]]
+
+    gpu_counts = np.fromiter((len(task.gpu_ids) for task in tasks), dtype=np.int64, count=len(tasks))
+    thread_counts = np.fromiter((len(task.openmp_threads) for task in tasks), dtype=np.int64, count=len(tasks))
+    gpu_mismatch = np.fromiter((bool(check_gpu_numa_mismatch(task, task.selected_nics[0] if task.selected_nics else None))
+                                for task in tasks), dtype=bool, count=len(tasks))
+
+    ranks = _table(job.id,
+                   rank=rank_ids,
+                   node=rank_node,
+                   node_name=node_names,
+                   cpus=metrics['cpus'][order].astype(np.int32),
+                   cores=metrics['cores'][order].astype(np.int32),
+                   numa_domains=metrics['numa_domains'][order].astype(np.int32),
+                   l3_domains=metrics['l3_domains'][order].astype(np.int32),
+                   nic=nic_names,
+                   nic_numa=_optional(nic_numa),
+                   gpus=_list_array(np.cumsum(gpu_counts),
+                                    np.fromiter((gpu_id for task in tasks for gpu_id in task.gpu_ids),
+                                                dtype=np.int32, count=int(gpu_counts.sum()))),
+                   threads=thread_counts.astype(np.int32),
+                   unbound=metrics['unbound'][order],
+                   multi_numa=metrics['multi_numa'][order],
+                   l3_split=metrics['l3_split'][order],
+                   nic_mismatch=metrics['nic_mismatch'][order],
+                   gpu_mismatch=gpu_mismatch,
+                   shared_cpus=metrics['shared_cpus'][order])
+
+    # The thread CPUs come from their bitmasks (cpu_set), which are known even when the output
+    # prints no node layout and logical_cpus is empty; they are unpacked at once as in job_columns
+    threads = [thread for task in tasks for thread in task.openmp_threads]
+    cpu_count = max([columns.rank_cpus.shape[1]] + [thread.cpu_set.mask.bit_length() for thread in threads])
+    mask_bytes = (cpu_count + 7) // 8
+    packed = np.frombuffer(b''.join(thread.cpu_set.mask.to_bytes(mask_bytes, 'little') for thread in threads),
+                           dtype=np.uint8).reshape(len(threads), mask_bytes)
+    thread_rows, thread_cpus = np.nonzero(np.unpackbits(packed, axis=1, count=cpu_count, bitorder='little'))
+    threads_table = _table(job.id,
+                           rank=np.repeat(rank_ids, thread_counts),
+                           thread=np.fromiter((thread.id for thread in threads), dtype=np.int32, count=len(threads)),
+                           cpus=_list_array(np.cumsum(np.bincount(thread_rows, minlength=len(threads))), thread_cpus))
+
+    rows, cpu_ids = np.nonzero(columns.rank_cpus[order])
+    rank_cpus = _table(job.id, rank=rank_ids[rows], cpu=cpu_ids.astype(np.int32))
+    return {'ranks': ranks, 'threads': threads_table, 'rank_cpus': rank_cpus}
+
+def job_tables(cluster, job):
+    """
+    Build all the exported tables of a parsed job (see TABLES).
+
+    Args:
+        cluster: Cluster of the job
+        job: Job
+
+    Returns:
+        A dictionary of table name -> pyarrow.Table, in the order of TABLES
+    """
+    columns = job_columns(cluster, job)
+    tables = layout_tables(cluster, job, columns)
+    tables.update(rank_tables(job, columns, job_metrics(columns)))
+    return {name: tables[name] for name in TABLES}
+
+def write_tables(tables, directory, export_format="parquet", metadata=None):
+    """
+    Write tables to one file per table (<directory>/<name>.parquet or .arrow).
+
+    Args:
+        tables: Dictionary of table name -> pyarrow.Table
+        directory: Output directory, created if needed
+        export_format: "parquet" (zstd compressed) or "arrow" (Arrow IPC file, readable with memory mapping)
+        metadata: Optional dictionary of strings stored in the schema of every table
+
+    Returns:
+        The list of the written file paths
+    """
+    pa = _pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        if metadata:
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+        path = os.path.join(directory, name + EXPORT_FORMATS[export_format])
+        if export_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        else:
+            with pa.ipc.new_file(path, table.schema) as writer:
+                writer.write_table(table, max_chunksize=ROW_GROUP_SIZE)
+        paths.append(path)
+    return paths
+
+def export_job(cluster, job, directory, export_format="parquet", metadata=None):
+    """Build the tables of a parsed job and write them to a directory (see job_tables and write_tables)."""
+    return write_tables(job_tables(cluster, job), directory, export_format, metadata)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Batch analysis of a directory of job outputs (any format of input_formats).
+
+The files are parsed and checked in a pool of worker processes. Each worker
+returns a small JobResult (counts and rank ids, no topology objects) so that
+little data crosses process boundaries, and the main process writes a single
+aggregated report.
+"""
+
+import argparse
+import glob
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from mpich_parser import PARSER_VERSION
+from input_formats import parse_runs
+from parse_cache import add_cache_arguments, cache_from_args
+from topology_import import add_topology_argument, topology_from_args
+from hpc_topology import format_id_ranges
+from advisor import check_nic_numa_mismatch, check_gpu_numa_mismatch, check_l3_split
+from mpich_lint import lint_job
+
+@dataclass(slots=True)
+class JobResult:
+    """Compact result of the analysis of one job output."""
+    filename: str
+    job_id: int = 0
+    node_count: int = 0
+    rank_count: int = 0
+    node_class_count: int = 0
+    cpus_per_rank: Counter = field(default_factory=Counter)   # CPU count -> number of ranks
+    nic_mismatch_ranks: list = field(default_factory=list)    # ranks whose NIC is on another NUMA domain
+    gpu_mismatch_ranks: list = field(default_factory=list)    # ranks whose GPU is not on the NUMA domain of their cores and NIC
+    multi_numa_ranks: list = field(default_factory=list)      # ranks spanning several NUMA domains
+    l3_split_ranks: list = field(default_factory=list)        # ranks spanning more L3 cache domains than needed
+    unbound_ranks: list = field(default_factory=list)         # ranks without any known CPU
+    settings_findings: list = field(default_factory=list)     # names of the MPICH setting rules flagged (mpich_lint)
+    error: str = ""
+
+def analyze_file(filename, cache=None, topology=None):
+    """
+    Parse one output file (any registered input format) and run the advisor checks on it.
+
+    Runs in a worker process; errors are returned in the result instead of raised
+    so that one bad file does not stop the batch.
+
+    Args:
+        filename: Path to the output file
+        cache: Optional ParseCache
+        topology: Optional TopologyTemplate giving the node layout (see topology_import)
+
+    Returns:
+        A list of JobResult, one per run of the file (e.g. per srun step of an xthi output)
+    """
+    try:
+        runs = parse_runs(filename, cache=cache, topology=topology)
+    except Exception as e:
+        return [JobResult(filename=filename, error=f"{type(e).__name__}: {e}")]
+    if not runs:
+        return [JobResult(filename=filename)]
+    if len(runs) == 1:
+        return [analyze_run(filename, *runs[0][1:])]
+    return [analyze_run(f"{filename} [step {step}]", cluster, job)
+            for step, (_, cluster, job) in enumerate(runs, 1)]
+
+def analyze_run(label, cluster, job):
+    """Run the advisor checks on one parsed run and return its JobResult."""
+    result = JobResult(filename=label)
+    result.job_id = job.id
+    result.node_count = len(cluster.nodes)
+    result.rank_count = len(job.mpi_tasks)
+    result.node_class_count = len(cluster.get_node_classes())
+
+    for task in job.mpi_tasks:
+        cpu_count = len(task.cpu_set)
+        result.cpus_per_rank[cpu_count] += 1
+        if not cpu_count:
+            result.unbound_ranks.append(task.id)
+            continue
+        if len(task.node.get_numa_domains(task.cpu_set)) > 1:
+            result.multi_numa_ranks.append(task.id)
+        if check_l3_split(task):
+            result.l3_split_ranks.append(task.id)
+        selected_nic = task.selected_nics[0] if task.selected_nics else None
+        if check_nic_numa_mismatch(task, selected_nic):
+            result.nic_mismatch_ranks.append(task.id)
+        if check_gpu_numa_mismatch(task, selected_nic):
+            result.gpu_mismatch_ranks.append(task.id)
+    result.settings_findings = [finding.rule for finding in lint_job(cluster, job)]
+    return result
+
+def collect_files(paths, pattern):
+    """
+    Expand the input paths into a sorted list of files.
+
+    Args:
+        paths: Files and directories given on the command line
+        pattern: Glob pattern selecting the files inside directories
+
+    Returns:
+        A sorted list of file paths
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(f for f in glob.glob(os.path.join(path, pattern)) if os.path.isfile(f))
+        else:
+            files.add(path)
+    return sorted(files)
+
+def run_batch(files, jobs=None, cache=None, topology=None):
+    """
+    Analyze files in parallel.
+
+    Args:
+        files: List of file paths
+        jobs: Number of worker processes (default: number of CPUs)
+        cache: Optional ParseCache shared by the workers (safe for concurrent processes, see parse_cache;
+               a cache failure falls back to parsing and is never reported as a file error)
+        topology: Optional TopologyTemplate of the nodes of every job
+
+    Returns:
+        The list of JobResult, in the order of the files (and of the runs in each file)
+    """
+    # Every worker loads and stores its own files in the shared cache directory
+    worker = partial(analyze_file, cache=cache, topology=topology)
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2:
+        file_results = [worker(filename) for filename in files]
+    else:
+        # Send the files in chunks to amortize the inter-process communication
+        chunksize = max(1, len(files) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            file_results = list(executor.map(worker, files, chunksize=chunksize))
+    return [result for results in file_results for result in results]
+
+def format_cpus_per_rank(cpus_per_rank):
+    """Format a CPU count histogram, e.g. "8 CPUs x 120, 16 CPUs x 8"."""
+    return ", ".join(f"{cpus} CPUs x {count}" for cpus, count in sorted(cpus_per_rank.items()))
+
+def write_report(results, out):
+    """
+    Write the aggregated report of a batch.
+
+    Args:
+        results: List of JobResult
+        out: Text file object
+    """
+    parsed = [r for r in results if not r.error and r.rank_count]
+    empty = [r for r in results if not r.error and not r.rank_count]
+    errors = [r for r in results if r.error]
+
+    out.write(f"Batch analysis of {len(results)} runs (files, or srun steps of multi-step outputs): {len(parsed)} jobs, "
+              f"{len(empty)} without MPI ranks, {len(errors)} errors\n")
+
+    sections = [
+        ("NIC/NUMA mismatches (selected NIC on another NUMA domain than the rank's cores)", "nic_mismatch_ranks"),
+        ("GPU/NUMA mismatches (GPU on another NUMA domain than the rank's cores or NIC)", "gpu_mismatch_ranks"),
+        ("Ranks spanning several NUMA domains", "multi_numa_ranks"),
+        ("Ranks split across L3 cache domains (CCDs) they could fit in fewer of", "l3_split_ranks"),
+        ("Ranks without CPU binding information", "unbound_ranks"),
+    ]
+    for title, attribute in sections:
+        flagged = [r for r in parsed if getattr(r, attribute)]
+        out.write(f"\n{title}: {len(flagged)} jobs\n")
+        for r in flagged:
+            ranks = getattr(r, attribute)
+            out.write(f"  {r.filename}: ranks {format_id_ranges(ranks)} ({len(ranks)} of {r.rank_count})\n")
+
+    flagged = [r for r in parsed if r.settings_findings]
+    out.write(f"\nMPICH settings flagged for the job shape: {len(flagged)} jobs\n")
+    for r in flagged:
+        out.write(f"  {r.filename}: {', '.join(r.settings_findings)}\n")
+
+    out.write("\nCPUs per rank:\n")
+    if parsed:
+        name_width = max(len(r.filename) for r in parsed)
+        for r in parsed:
+            classes = f", {r.node_class_count} node classes" if r.node_class_count > 1 else ""
+            out.write(f"  {r.filename:{name_width}}  {r.rank_count:6} ranks on {r.node_count:5} nodes{classes}: "
+                      f"{format_cpus_per_rank(r.cpus_per_rank)}\n")
+
+    total = Counter()
+    for r in parsed:
+        total.update(r.cpus_per_rank)
+    if total:
+        out.write(f"  All jobs: {format_cpus_per_rank(total)}\n")
+
+    if empty:
+        out.write(f"\nFiles without MPI ranks ({len(empty)}):\n")
+        for r in empty:
+            out.write(f"  {r.filename}\n")
+
+    if errors:
+        out.write(f"\nErrors ({len(errors)}):\n")
+        for r in errors:
+            out.write(f"  {r.filename}: {r.error}\n")
+
+def main():
+    """Main function to parse arguments and run the batch analysis."""
+    arg_parser = argparse.ArgumentParser(description="Analyze many job output files in parallel and write one report.")
+    arg_parser.add_argument("paths", nargs="+", help="output files or directories containing them")
+    arg_parser.add_argument("--pattern", default="*", help="glob pattern of the files inside directories (default: %(default)s)")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    arg_parser.add_argument("-o", "--output", default=None, help="write the report to this file (default: standard output)")
+    add_topology_argument(arg_parser)
+    add_cache_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    files = collect_files(args.paths, args.pattern)
+    if not files:
+        print("Error: no input files found")
+        sys.exit(1)
+
+    results = run_batch(files, jobs=args.jobs, cache=cache_from_args(args, PARSER_VERSION),
+                        topology=topology_from_args(args))
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            write_report(results, out)
+    else:
+        write_report(results, sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the parser and the advisor on synthetic job outputs.
+
+For each job size, a synthetic output is generated (see generate_output.py) and
+three phases are measured separately:
+- parse:  tokenizing the file into records (MPICHParser.scan)
+- build:  assembling the Cluster/Job model from the records (MPICHParser.build)
+- render: rendering the advisor table (advisor.print_table)
+
+Wall times are the best of several runs; the peak memory of the whole pipeline
+is measured with tracemalloc in a separate run so that tracing does not skew the
+timings. Results can be saved as JSON and compared with a baseline to catch
+regressions.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from mpich_parser import MPICHParser
+from advisor import print_table
+from generate_output import generate_output
+
+PHASES = ("parse", "build", "render")
+
+# Time differences below this are measurement noise, never reported as regressions
+MIN_TIME_DELTA = 0.005
+
+def run_pipeline(filename):
+    """
+    Parse, build and render one file.
+
+    Returns:
+        A dictionary phase -> wall time in seconds
+    """
+    timings = {}
+    start = time.perf_counter()
+    parser = MPICHParser(filename)
+    parser.scan()
+    timings["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cluster, job = parser.build()
+    timings["build"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        print_table(cluster, job)
+    timings["render"] = time.perf_counter() - start
+    return timings
+
+def measure_peak_memory(filename):
+    """Return the peak traced memory (bytes) of the whole pipeline on one file."""
+    tracemalloc.start()
+    try:
+        run_pipeline(filename)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+def benchmark_size(nodes, ranks_per_node, threads_per_rank, repeat, directory):
+    """
+    Generate an output for one job size and benchmark it.
+
+    Returns:
+        A dictionary with the job size, the file size, the best time of each phase
+        and the peak memory
+    """
+    filename = os.path.join(directory, f"bench-{nodes}.out")
+    with open(filename, 'w') as out:
+        generate_output(out, nodes=nodes, ranks_per_node=ranks_per_node, threads_per_rank=threads_per_rank)
+
+    best = {phase: float('inf') for phase in PHASES}
+    for _ in range(repeat):
+        for phase, seconds in run_pipeline(filename).items():
+            best[phase] = min(best[phase], seconds)
+
+    result = {
+        "nodes": nodes,
+        "ranks": nodes * ranks_per_node,
+        "file_bytes": os.path.getsize(filename),
+        "peak_bytes": measure_peak_memory(filename),
+    }
+    result.update({f"{phase}_s": best[phase] for phase in PHASES})
+    os.unlink(filename)
+    return result
+
+def print_results(results):
+    """Print the benchmark results as a table."""
+    print(f"{'Nodes':>7} {'Ranks':>8} {'File MB':>8} {'Parse s':>9} {'Build s':>9} {'Render s':>9} {'Total s':>9} {'Peak MB':>8}")
+    for r in results:
+        total = sum(r[f"{phase}_s"] for phase in PHASES)
+        print(f"{r['nodes']:>7} {r['ranks']:>8} {r['file_bytes'] / 1e6:>8.1f} {r['parse_s']:>9.4f} {r['build_s']:>9.4f} "
+              f"{r['render_s']:>9.4f} {total:>9.4f} {r['peak_bytes'] / 1e6:>8.1f}")
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Compare results with a baseline run of the same sizes.
+
+    Args:
+        results: List of result dictionaries
+        baseline: List of result dictionaries loaded from a previous JSON file
+        tolerance: Allowed relative slowdown (or memory growth), e.g. 0.25 for 25%
+
+    Returns:
+        A list of regression messages (empty when there is none)
+    """
+    regressions = []
+    baseline_by_nodes = {r["nodes"]: r for r in baseline}
+    for r in results:
+        reference = baseline_by_nodes.get(r["nodes"])
+        if reference is None:
+            continue
+        for metric in [f"{phase}_s" for phase in PHASES] + ["peak_bytes"]:
+            if metric.endswith("_s") and r[metric] - reference[metric] < MIN_TIME_DELTA:
+                continue
+            if reference[metric] > 0 and r[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{r['nodes']} nodes: {metric} {reference[metric]:.4g} -> {r[metric]:.4g} "
+                                   f"(+{(r[metric] / reference[metric] - 1) * 100:.0f}%)")
+    return regressions
+
+def main():
+    """Main function to parse arguments and run the benchmark."""
+    arg_parser = argparse.ArgumentParser(description="Benchmark the parser and the advisor on synthetic job outputs.")
+    arg_parser.add_argument("--sizes", default="2,16,128,1024,10000",
+                            help="comma-separated numbers of nodes (default: %(default)s)")
+    arg_parser.add_argument("--ranks-per-node", type=int, default=8, help="MPI ranks per node (default: %(default)s)")
+    arg_parser.add_argument("--threads-per-rank", type=int, default=2, help="OpenMP threads per rank (default: %(default)s)")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs per size, the best time is kept (default: %(default)s)")
+    arg_parser.add_argument("--json", default=None, help="save the results to this JSON file")
+    arg_parser.add_argument("--baseline", default=None, help="compare with the results saved in this JSON file")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="allowed relative regression against the baseline (default: %(default)s)")
+    args = arg_parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="craybind-bench-") as directory:
+        for nodes in sizes:
+            results.append(benchmark_size(nodes, args.ranks_per_node, args.threads_per_rank, args.repeat, directory))
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"\nNo regression against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Binding diff between two runs of a job (e.g. before and after a Slurm, CPE or
+environment change).
+
+The ranks of the two runs are aligned on their MPI rank id. For every rank the
+CPU set (compared as bitmasks), the NUMA domains, the selected NIC, the visible
+GPUs and the node (by its order in the job, node names change between
+allocations) are compared, and the ranks with the same change are grouped: a
+change applied to the whole job prints a few lines whatever the number of
+ranks. The MPICH settings and the advisor flags of the two runs are compared
+as well.
+"""
+
+import argparse
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from advisor import check_nic_numa_mismatch, check_gpu_numa_mismatch, check_l3_split
+from batch import format_cpus_per_rank
+from hpc_topology import CpuSet, format_id_ranges
+from input_formats import FORMATS, parse_runs
+from job_columns import truncate_ranges
+from mpich_parser import PARSER_VERSION, add_l3_argument
+from parse_cache import add_cache_arguments, cache_from_args
+from topology_import import add_topology_argument, topology_from_args
+
+# Distinct CPU set changes printed per group of identical shape changes
+MAX_EXAMPLES = 3
+
+# Advisor flags compared between the runs (names as in fleet_index), with their titles
+FLAG_TITLES = {
+    'nic-mismatch': "NIC/NUMA mismatches",
+    'gpu-mismatch': "GPU/NUMA mismatches",
+    'multi-numa': "Ranks spanning several NUMA domains",
+    'l3-split': "Ranks split across L3 cache domains",
+    'unbound': "Ranks without CPU binding",
+}
+
+# Value shown for a setting printed by one run only
+UNSET = object()
+
+@dataclass(slots=True)
+class RankBinding:
+    """Binding of one rank, in a form compared between runs."""
+    node: int           # Index of the node of the rank, in order of first appearance in the job
+    cpu_mask: int       # Bound CPUs (see CpuSet)
+    cores: int          # Number of physical cores of the bound CPUs, None when the node layout is unknown
+    numa: tuple         # Sorted NUMA domain ids of the bound CPUs
+    nic: str            # Selected NIC, or None
+    gpus: tuple         # Visible GPU device indices
+    flags: frozenset    # Advisor flags raised for the rank (keys of FLAG_TITLES)
+
+@dataclass(slots=True)
+class BindingDiff:
+    """Differences between two runs; rank changes are grouped by identical change."""
+    old_ranks: int = 0
+    new_ranks: int = 0
+    old_only: list = field(default_factory=list)      # ranks of the old run only
+    new_only: list = field(default_factory=list)      # ranks of the new run only
+    shape: list = field(default_factory=list)         # (title, old value, new value) of the job shape changes
+    cpus: dict = field(default_factory=dict)          # (old shape, new shape) -> {(old mask, new mask): [ranks]}
+    numa: dict = field(default_factory=dict)          # (old NUMA ids, new NUMA ids) -> [ranks]
+    nics: dict = field(default_factory=dict)          # (old NIC, new NIC) -> [ranks]
+    gpus: dict = field(default_factory=dict)          # (old GPUs, new GPUs) -> [ranks]
+    nodes: list = field(default_factory=list)         # ranks placed on another node (by node order)
+    flags: dict = field(default_factory=dict)         # flag -> (old count, new count, fixed ranks, new ranks)
+    settings: list = field(default_factory=list)      # (name, old value, new value), UNSET when not printed
+
+    def is_empty(self):
+        """Return True when the runs have the same bindings and settings."""
+        return not (self.old_only or self.new_only or self.shape or self.cpus or self.numa or self.nics or
+                    self.gpus or self.nodes or self.settings or
+                    any(fixed or new for _, _, fixed, new in self.flags.values()))
+
+def rank_bindings(job):
+    """
+    Return the binding of every rank of a job.
+
+    Returns:
+        A dictionary rank id -> RankBinding
+    """
+    node_index = {}
+    bindings = {}
+    for task in job.mpi_tasks:
+        node = node_index.setdefault(task.node.name, len(node_index))
+        selected_nic = task.selected_nics[0] if task.selected_nics else None
+        flags = set()
+        if not task.cpu_set:
+            flags.add('unbound')
+            numa_ids = ()
+        else:
+            numa_ids = tuple(sorted(numa.id for numa in task.node.get_numa_domains(task.cpu_set)))
+            if len(numa_ids) > 1:
+                flags.add('multi-numa')
+            if check_l3_split(task):
+                flags.add('l3-split')
+            if check_nic_numa_mismatch(task, selected_nic):
+                flags.add('nic-mismatch')
+            if check_gpu_numa_mismatch(task, selected_nic):
+                flags.add('gpu-mismatch')
+        bindings[task.id] = RankBinding(
+            node=node,
+            cpu_mask=task.cpu_set.mask,
+            cores=len({cpu.core.id for cpu in task.logical_cpus}) if task.node.get_logical_cpu_count() else None,
+            numa=numa_ids,
+            nic=selected_nic.id if selected_nic else None,
+            gpus=tuple(task.gpu_ids),
+            flags=frozenset(flags),
+        )
+    return bindings
+
+def cpu_shape(binding):
+    """Size of the CPU set of a rank: (CPUs, cores, NUMA domains), without cores and NUMA domains if unknown."""
+    if binding.cores is None:
+        return (binding.cpu_mask.bit_count(),)
+    return binding.cpu_mask.bit_count(), binding.cores, len(binding.numa)
+
+def _shape_lines(old_cluster, old_job, new_cluster, new_job):
+    """Return the (title, old, new) job shape values that differ between the runs."""
+    def ranks_per_node(job):
+        counts = Counter(task.node.name for task in job.mpi_tasks).values()
+        return f"{min(counts)}-{max(counts)}" if counts and min(counts) != max(counts) else str(max(counts, default=0))
+
+    values = [
+        ("Nodes", len(old_cluster.nodes), len(new_cluster.nodes)),
+        ("Node types", len(old_cluster.get_node_classes()), len(new_cluster.get_node_classes())),
+        ("Ranks", len(old_job.mpi_tasks), len(new_job.mpi_tasks)),
+        ("Ranks per node", ranks_per_node(old_job), ranks_per_node(new_job)),
+        ("CPUs per rank", format_cpus_per_rank(Counter(len(task.cpu_set) for task in old_job.mpi_tasks)),
+         format_cpus_per_rank(Counter(len(task.cpu_set) for task in new_job.mpi_tasks))),
+        ("OpenMP threads", old_job.total_threads, new_job.total_threads),
+    ]
+    return [(title, old, new) for title, old, new in values if old != new]
+
+def diff_runs(old_run, new_run):
+    """
+    Compare the bindings and settings of two runs.
+
+    Args:
+        old_run: (cluster, job) of the reference run
+        new_run: (cluster, job) of the compared run
+
+    Returns:
+        A BindingDiff
+    """
+    (old_cluster, old_job), (new_cluster, new_job) = old_run, new_run
+    old_bindings = rank_bindings(old_job)
+    new_bindings = rank_bindings(new_job)
+    diff = BindingDiff(old_ranks=len(old_bindings), new_ranks=len(new_bindings))
+    diff.old_only = sorted(old_bindings.keys() - new_bindings.keys())
+    diff.new_only = sorted(new_bindings.keys() - old_bindings.keys())
+    diff.shape = _shape_lines(old_cluster, old_job, new_cluster, new_job)
+
+    flag_changes = {flag: ([], []) for flag in FLAG_TITLES}
+    for rank in sorted(old_bindings.keys() & new_bindings.keys()):
+        old, new = old_bindings[rank], new_bindings[rank]
+        if old.cpu_mask != new.cpu_mask:
+            diff.cpus.setdefault((cpu_shape(old), cpu_shape(new)), {}).setdefault(
+                (old.cpu_mask, new.cpu_mask), []).append(rank)
+        if old.numa != new.numa:
+            diff.numa.setdefault((old.numa, new.numa), []).append(rank)
+        if old.nic != new.nic:
+            diff.nics.setdefault((old.nic, new.nic), []).append(rank)
+        if old.gpus != new.gpus:
+            diff.gpus.setdefault((old.gpus, new.gpus), []).append(rank)
+        if old.node != new.node:
+            diff.nodes.append(rank)
+        if old.flags != new.flags:
+            for flag in old.flags - new.flags:
+                flag_changes[flag][0].append(rank)
+            for flag in new.flags - old.flags:
+                flag_changes[flag][1].append(rank)
+
+    for flag, (fixed, new) in flag_changes.items():
+        old_count = sum(flag in binding.flags for binding in old_bindings.values())
+        new_count = sum(flag in binding.flags for binding in new_bindings.values())
+        if old_count or new_count:
+            diff.flags[flag] = (old_count, new_count, fixed, new)
+
+    old_settings, new_settings = old_job.mpich_settings, new_job.mpich_settings
+    diff.settings = [(name, old_settings.get(name, UNSET), new_settings.get(name, UNSET))
+                     for name in sorted(old_settings.keys() | new_settings.keys())
+                     if old_settings.get(name, UNSET) != new_settings.get(name, UNSET)]
+    return diff
+
+def format_ranks(ranks):
+    """Format a sorted list of ranks as ranges, or as a strided range (e.g. "0-9992 every 8")."""
+    if len(ranks) > 2:
+        stride = ranks[1] - ranks[0]
+        if stride > 1 and all(b - a == stride for a, b in zip(ranks, ranks[1:])):
+            return f"{ranks[0]}-{ranks[-1]} every {stride}"
+    return truncate_ranges(format_id_ranges(ranks))
+
+def format_setting(value):
+    """Format a typed MPICH setting (see mpich_env) as printed by MPICH_ENV_DISPLAY."""
+    if value is UNSET:
+        return "(not printed)"
+    if value is None:
+        return "(empty)"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, tuple):
+        return f"{value[0]}-{value[1]}"
+    return str(value)
+
+def _plural(count, noun):
+    return f"{count} {noun}{'s' if count != 1 else ''}"
+
+def _format_shape(shape):
+    if len(shape) == 1:
+        return _plural(shape[0], "CPU")
+    cpus, cores, numa_domains = shape
+    return f"{_plural(cpus, 'CPU')} on {_plural(cores, 'core')}, {_plural(numa_domains, 'NUMA domain')}"
+
+def _format_ids(ids, empty="none"):
+    return ",".join(map(str, ids)) if ids else empty
+
+def _print_groups(title, groups, format_key, total):
+    """Print groups of ranks with the same change, the largest groups first."""
+    changed = sum(len(ranks) for ranks in groups.values())
+    print(f"\n{title}: {changed} of {total} ranks")
+    for key, ranks in sorted(groups.items(), key=lambda item: (-len(item[1]), item[1][0])):
+        print(f"  {format_key(key)}: {_plural(len(ranks), 'rank')} ({format_ranks(ranks)})")
+
+def print_diff(diff, old_label, new_label):
+    """Print a BindingDiff, grouped by identical change."""
+    print(f"Binding diff: {old_label} ({diff.old_ranks} ranks) -> {new_label} ({diff.new_ranks} ranks)")
+    if diff.is_empty():
+        print("\nNo difference in the bindings, the advisor flags and the MPICH settings")
+        return
+    common = diff.old_ranks - len(diff.old_only)
+
+    if diff.shape:
+        print("\nJob shape:")
+        for title, old, new in diff.shape:
+            print(f"  {title}: {old} -> {new}")
+    if diff.old_only:
+        print(f"\nRanks of the old run only: {len(diff.old_only)} ({format_ranks(diff.old_only)})")
+    if diff.new_only:
+        print(f"\nRanks of the new run only: {len(diff.new_only)} ({format_ranks(diff.new_only)})")
+    if diff.nodes:
+        print(f"\nRanks placed on another node (by node order in the job): {len(diff.nodes)} of {common} "
+              f"({format_ranks(diff.nodes)})")
+
+    if diff.cpus:
+        changed = sum(len(ranks) for pairs in diff.cpus.values() for ranks in pairs.values())
+        print(f"\nCPU sets changed: {changed} of {common} ranks")
+        for (old_shape, new_shape), pairs in sorted(diff.cpus.items(),
+                                                    key=lambda item: -sum(map(len, item[1].values()))):
+            ranks = sorted(rank for pair_ranks in pairs.values() for rank in pair_ranks)
+            same = " (same size)" if old_shape == new_shape else ""
+            print(f"  {_format_shape(old_shape)} -> {_format_shape(new_shape)}{same}: "
+                  f"{_plural(len(ranks), 'rank')} ({format_ranks(ranks)})")
+            examples = sorted(pairs.items(), key=lambda item: item[1][0])
+            for (old_mask, new_mask), pair_ranks in examples[:MAX_EXAMPLES]:
+                old_cpus, new_cpus = CpuSet(old_mask), CpuSet(new_mask)
+                # For overlapping sets, the number of CPUs removed and added
+                moved = [f"-{len(old_cpus - new_cpus)}" if old_cpus - new_cpus else "",
+                         f"+{len(new_cpus - old_cpus)}" if new_cpus - old_cpus else ""]
+                moved = f"; {' '.join(part for part in moved if part)} CPUs" if old_mask & new_mask else ""
+                print(f"    {old_cpus.format_ranges() or 'none'} -> {new_cpus.format_ranges() or 'none'}{moved}: "
+                      f"ranks {format_ranks(pair_ranks)}")
+            if len(examples) > MAX_EXAMPLES:
+                print(f"    ... {len(examples) - MAX_EXAMPLES} more distinct CPU set changes")
+
+    if diff.numa:
+        _print_groups("NUMA domains changed", diff.numa,
+                      lambda key: f"{_format_ids(key[0])} -> {_format_ids(key[1])}", common)
+    if diff.nics:
+        _print_groups("NIC selection changed", diff.nics, lambda key: f"{key[0] or 'none'} -> {key[1] or 'none'}", common)
+    if diff.gpus:
+        _print_groups("GPU selection changed", diff.gpus,
+                      lambda key: f"{_format_ids(key[0])} -> {_format_ids(key[1])}", common)
+
+    if any(old != new or fixed or new_ranks for old, new, fixed, new_ranks in diff.flags.values()):
+        print("\nAdvisor flags:")
+        for flag, (old, new, fixed, new_ranks) in diff.flags.items():
+            details = [f"fixed on {format_ranks(fixed)}" if fixed else "",
+                       f"new on {format_ranks(new_ranks)}" if new_ranks else ""]
+            details = "; ".join(detail for detail in details if detail)
+            print(f"  {FLAG_TITLES[flag]}: {old} -> {new} ranks{f' ({details})' if details else ''}")
+
+    if diff.settings:
+        print("\nMPICH settings changed:")
+        width = max(len(name) for name, _, _ in diff.settings)
+        for name, old, new in diff.settings:
+            print(f"  {name:{width}}  {format_setting(old)} -> {format_setting(new)}")
+
+def select_run(filename, step, input_format, **options):
+    """Parse a file and return the (cluster, job) of one of its runs (1-based step)."""
+    runs = parse_runs(filename, input_format, **options)
+    if not 1 <= step <= len(runs):
+        raise ValueError(f"{filename} has {len(runs)} run(s), no step {step}")
+    return runs[step - 1][1:]
+
+def main():
+    """Main function to parse arguments and print the binding diff of two runs."""
+    arg_parser = argparse.ArgumentParser(description="Compare the bindings and MPICH settings of two runs of a job.")
+    arg_parser.add_argument("old_file", help="output of the reference run (any format of input_formats)")
+    arg_parser.add_argument("new_file", help="output of the compared run")
+    arg_parser.add_argument("--format", choices=list(FORMATS), default=None,
+                            help="input format (default: detected from the first few KB of each file)")
+    arg_parser.add_argument("--old-step", type=int, default=1, help="run of the old file to compare, for multi-step outputs (default: %(default)s)")
+    arg_parser.add_argument("--new-step", type=int, default=1, help="run of the new file to compare (default: %(default)s)")
+    add_l3_argument(arg_parser)
+    add_topology_argument(arg_parser)
+    add_cache_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    options = dict(cache=cache_from_args(args, PARSER_VERSION), cores_per_l3=args.l3_cores,
+                   topology=topology_from_args(args))
+    try:
+        old_run = select_run(args.old_file, args.old_step, args.format, **options)
+        new_run = select_run(args.new_file, args.new_step, args.format, **options)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print_diff(diff_runs(old_run, new_run), args.old_file, args.new_file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Cache geometry of the CPU models found on Cray EX nodes.
+
+MPICH prints the processor of PE 0 as "AMD Trento (25:48:1) (family:model:stepping)".
+The family and model identify the core generation, and with it the number of
+cores sharing one L3 cache (a CCX on Rome, a CCD on Milan and later), which the
+parser uses to add the cache domain level of the node layout.
+"""
+
+from dataclasses import dataclass
+
+@dataclass(frozen=True, slots=True)
+class CpuModel:
+    """A CPU model and the number of physical cores sharing each of its L3 caches."""
+    name: str
+    cores_per_l3: int
+
+# (family, model) -> CpuModel, as printed by MPICH in decimal
+CPU_MODELS = {
+    (23, 49): CpuModel("AMD Rome", 4),         # Zen 2: 4 cores per CCX
+    (25, 1): CpuModel("AMD Milan", 8),         # Zen 3: 8 cores per CCD (LUMI-C)
+    (25, 48): CpuModel("AMD Trento", 8),       # Zen 3: 8 cores per CCD (LUMI-G)
+    (25, 17): CpuModel("AMD Genoa", 8),        # Zen 4
+    (25, 160): CpuModel("AMD Bergamo", 16),    # Zen 4c
+}
+
+def lookup_cpu_model(family, model):
+    """Return the CpuModel of a family/model pair, or None when it is not known."""
+    return CPU_MODELS.get((family, model))
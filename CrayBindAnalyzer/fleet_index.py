@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+SQLite index of analysed jobs, to query a whole fleet of job outputs without parsing them again.
+
+The ingest command parses job outputs (any format of input_formats) in worker
+processes, like batch.py, and stores one row per job and per rank:
+- files: path, size, modification time and content digest of every ingested file
+- jobs: one row per job (or srun step), with the number of flagged ranks per check
+- ranks: node, CPU list, NUMA domains, selected NIC and flags of every rank
+- settings: the typed MPICH settings of the job (see mpich_env)
+Ingest is incremental: files whose size and modification time are unchanged (or
+whose content is unchanged) are skipped, changed files are indexed again, and
+files that failed to parse or have no MPI ranks are remembered until they change.
+
+Jobs carry no date in their output, so the time of a job is the modification
+time of its file (the end of the job for a Slurm output).
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import NamedTuple
+from advisor import check_nic_numa_mismatch, check_gpu_numa_mismatch, check_l3_split
+from batch import collect_files
+from hpc_topology import format_id_ranges
+from input_formats import parse_runs
+from mpich_env import parse_setting_value
+from mpich_parser import PARSER_VERSION
+from parse_cache import add_cache_arguments, cache_from_args, file_digest
+from topology_import import add_topology_argument, topology_from_args
+
+# Version of the database layout (PRAGMA user_version); an index of another version must be rebuilt
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    indexed_at REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    step INTEGER NOT NULL,
+    title TEXT,
+    job_id INTEGER NOT NULL,
+    job_time REAL NOT NULL,
+    node_count INTEGER NOT NULL,
+    rank_count INTEGER NOT NULL,
+    nic_mismatch_ranks INTEGER NOT NULL,
+    gpu_mismatch_ranks INTEGER NOT NULL,
+    multi_numa_ranks INTEGER NOT NULL,
+    l3_split_ranks INTEGER NOT NULL,
+    unbound_ranks INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ranks (
+    job INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    rank INTEGER NOT NULL,
+    node TEXT NOT NULL,
+    cpus TEXT NOT NULL,
+    cpu_count INTEGER NOT NULL,
+    numa TEXT NOT NULL,
+    nic TEXT,
+    nic_numa INTEGER,
+    gpus TEXT,
+    nic_mismatch INTEGER NOT NULL,
+    gpu_mismatch INTEGER NOT NULL,
+    l3_split INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    job INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value,
+    PRIMARY KEY (job, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_file ON jobs(file_id);
+CREATE INDEX IF NOT EXISTS jobs_time ON jobs(job_time);
+CREATE INDEX IF NOT EXISTS jobs_job_id ON jobs(job_id);
+-- Not unique: a job output may print the same rank twice (e.g. a restarted rank)
+CREATE INDEX IF NOT EXISTS ranks_job ON ranks(job, rank);
+CREATE INDEX IF NOT EXISTS ranks_node ON ranks(node);
+CREATE INDEX IF NOT EXISTS settings_name ON settings(name, value);
+"""
+
+# Per-job counters that can be used as query filters: option value -> jobs column
+FLAGS = {
+    'nic-mismatch': 'nic_mismatch_ranks',
+    'gpu-mismatch': 'gpu_mismatch_ranks',
+    'multi-numa': 'multi_numa_ranks',
+    'l3-split': 'l3_split_ranks',
+    'unbound': 'unbound_ranks',
+}
+
+# Condition on the ranks table selecting the ranks counted by each per-job counter (listed by --ranks)
+RANK_FLAGS = {
+    'nic-mismatch': "nic_mismatch",
+    'gpu-mismatch': "gpu_mismatch",
+    'multi-numa': "numa LIKE '%,%'",
+    'l3-split': "l3_split",
+    'unbound': "cpu_count = 0",
+}
+
+class RankRow(NamedTuple):
+    """Row of the ranks table (without its job column), as built by the workers."""
+    rank: int
+    node: str
+    cpus: str               # CPU list, e.g. "0-7,64-71"
+    cpu_count: int          # 0 for an unbound rank
+    numa: str               # NUMA domains of the CPUs, e.g. "0,1"
+    nic: str                # selected NIC, or None
+    nic_numa: int           # NUMA domain of the selected NIC, or None
+    gpus: str               # GPU ids, or None
+    nic_mismatch: int
+    gpu_mismatch: int
+    l3_split: int
+
+def open_index(filename):
+    """
+    Open (creating it if needed) a fleet index.
+
+    Args:
+        filename: Path to the SQLite database
+
+    Returns:
+        A sqlite3.Connection
+    """
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA journal_mode = WAL")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    tables = connection.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+    if tables and version != SCHEMA_VERSION:
+        connection.close()
+        raise ValueError(f"{filename} is an index of version {version}, expected {SCHEMA_VERSION}: delete it and ingest again")
+    connection.executescript(SCHEMA)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+def sql_value(value):
+    """Convert a typed MPICH setting (see mpich_env) to a value SQLite stores and compares as is."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, tuple):
+        return f"{value[0]}-{value[1]}"
+    return value
+
+def rank_rows(cluster, job):
+    """
+    Return the rows of the ranks of one job.
+
+    Returns:
+        A list of RankRow
+    """
+    rows = []
+    for task in job.mpi_tasks:
+        selected_nic = task.selected_nics[0] if task.selected_nics else None
+        numa_ids = sorted(numa.id for numa in task.node.get_numa_domains(task.cpu_set))
+        bound = bool(task.cpu_set)
+        rows.append(RankRow(
+            task.id,
+            task.node.name,
+            task.cpu_set.format_ranges(","),
+            len(task.cpu_set),
+            ",".join(map(str, numa_ids)),
+            selected_nic.id if selected_nic else None,
+            selected_nic.numa_domain.id if selected_nic else None,
+            ",".join(map(str, task.gpu_ids)) or None,
+            # Unbound ranks are only counted as unbound, as in the batch report
+            int(bound and bool(check_nic_numa_mismatch(task, selected_nic))),
+            int(bound and bool(check_gpu_numa_mismatch(task, selected_nic))),
+            int(bound and bool(check_l3_split(task))),
+        ))
+    return rows
+
+# Error recorded for a file that parses but has no MPI ranks (e.g. a README in an ingested directory)
+NO_RANKS_ERROR = "no MPI ranks"
+
+def analyze_file(filename, cache=None, topology=None):
+    """
+    Parse one output file and return the rows to index, as plain data.
+
+    Runs in a worker process; errors are returned instead of raised so that one bad
+    file does not stop the ingest. Runs without MPI ranks are left out, and a file
+    without any is returned with the error NO_RANKS_ERROR and no jobs.
+
+    Args:
+        filename: Path to the output file
+        cache: Optional ParseCache
+        topology: Optional TopologyTemplate of the nodes
+
+    Returns:
+        A tuple (filename, digest, jobs, error) where jobs is a list of
+        (step, title, job_id, node_count, settings, RankRow list) tuples
+    """
+    try:
+        digest = file_digest(filename)
+        runs = parse_runs(filename, cache=cache, topology=topology)
+    except Exception as e:
+        return filename, "", [], f"{type(e).__name__}: {e}"
+    jobs = []
+    for step, (title, cluster, job) in enumerate(runs, 1):
+        if not job.mpi_tasks:
+            continue
+        settings = [(name, sql_value(value)) for name, value in job.mpich_settings.items()]
+        jobs.append((step, title, job.id, len(cluster.nodes), settings, rank_rows(cluster, job)))
+    if not jobs:
+        return filename, digest, [], NO_RANKS_ERROR
+    return filename, digest, jobs, None
+
+def _stale_files(connection, files):
+    """
+    Return the files that need indexing: new files, and files changed since they were indexed.
+
+    A file whose size or modification time changed but whose content did not is only
+    refreshed in the index. A file that cannot be read (e.g. missing) is returned too,
+    so that its error is recorded by the ingest.
+    """
+    indexed = {path: (size, mtime_ns, digest, version)
+               for path, size, mtime_ns, digest, version in
+               connection.execute("SELECT path, size, mtime_ns, digest, parser_version FROM files")}
+    stale = []
+    for filename in files:
+        path = os.path.realpath(filename)
+        entry = indexed.get(path)
+        try:
+            st = os.stat(path)
+            if entry is None or entry[3] != PARSER_VERSION:
+                stale.append(path)
+            elif entry[:2] != (st.st_size, st.st_mtime_ns):
+                if file_digest(path) == entry[2]:
+                    connection.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                                       (st.st_size, st.st_mtime_ns, path))
+                else:
+                    stale.append(path)
+        except OSError:
+            stale.append(path)
+    return stale
+
+def _store_file(connection, filename, digest, jobs, error):
+    """
+    Replace the index entries of one file by its newly parsed jobs (one transaction).
+
+    A file that can no longer be read (e.g. deleted since it was parsed) is stored as
+    an errored file without jobs, with a size of -1 and no digest so that it is indexed
+    again once it can be read.
+
+    Returns:
+        The error recorded for the file, or None
+    """
+    try:
+        st = os.stat(filename)
+        size, mtime_ns, mtime = st.st_size, st.st_mtime_ns, st.st_mtime
+    except OSError as e:
+        size, mtime_ns, mtime, digest = -1, 0, 0.0, ""
+        error = error or f"{type(e).__name__}: {e}"
+        jobs = []
+    with connection:
+        # Deleting the file removes its jobs, ranks and settings (ON DELETE CASCADE)
+        connection.execute("DELETE FROM files WHERE path = ?", (filename,))
+        file_id = connection.execute(
+            "INSERT INTO files (path, size, mtime_ns, digest, parser_version, indexed_at, error) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (filename, size, mtime_ns, digest, PARSER_VERSION, time.time(), error)).lastrowid
+        for step, title, job_id, node_count, settings, ranks in jobs:
+            job_row = connection.execute(
+                "INSERT INTO jobs (file_id, step, title, job_id, job_time, node_count, rank_count, nic_mismatch_ranks, "
+                "gpu_mismatch_ranks, multi_numa_ranks, l3_split_ranks, unbound_ranks) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (file_id, step, title, job_id, mtime, node_count, len(ranks),
+                 sum(row.nic_mismatch for row in ranks), sum(row.gpu_mismatch for row in ranks),
+                 sum(',' in row.numa for row in ranks), sum(row.l3_split for row in ranks),
+                 sum(not row.cpu_count for row in ranks))).lastrowid
+            connection.executemany("INSERT INTO ranks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   ((job_row, *row) for row in ranks))
+            connection.executemany("INSERT INTO settings VALUES (?, ?, ?)",
+                                   ((job_row, name, value) for name, value in settings))
+    return error
+
+def ingest(connection, files, jobs=None, cache=None, topology=None):
+    """
+    Index the files that are new or changed since the last ingest.
+
+    Args:
+        connection: Connection returned by open_index
+        files: List of file paths
+        jobs: Number of worker processes (default: number of CPUs)
+        cache: Optional ParseCache shared by the workers (safe for concurrent processes, see parse_cache)
+        topology: Optional TopologyTemplate of the nodes of every job
+
+    Returns:
+        A tuple (indexed, skipped, errors, empty) of file counts, empty being the files
+        without MPI ranks (stored with the error NO_RANKS_ERROR, not counted in errors)
+    """
+    stale = _stale_files(connection, files)
+    connection.commit()
+    # Every worker loads and stores its own files in the shared cache directory
+    worker = partial(analyze_file, cache=cache, topology=topology)
+    jobs = jobs or os.cpu_count() or 1
+    errors = 0
+    empty = 0
+    if jobs == 1 or len(stale) < 2:
+        results = map(worker, stale)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(worker, stale, chunksize=max(1, len(stale) // (jobs * 4)))
+    try:
+        # Results are written as they arrive, so an interrupted ingest keeps the files done so far
+        for filename, digest, file_jobs, error in results:
+            if error and not digest:
+                try:
+                    digest = file_digest(filename)
+                except OSError:
+                    digest = ""
+            error = _store_file(connection, filename, digest, file_jobs, error)
+            if error == NO_RANKS_ERROR:
+                empty += 1
+            elif error:
+                errors += 1
+    finally:
+        if executor:
+            executor.shutdown()
+    return len(stale), len(files) - len(stale), errors, empty
+
+def parse_date(text):
+    """Parse a YYYY-MM-DD date (or an ISO date and time) into a POSIX timestamp, for argparse."""
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD")
+
+def query_jobs(connection, flag=None, since=None, until=None, setting=None, node=None):
+    """
+    Return the indexed jobs matching all the given filters.
+
+    Args:
+        connection: Connection returned by open_index
+        flag: Name of a check in FLAGS; only jobs with at least one flagged rank are returned
+        since, until: POSIX timestamps bounding the job time
+        setting: (name, value) of an MPICH setting, value being None to match any value
+        node: Node name the job must have used
+
+    Returns:
+        A list of tuples (path, step, title, job_id, job_time, node_count, rank_count, flagged ranks, job row id),
+        most recent job first
+    """
+    flagged = FLAGS[flag] if flag else "0"
+    conditions = []
+    parameters = []
+    if flag:
+        conditions.append(f"jobs.{flagged} > 0")
+    if since is not None:
+        conditions.append("jobs.job_time >= ?")
+        parameters.append(since)
+    if until is not None:
+        conditions.append("jobs.job_time < ?")
+        parameters.append(until)
+    if setting:
+        name, value = setting
+        if value is None:
+            conditions.append("EXISTS (SELECT 1 FROM settings WHERE settings.job = jobs.id AND settings.name = ?)")
+            parameters.append(name)
+        else:
+            conditions.append("EXISTS (SELECT 1 FROM settings WHERE settings.job = jobs.id AND settings.name = ? "
+                              "AND settings.value = ?)")
+            parameters.extend((name, sql_value(parse_setting_value(name, value))))
+    if node:
+        conditions.append("jobs.id IN (SELECT job FROM ranks WHERE node = ?)")
+        parameters.append(node)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return connection.execute(
+        f"SELECT files.path, jobs.step, jobs.title, jobs.job_id, jobs.job_time, jobs.node_count, jobs.rank_count, "
+        f"{'jobs.' + flagged if flag else '0'}, jobs.id FROM jobs JOIN files ON files.id = jobs.file_id "
+        f"{where} ORDER BY jobs.job_time DESC, files.path, jobs.step", parameters).fetchall()
+
+def flagged_ranks(connection, job_row, flag):
+    """Return the ranks of one indexed job flagged by a check of RANK_FLAGS."""
+    condition = RANK_FLAGS[flag]
+    return [rank for rank, in connection.execute(f"SELECT rank FROM ranks WHERE job = ? AND {condition} ORDER BY rank",
+                                                 (job_row,))]
+
+def print_jobs(connection, rows, flag=None, show_ranks=False):
+    """Print the jobs returned by query_jobs, one line each."""
+    for path, step, title, job_id, job_time, node_count, rank_count, flagged, job_row in rows:
+        label = f"{path} [step {step}]" if title else path
+        when = datetime.fromtimestamp(job_time).strftime("%Y-%m-%d %H:%M")
+        counts = f"{rank_count:6} ranks on {node_count:5} nodes"
+        if flag:
+            counts += f", {flag}: {flagged} ranks"
+            if show_ranks:
+                counts += f" ({format_id_ranges(flagged_ranks(connection, job_row, flag))})"
+        print(f"{when}  job {job_id:<9} {counts}  {label}")
+    print(f"{len(rows)} jobs")
+
+def print_sql(connection, statement):
+    """Run an SQL statement on the index and print the rows, tab-separated with a header."""
+    cursor = connection.execute(statement)
+    if cursor.description:
+        print("\t".join(column[0] for column in cursor.description))
+    for row in cursor:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+def main():
+    """Main function to parse arguments and run the ingest or query command."""
+    arg_parser = argparse.ArgumentParser(description="Index analysed jobs in an SQLite database and query the whole fleet.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="parse and index new or changed job outputs")
+    ingest_parser.add_argument("database", help="SQLite index (created if needed)")
+    ingest_parser.add_argument("paths", nargs="+", help="output files or directories containing them")
+    ingest_parser.add_argument("--pattern", default="*", help="glob pattern of the files inside directories (default: %(default)s)")
+    ingest_parser.add_argument("-j", "--jobs", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    add_topology_argument(ingest_parser)
+    add_cache_arguments(ingest_parser)
+
+    query_parser = commands.add_parser("query", help="list the indexed jobs matching all the filters")
+    query_parser.add_argument("database", help="SQLite index")
+    query_parser.add_argument("--flag", choices=list(FLAGS), default=None, help="only jobs with ranks flagged by this check")
+    query_parser.add_argument("--since", type=parse_date, default=None, help="only jobs ended on or after this date (YYYY-MM-DD)")
+    query_parser.add_argument("--until", type=parse_date, default=None, help="only jobs ended before this date (YYYY-MM-DD)")
+    query_parser.add_argument("--setting", default=None, metavar="NAME[=VALUE]",
+                              help="only jobs that printed this MPICH setting (with this value, e.g. MPICH_OFI_NIC_POLICY=BLOCK)")
+    query_parser.add_argument("--node", default=None, help="only jobs that ran ranks on this node")
+    query_parser.add_argument("--ranks", action="store_true", help="list the flagged ranks of each job (with --flag)")
+
+    sql_parser = commands.add_parser("sql", help="run an SQL statement on the index (tables files, jobs, ranks, settings)")
+    sql_parser.add_argument("database", help="SQLite index")
+    sql_parser.add_argument("statement", help="SQL statement")
+    args = arg_parser.parse_args()
+
+    if args.command != "ingest" and not os.path.exists(args.database):
+        print(f"Error: no index {args.database}")
+        sys.exit(1)
+    try:
+        connection = open_index(args.database)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.command == "ingest":
+        files = collect_files(args.paths, args.pattern)
+        if not files:
+            print("Error: no input files found")
+            sys.exit(1)
+        start = time.perf_counter()
+        indexed, skipped, errors, empty = ingest(connection, files, jobs=args.jobs,
+                                                 cache=cache_from_args(args, PARSER_VERSION),
+                                                 topology=topology_from_args(args))
+        print(f"Indexed {indexed} files ({errors} errors, {empty} without MPI ranks), skipped {skipped} unchanged files "
+              f"in {time.perf_counter() - start:.2f} s")
+    elif args.command == "query":
+        setting = None
+        if args.setting:
+            name, _, value = args.setting.partition("=")
+            setting = (name, value if "=" in args.setting else None)
+        start = time.perf_counter()
+        rows = query_jobs(connection, flag=args.flag, since=args.since, until=args.until, setting=setting, node=args.node)
+        print_jobs(connection, rows, flag=args.flag, show_ranks=args.ranks)
+        print(f"Query time: {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    else:
+        try:
+            print_sql(connection, args.statement)
+        except sqlite3.Error as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    connection.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Generator of synthetic MPICH/CCE job outputs.
+
+Produces the lines printed by a Cray MPICH job run with MPICH_ENV_DISPLAY=1,
+MPICH_CPUMASK_DISPLAY=1, MPICH_OFI_NIC_VERBOSE=2 and OMP_DISPLAY_AFFINITY
+(CCE OMP lines), for any number of nodes, ranks per node and threads per rank,
+so that the parser and the advisor can be exercised at scale. With GPUs, the
+"GPU topology" and "GPU binding" lines of the GPU selection wrapper are added.
+"""
+
+import argparse
+import os
+import random
+import sys
+from cpu_models import CPU_MODELS
+
+# NUMA domain of each NIC on LUMI-C nodes (cxi0 -> 3, cxi1 -> 1, cxi2 -> 0, cxi3 -> 2)
+LUMI_NIC_NUMA = [3, 1, 0, 2]
+
+# NUMA domain of each GCD on LUMI-G nodes (GCD 0-1 -> 3, 2-3 -> 1, 4-5 -> 0, 6-7 -> 2)
+LUMI_GPU_NUMA = [3, 3, 1, 1, 0, 0, 2, 2]
+
+NIC_POLICIES = ("BLOCK", "ROUND-ROBIN", "NUMA")
+
+# Processor printed by MPICH for each node size: (family, model) of CPU_MODELS, one per node size
+# (Trento on 64-core LUMI-G nodes, two Milan sockets on 128-core LUMI-C nodes)
+NODE_CPU_MODELS = {64: (25, 48), 128: (25, 1)}
+
+# Spacing of the PIDs of the ranks of a node, per OpenMP thread (the thread ids follow the PID)
+TID_STEP = 12
+
+# Environment display lines printed by PE 0, the parser has to skip them
+ENV_SETTINGS = [
+    ("MPICH_ENV_DISPLAY", "1"),
+    ("MPICH_VERSION_DISPLAY", "0"),
+    ("MPICH_CPUMASK_DISPLAY", "1"),
+    ("MPICH_ALLOC_MEM_PG_SZ", "4096"),
+    ("MPICH_ALLOC_MEM_POLICY", "PREFERRED"),
+    ("MPICH_SMP_SINGLE_COPY_MODE", "XPMEM"),
+    ("MPICH_OFI_NIC_VERBOSE", "2"),
+    ("MPICH_OFI_NIC_MAPPING", ""),
+]
+
+def nic_numa_domains(nic_count, numa_count):
+    """Return the NUMA domain of each NIC (the LUMI-C mapping when it fits, otherwise spread evenly)."""
+    if nic_count == len(LUMI_NIC_NUMA) and numa_count == len(LUMI_NIC_NUMA):
+        return list(LUMI_NIC_NUMA)
+    return [i * numa_count // nic_count for i in range(nic_count)]
+
+def gpu_numa_domains(gpu_count, numa_count):
+    """Return the NUMA domain of each GPU (the LUMI-G mapping when it fits, otherwise spread evenly)."""
+    if gpu_count == len(LUMI_GPU_NUMA) and numa_count == 4:
+        return list(LUMI_GPU_NUMA)
+    return [i * numa_count // gpu_count for i in range(gpu_count)]
+
+def cpu_model_line(cores_per_node, numa_domains):
+    """
+    Return the processor line printed by MPICH for this node shape, or None.
+
+    A known model is only printed when its L3 cache geometry fits the NUMA domains
+    (whole L3 domains per NUMA domain), so that the parser derives a layout that
+    could exist; other shapes print no processor line and get no L3 level.
+    """
+    family_model = NODE_CPU_MODELS.get(cores_per_node)
+    if family_model is None or (cores_per_node // numa_domains) % CPU_MODELS[family_model].cores_per_l3:
+        return None
+    family, model = family_model
+    return f"{CPU_MODELS[family_model].name} ({family}:{model}:1) (family:model:stepping)"
+
+def check_options(nodes=2, ranks_per_node=2, threads_per_rank=2, numa_domains=4, cores_per_node=64, nic_count=4,
+                  nic_policy="BLOCK", first_core=0, gpus=0, **options):
+    """Raise ValueError when the options of generate_output describe a job that cannot exist."""
+    if nic_policy not in NIC_POLICIES:
+        raise ValueError(f"Unknown NIC policy {nic_policy}, expected one of {', '.join(NIC_POLICIES)}")
+    if min(nodes, ranks_per_node, numa_domains, cores_per_node, nic_count) < 1:
+        raise ValueError("the numbers of nodes, ranks per node, NUMA domains, cores and NICs must be at least 1")
+    if min(threads_per_rank, first_core, gpus) < 0:
+        raise ValueError("the numbers of threads per rank, GPUs and the first core cannot be negative")
+    if cores_per_node % numa_domains:
+        raise ValueError(f"{cores_per_node} cores cannot be split evenly into {numa_domains} NUMA domains")
+    if (cores_per_node - first_core) // ranks_per_node < 1:
+        raise ValueError(f"{ranks_per_node} ranks do not fit on {cores_per_node - first_core} cores")
+
+def select_nic(local_rank, ranks_per_node, first_cpu_numa, nic_numa, policy):
+    """
+    Return the NIC index MPICH selects for a rank with the given NIC policy.
+
+    Args:
+        local_rank: Index of the rank on its node
+        ranks_per_node: Number of ranks on the node
+        first_cpu_numa: NUMA domain of the first CPU of the rank
+        nic_numa: NUMA domain of each NIC
+        policy: One of NIC_POLICIES
+    """
+    nic_count = len(nic_numa)
+    if policy == "BLOCK":
+        return local_rank * nic_count // ranks_per_node
+    if policy == "ROUND-ROBIN":
+        return local_rank % nic_count
+    # NUMA: a NIC attached to the rank's NUMA domain, or the closest domain id
+    local = [i for i, numa in enumerate(nic_numa) if numa == first_cpu_numa]
+    if local:
+        return local[local_rank % len(local)]
+    return min(range(nic_count), key=lambda i: abs(nic_numa[i] - first_cpu_numa))
+
+def format_mask(cpus, width):
+    """Format a set of CPU ids as the binary cpumask string printed by MPICH (CPU 0 rightmost)."""
+    mask = 0
+    for cpu in cpus:
+        mask |= 1 << cpu
+    return format(mask, f'0{width}b')
+
+def generate_output(out, nodes=2, ranks_per_node=2, threads_per_rank=2, numa_domains=4, cores_per_node=64,
+                    smt=2, nic_count=4, nic_policy="BLOCK", first_core=0, all_layouts=False, gpus=0, seed=0):
+    """
+    Write a synthetic MPICH/CCE job output.
+
+    Each rank is bound to a contiguous block of cores (with their SMT siblings) and
+    each OpenMP thread to one core of that block.
+
+    Args:
+        out: Text file object
+        nodes: Number of nodes
+        ranks_per_node: MPI ranks per node
+        threads_per_rank: OpenMP threads per rank
+        numa_domains: NUMA domains per node
+        cores_per_node: Physical cores per node
+        smt: Hardware threads per core (1 or 2); sibling of core c is c + cores_per_node
+        nic_count: NICs per node
+        nic_policy: MPICH_OFI_NIC_POLICY, one of NIC_POLICIES
+        first_core: First core used on each node (e.g. 1 when core 0 is reserved)
+        all_layouts: Print the NIC/NUMA layout of every node instead of only PE 0's node
+        gpus: GPUs per node; rank r of a node sees GPU r % gpus, as with ROCR_VISIBLE_DEVICES=$SLURM_LOCALID
+        seed: Seed of the random generator (PIDs and line interleaving)
+    """
+    check_options(nodes=nodes, ranks_per_node=ranks_per_node, threads_per_rank=threads_per_rank,
+                  numa_domains=numa_domains, cores_per_node=cores_per_node, nic_count=nic_count,
+                  nic_policy=nic_policy, first_core=first_core, gpus=gpus)
+    cores_per_rank = (cores_per_node - first_core) // ranks_per_node
+
+    rng = random.Random(seed)
+    cpu_count = cores_per_node * smt
+    cores_per_numa = cores_per_node // numa_domains
+    nic_numa = nic_numa_domains(nic_count, numa_domains)
+    node_names = [f"nid{5000 + i:06d}" for i in range(nodes)]
+    total_ranks = nodes * ranks_per_node
+
+    def numa_cpu_list(numa_id):
+        ranges = []
+        for thread in range(smt):
+            start = numa_id * cores_per_numa + thread * cores_per_node
+            ranges.append(f"{start}-{start + cores_per_numa - 1}")
+        return ",".join(ranges)
+
+    def nic_address(node_index, nic_index):
+        return f"0x{(node_index * nic_count + nic_index) & 0xffff:x}"
+
+    def print_layout(pe_id, node_index):
+        node_name = node_names[node_index]
+        out.write(f"PE {pe_id}: Hostname: {node_name}\n")
+        out.write(f"PE {pe_id}:   MPICH_OFI_NIC_POLICY: {nic_policy}\n")
+        out.write(f"PE {pe_id}:   Number of NICs: {nic_count}\n")
+        for nic_index, numa_id in enumerate(nic_numa):
+            out.write(f"PE {pe_id}:     nic_index {nic_index}: domain_name=cxi{nic_index}, "
+                      f"numa_domain={numa_id}, addr={nic_address(node_index, nic_index)}\n")
+        out.write(f"PE {pe_id}:   Number of NUMA domains: {numa_domains}\n")
+        for numa_id in range(numa_domains):
+            out.write(f"PE {pe_id}:     numa_domain {numa_id}: cpu_list=[{numa_cpu_list(numa_id)}]\n")
+        out.write(f"PE {pe_id}: ====================================================================\n")
+
+    # Cores of each rank (the same blocks on every node)
+    rank_cores = []
+    for rank in range(total_ranks):
+        local_rank = rank % ranks_per_node
+        start = first_core + local_rank * cores_per_rank
+        rank_cores.append(list(range(start, start + cores_per_rank)))
+
+    out.write("[PE_0]: MPI rank order: Using default aprun rank ordering.\n")
+    for rank in range(total_ranks):
+        out.write(f"[PE_0]: rank {rank} is on {node_names[rank // ranks_per_node]}\n")
+
+    # Cpumask lines are printed by each rank, in no particular order
+    order = list(range(total_ranks))
+    rng.shuffle(order)
+    for rank in order:
+        cpus = [core + thread * cores_per_node for core in rank_cores[rank] for thread in range(smt)]
+        out.write(f"[PE_{rank}]: cpumask set to {len(cpus)} cpus on {node_names[rank // ranks_per_node]}, "
+                  f"cpumask = {format_mask(cpus, cpu_count)}\n")
+
+    model_line = cpu_model_line(cores_per_node, numa_domains)
+    if model_line:
+        out.write("PE 0: MPICH processor detected:\n")
+        out.write(f"PE 0:   {model_line}\n")
+    out.write("PE 0: MPICH environment settings =====================================\n")
+    for name, value in ENV_SETTINGS:
+        out.write(f"PE 0:   {name:<46} = {value}\n")
+    out.write(f"PE 0:   {'MPICH_OFI_NIC_POLICY':<46} = {nic_policy}\n")
+
+    # NIC selection lines, with the layout block(s) in between as in real outputs
+    out.write(f"PE 0: MPICH_OFI_NIC_POLICY = {nic_policy}\n")
+    out.write("PE 0: ======================== Display NIC Addrs  ========================\n")
+    print_layout(0, 0)
+    for rank in order:
+        node_index = rank // ranks_per_node
+        local_rank = rank % ranks_per_node
+        if all_layouts and local_rank == 0 and rank:
+            print_layout(rank, node_index)
+        first_cpu_numa = rank_cores[rank][0] // cores_per_numa
+        nic_index = select_nic(local_rank, ranks_per_node, first_cpu_numa, nic_numa, nic_policy)
+        out.write(f"PE {rank}: Host {node_names[node_index]} selected NIC index={nic_index}, "
+                  f"domain_name=cxi{nic_index}, numa_node={nic_numa[nic_index]}, "
+                  f"address=[{nic_address(node_index, nic_index)}]\n")
+
+    # GPU selection wrapper: the first rank of each node prints the GPU layout, every rank its GPU
+    if gpus:
+        gpu_numa = gpu_numa_domains(gpus, numa_domains)
+        for rank in order:
+            node_name = node_names[rank // ranks_per_node]
+            local_rank = rank % ranks_per_node
+            if local_rank == 0:
+                for gpu_id, numa_id in enumerate(gpu_numa):
+                    out.write(f"GPU topology: host {node_name} gpu {gpu_id} numa_node={numa_id} bus_id={0xc1 + gpu_id:x}\n")
+            out.write(f"GPU binding: rank {rank} on {node_name} ROCR_VISIBLE_DEVICES={local_rank % gpus}\n")
+
+    # Distinct PIDs for the ranks of each node, spaced so that their thread ids do not collide either
+    pid_step = threads_per_rank * TID_STEP
+    pid_slots = range(40000, 40000 + max(20000, 2 * ranks_per_node * pid_step), pid_step)
+    pids = [pid for _ in range(nodes) for pid in rng.sample(pid_slots, ranks_per_node)]
+
+    # OpenMP affinity lines and application output
+    for rank in order:
+        node_name = node_names[rank // ranks_per_node]
+        pid = pids[rank]
+        out.write("  OMP_AFFINITY_FORMAT='CCE OMP: host %H pid %P tid %i thread %n affinity: %A'\n")
+        for thread in range(threads_per_rank):
+            core = rank_cores[rank][thread % cores_per_rank]
+            affinity = " ".join(str(core + t * cores_per_node) for t in range(smt))
+            tid = pid + thread * TID_STEP
+            out.write(f"CCE OMP: host {node_name} pid {pid} tid {tid} thread {thread} affinity:  {affinity}\n")
+            out.write(f"Hello world from rank {rank} (out of {total_ranks} MPI processes), "
+                      f"thread {thread} (out of {threads_per_rank} OpenMP threads)!\n")
+
+def main():
+    """Main function to parse arguments and write the synthetic output."""
+    arg_parser = argparse.ArgumentParser(description="Generate a synthetic MPICH/CCE job output.")
+    arg_parser.add_argument("-o", "--output", default=None, help="output file (default: standard output)")
+    arg_parser.add_argument("--nodes", type=int, default=2, help="number of nodes (default: %(default)s)")
+    arg_parser.add_argument("--ranks-per-node", type=int, default=2, help="MPI ranks per node (default: %(default)s)")
+    arg_parser.add_argument("--threads-per-rank", type=int, default=2, help="OpenMP threads per rank (default: %(default)s)")
+    arg_parser.add_argument("--numa", type=int, default=4, help="NUMA domains per node (default: %(default)s)")
+    arg_parser.add_argument("--cores", type=int, default=64, help="physical cores per node (default: %(default)s)")
+    arg_parser.add_argument("--smt", type=int, choices=(1, 2), default=2, help="hardware threads per core (default: %(default)s)")
+    arg_parser.add_argument("--nics", type=int, default=4, help="NICs per node (default: %(default)s)")
+    arg_parser.add_argument("--nic-policy", choices=NIC_POLICIES, default="BLOCK", help="MPICH_OFI_NIC_POLICY (default: %(default)s)")
+    arg_parser.add_argument("--first-core", type=int, default=0, help="first core used on each node (default: %(default)s)")
+    arg_parser.add_argument("--all-layouts", action="store_true", help="print the NIC/NUMA layout of every node")
+    arg_parser.add_argument("--gpus", type=int, default=0, help="GPUs per node, 0 for none (default: %(default)s)")
+    arg_parser.add_argument("--seed", type=int, default=0, help="random seed (default: %(default)s)")
+    args = arg_parser.parse_args()
+
+    options = dict(nodes=args.nodes, ranks_per_node=args.ranks_per_node, threads_per_rank=args.threads_per_rank,
+                   numa_domains=args.numa, cores_per_node=args.cores, smt=args.smt, nic_count=args.nics,
+                   nic_policy=args.nic_policy, first_core=args.first_core, all_layouts=args.all_layouts,
+                   gpus=args.gpus, seed=args.seed)
+    try:
+        # Checked before the output file is created, so that a failed run leaves no empty file behind
+        check_options(**options)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.output:
+        try:
+            with open(args.output, 'w') as out:
+                generate_output(out, **options)
+        except BaseException:
+            os.unlink(args.output)
+            raise
+    else:
+        generate_output(sys.stdout, **options)
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,217 @@
+import sys
+import tracemalloc
+import weakref
 from dataclasses import dataclass, field
-from typing import List, Union
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple, Union
+
+# The hardware classes below use __slots__ (no per-instance __dict__) and hold their
+# parent through a weak reference, so a topology tree has no reference cycles and is
+# freed by reference counting alone. Parents are kept alive by their owner
+# (Cluster -> Node -> NodeType -> NUMADomain -> PhysicalCore -> LogicalCPU; the
+# optional CacheDomain level groups the cores of a NUMA domain sharing an L3 cache).
+
+class ParentLink:
+    """Descriptor storing a reference to a parent object as a weak reference."""
+    
+    def __set_name__(self, owner, name):
+        self.slot = f"_{name}"
+    
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        ref = getattr(obj, self.slot)
+        return ref() if ref is not None else None
+    
+    def __set__(self, obj, value):
+        # CPython shares a single weakref object between all children of one parent
+        setattr(obj, self.slot, weakref.ref(value) if value is not None else None)
+
+class CpuSet:
+    """
+    Immutable set of logical CPU IDs backed by an integer bitmask (bit n set = CPU n).
+    
+    Union, intersection, difference, membership and popcount are single integer
+    operations, so overlap checks and NUMA mapping work a machine word at a time
+    instead of looping over LogicalCPU objects.
+    """
+    __slots__ = ("mask",)
+    
+    def __init__(self, mask: int = 0):
+        self.mask = mask
+    
+    @classmethod
+    def from_ids(cls, ids):
+        """Builds a CpuSet from an iterable of CPU IDs."""
+        mask = 0
+        for cpu_id in ids:
+            mask |= 1 << cpu_id
+        return cls(mask)
+    
+    @classmethod
+    def from_cpus(cls, cpus):
+        """Builds a CpuSet from an iterable of LogicalCPU objects."""
+        return cls.from_ids(cpu.id for cpu in cpus)
+    
+    def __or__(self, other):
+        return CpuSet(self.mask | other.mask)
+    
+    def __and__(self, other):
+        return CpuSet(self.mask & other.mask)
+    
+    def __sub__(self, other):
+        return CpuSet(self.mask & ~other.mask)
+    
+    def __xor__(self, other):
+        return CpuSet(self.mask ^ other.mask)
+    
+    def __eq__(self, other):
+        return isinstance(other, CpuSet) and self.mask == other.mask
+    
+    def __hash__(self):
+        return hash(self.mask)
+    
+    def __len__(self):
+        """Returns the number of CPUs in the set (popcount)."""
+        return self.mask.bit_count()
+    
+    def __bool__(self):
+        return self.mask != 0
+    
+    def __contains__(self, cpu_id):
+        return cpu_id >= 0 and (self.mask >> cpu_id) & 1 == 1
+    
+    def __iter__(self):
+        """Yields the CPU IDs in increasing order."""
+        mask = self.mask
+        while mask:
+            low_bit = mask & -mask
+            yield low_bit.bit_length() - 1
+            mask ^= low_bit
+    
+    def __repr__(self):
+        return f"CpuSet({self.format_ranges(',')!r})"
+    
+    def isdisjoint(self, other):
+        """Returns True if the two sets have no CPU in common."""
+        return self.mask & other.mask == 0
+    
+    def issubset(self, other):
+        """Returns True if every CPU of this set is also in other."""
+        return self.mask & ~other.mask == 0
+    
+    def ranges(self):
+        """
+        Returns the set as a list of (first, last) tuples of consecutive CPU IDs.
+        Runs of set bits are found with bit arithmetic rather than one bit at a time.
+        """
+        ranges = []
+        mask = self.mask
+        position = 0
+        while mask:
+            # Skip the trailing zeros, then measure the run of trailing ones
+            zeros = (mask & -mask).bit_length() - 1
+            mask >>= zeros
+            position += zeros
+            ones = (mask ^ (mask + 1)).bit_length() - 1
+            ranges.append((position, position + ones - 1))
+            mask >>= ones
+            position += ones
+        return ranges
+    
+    def format_ranges(self, separator=", "):
+        """
+        Formats the set as compact ranges.
+        Example: {1, 2, 3, 5, 6, 9} -> "1-3, 5-6, 9"
+        """
+        return separator.join(str(first) if first == last else f"{first}-{last}"
+                              for first, last in self.ranges())
 
-@dataclass
 class LogicalCPU:
     """Represents a logical CPU (thread) assigned to a physical core."""
-    id: int
-    core: "PhysicalCore"  # Reference to the parent core
+    __slots__ = ("id", "_core")
+    core = ParentLink()  # Reference to the parent core
+    
+    def __init__(self, id: int, core: "PhysicalCore"):
+        self.id = id
+        self.core = core
+    
+    def __repr__(self):
+        return f"LogicalCPU(id={self.id})"
 
-@dataclass
 class PhysicalCore:
     """Represents a physical CPU core, which contains one or more logical CPUs."""
-    id: int
-    numa_domain: "NUMADomain"  # Reference to the NUMA domain this core belongs to
-    logical_cpus: List[LogicalCPU] = field(default_factory=list)
+    __slots__ = ("id", "_numa_domain", "_cache_domain", "logical_cpus", "__weakref__")
+    numa_domain = ParentLink()   # Reference to the NUMA domain this core belongs to
+    cache_domain = ParentLink()  # Reference to the L3 cache domain of this core (None if unknown)
+    
+    def __init__(self, id: int, numa_domain: "NUMADomain", logical_cpus: List[LogicalCPU] = None):
+        self.id = id
+        self.numa_domain = numa_domain
+        self.cache_domain = None
+        self.logical_cpus = logical_cpus if logical_cpus is not None else []
+    
+    def __repr__(self):
+        return f"PhysicalCore(id={self.id}, logical_cpus={self.logical_cpus})"
 
     def is_hyperthreaded(self) -> bool:
         """Returns True if this core has more than one logical CPU (hyperthreading enabled)."""
         return len(self.logical_cpus) > 1
 
-@dataclass
 class NIC:
     """Represents a network interface card (NIC) assigned to a specific NUMA domain."""
-    id: str                   # NIC identifier (e.g., cxi0, cxi1)
-    numa_domain: "NUMADomain"  # Reference to the NUMA domain the NIC is bound to
+    __slots__ = ("id", "_numa_domain", "address")
+    numa_domain = ParentLink()  # Reference to the NUMA domain the NIC is bound to
+    
+    def __init__(self, id: str, numa_domain: "NUMADomain", address: str = None):
+        self.id = id                    # NIC identifier (e.g., cxi0, cxi1)
+        self.numa_domain = numa_domain
+        self.address = address          # NIC address (e.g., 0x7343), if known
+    
+    def __repr__(self):
+        return f"NIC(id={self.id!r}, address={self.address!r})"
+
+class GPU:
+    """Represents a GPU device attached to a specific NUMA domain (on LUMI-G, one GCD of an MI250X)."""
+    __slots__ = ("id", "_numa_domain", "bus_id")
+    numa_domain = ParentLink()  # Reference to the NUMA domain the GPU is attached to
+    
+    def __init__(self, id: int, numa_domain: "NUMADomain", bus_id: str = None):
+        self.id = id                    # Device index as used in ROCR_VISIBLE_DEVICES
+        self.numa_domain = numa_domain
+        self.bus_id = bus_id            # PCI bus id (e.g., c1), if known
+    
+    def __repr__(self):
+        return f"GPU(id={self.id}, bus_id={self.bus_id!r})"
+
+class CacheDomain:
+    """Represents the physical cores of a NUMA domain sharing one L3 cache (a CCD on AMD Milan and Trento)."""
+    __slots__ = ("id", "_numa_domain", "cores", "__weakref__")
+    numa_domain = ParentLink()  # Reference to the NUMA domain containing this cache domain
+    
+    def __init__(self, id: int, numa_domain: "NUMADomain"):
+        self.id = id                    # Index of the L3 domain on the node
+        self.numa_domain = numa_domain
+        self.cores = []                 # Physical cores sharing the L3 cache
+    
+    def __repr__(self):
+        return f"CacheDomain(id={self.id}, cores={len(self.cores)})"
 
-@dataclass
 class NUMADomain:
-    """Represents a NUMA domain that contains cores and network interfaces."""
-    id: int
-    node: "Node" = None      # Reference to the parent node
-    cores: List[PhysicalCore] = field(default_factory=list)  # Physical cores in this NUMA
-    nics: List[NIC] = field(default_factory=list)  # Network interfaces in this NUMA
+    """Represents a NUMA domain that contains cores, network interfaces and GPUs."""
+    __slots__ = ("id", "_node", "cores", "cache_domains", "nics", "gpus", "__weakref__")
+    node = ParentLink()  # Reference to the parent node (None when shared through a NodeType)
 
     def __init__(self, id, node):
         self.id = id
         self.node = node
-        self.cores = []
-        self.nics = []
+        self.cores = []  # Physical cores in this NUMA
+        self.cache_domains = []  # L3 cache domains grouping the cores, when the CPU geometry is known
+        self.nics = []   # Network interfaces in this NUMA
+        self.gpus = []   # GPUs attached to this NUMA
+    
+    def __repr__(self):
+        return f"NUMADomain(id={self.id}, cores={len(self.cores)}, nics={self.nics})"
         
     def get_core_count(self):
         """Returns the number of physical cores in this NUMA domain."""
@@ -46,36 +221,129 @@ class NUMADomain:
         """Returns the total number of logical CPUs across all cores in this NUMA domain."""
         return sum(len(core.logical_cpus) for core in self.cores)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class NodeType:
+    """
+    Shared, immutable hardware layout of a class of identical nodes.
+    
+    The NUMA domains, cores, logical CPUs, NICs and GPUs are built once per node type and
+    referenced by every Node of that type, so memory and construction time depend on
+    the number of distinct node types rather than on the number of nodes. The layout
+    must not be modified once the NodeType has been created.
+    """
+    numa_domains: Tuple[NUMADomain, ...]
+    signature: str = ""  # Identifies the layout; nodes with the same signature share the NodeType
+    cpu_index: Mapping[int, LogicalCPU] = field(init=False, repr=False, compare=False)  # cpu_id -> LogicalCPU
+    nic_index: Mapping[str, NIC] = field(init=False, repr=False, compare=False)  # domain_name -> NIC
+    gpu_index: Mapping[int, GPU] = field(init=False, repr=False, compare=False)  # device index -> GPU
+    numa_cpu_sets: Tuple[Tuple[NUMADomain, CpuSet], ...] = field(init=False, repr=False, compare=False)
+    cache_cpu_sets: Tuple[Tuple[CacheDomain, CpuSet], ...] = field(init=False, repr=False, compare=False)
+    core_count: int = field(init=False, repr=False, compare=False)
+    logical_cpu_count: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        numa_domains = tuple(sorted(self.numa_domains, key=lambda n: n.id))
+        cpu_index = {}
+        nic_index = {}
+        gpu_index = {}
+        for numa in numa_domains:
+            for core in numa.cores:
+                for cpu in core.logical_cpus:
+                    cpu_index[cpu.id] = cpu
+            for nic in numa.nics:
+                nic_index[nic.id] = nic
+            for gpu in numa.gpus:
+                gpu_index[gpu.id] = gpu
+        
+        # The dataclass is frozen, so the derived fields are set through object.__setattr__
+        object.__setattr__(self, "numa_domains", numa_domains)
+        object.__setattr__(self, "cpu_index", MappingProxyType(cpu_index))
+        object.__setattr__(self, "nic_index", MappingProxyType(nic_index))
+        object.__setattr__(self, "gpu_index", MappingProxyType(dict(sorted(gpu_index.items()))))
+        object.__setattr__(self, "numa_cpu_sets", tuple(
+            (numa, CpuSet.from_cpus(cpu for core in numa.cores for cpu in core.logical_cpus))
+            for numa in numa_domains))
+        object.__setattr__(self, "cache_cpu_sets", tuple(
+            (cache, CpuSet.from_cpus(cpu for core in cache.cores for cpu in core.logical_cpus))
+            for numa in numa_domains for cache in numa.cache_domains))
+        object.__setattr__(self, "core_count", sum(numa.get_core_count() for numa in numa_domains))
+        object.__setattr__(self, "logical_cpu_count", len(cpu_index))
+
+# Layout used by nodes for which no topology information is known
+EMPTY_NODE_TYPE = NodeType(numa_domains=())
+
+@dataclass(slots=True, weakref_slot=True)
 class Node:
-    """Represents a physical compute node, containing multiple NUMA domains."""
+    """Represents a physical compute node. Its hardware layout is shared through a NodeType."""
     name: str
-    numa_domains: List[NUMADomain] = field(default_factory=list)  # NUMA domains in this node
+    node_type: NodeType = EMPTY_NODE_TYPE  # Shared hardware layout of this node
+    nic_addresses: Dict[str, str] = None   # Per-node NIC addresses (domain_name -> addr), if printed
+    
+    @property
+    def numa_domains(self) -> Tuple[NUMADomain, ...]:
+        """Returns the NUMA domains of this node (shared with all nodes of the same type)."""
+        return self.node_type.numa_domains
+    
+    def get_logical_cpu(self, cpu_id):
+        """Returns the LogicalCPU with the given ID on this node, or None if it does not exist."""
+        return self.node_type.cpu_index.get(cpu_id)
+    
+    def get_nic(self, nic_id):
+        """Returns the NIC with the given identifier (e.g., cxi0) on this node, or None if it does not exist."""
+        return self.node_type.nic_index.get(nic_id)
+    
+    def get_gpu(self, gpu_id):
+        """Returns the GPU with the given device index on this node, or None if the layout does not list it."""
+        return self.node_type.gpu_index.get(gpu_id)
+    
+    def get_numa_domains(self, cpu_set):
+        """Returns the NUMA domains of this node that contain at least one CPU of cpu_set."""
+        return [numa for numa, numa_cpus in self.node_type.numa_cpu_sets if numa_cpus.mask & cpu_set.mask]
+    
+    def get_cache_domains(self, cpu_set):
+        """Returns the L3 cache domains of this node that contain at least one CPU of cpu_set (empty if unknown)."""
+        return [cache for cache, cache_cpus in self.node_type.cache_cpu_sets if cache_cpus.mask & cpu_set.mask]
     
     def get_core_count(self):
         """Returns the total number of physical cores across all NUMA domains."""
-        return sum(numa.get_core_count() for numa in self.numa_domains)
+        return self.node_type.core_count
     
     def get_logical_cpu_count(self):
         """Returns the total number of logical CPUs across all NUMA domains."""
-        return sum(numa.get_logical_cpu_count() for numa in self.numa_domains)
+        return self.node_type.logical_cpu_count
     
     def __str__(self):
         """Returns a string representation of the node including the number of NUMA domains, cores, and CPUs."""
         return f"{self.name} ({len(self.numa_domains)} NUMA domains - {self.get_core_count()} cores, {self.get_logical_cpu_count()} CPUs)"
 
-@dataclass
+@dataclass(slots=True)
 class Cluster:
     """Represents an HPC cluster composed of multiple compute nodes."""
     nodes: List[Node] = field(default_factory=list)
+    
+    def get_node_classes(self):
+        """
+        Groups the nodes by their shared hardware layout.
+        
+        Returns:
+            A list of (NodeType, [Node, ...]) tuples in order of first appearance
+        """
+        classes = {}
+        for node in self.nodes:
+            classes.setdefault(id(node.node_type), (node.node_type, []))[1].append(node)
+        return list(classes.values())
 
-@dataclass
+@dataclass(slots=True)
 class OpenMPThread:
     """Represents an OpenMP thread, which may run on multiple LogicalCPUs."""
     id: int
     logical_cpus: List[LogicalCPU]  # The logical CPUs this OpenMP thread can use
+    cpu_set: CpuSet = field(init=False, repr=False)  # Bitmask view of logical_cpus
+    
+    def __post_init__(self):
+        self.cpu_set = CpuSet.from_cpus(self.logical_cpus)
 
-@dataclass
+@dataclass(slots=True)
 class MPITask:
     """Represents an MPI task running on exactly one node."""
     id: int
@@ -83,13 +351,41 @@ class MPITask:
     logical_cpus: List[LogicalCPU]  # Logical CPUs assigned to this MPI task
     openmp_threads: List[OpenMPThread] = field(default_factory=list)
     selected_nics: List[NIC] = field(default_factory=list)  # NICs selected by this MPI task
+    gpu_ids: List[int] = field(default_factory=list)  # GPUs visible to this MPI task (ROCR_VISIBLE_DEVICES)
+    gpus: List[GPU] = field(default_factory=list)     # The visible GPUs found in the node layout
+    cpu_set: CpuSet = field(init=False, repr=False)  # CPUs bound to this task, as a bitmask
+    
+    def __post_init__(self):
+        self.cpu_set = CpuSet.from_cpus(self.logical_cpus)
+    
+    def bind_cpus(self, cpu_set):
+        """
+        Binds this task to every CPU of cpu_set (e.g., from its cpumask).
+        The matching LogicalCPU objects are looked up on the task's node.
+        Returns the number of CPUs looked up (those not already bound).
+        """
+        new_cpus = cpu_set - self.cpu_set
+        for cpu_id in new_cpus:
+            cpu = self.node.get_logical_cpu(cpu_id)
+            if cpu:
+                self.logical_cpus.append(cpu)
+        self.cpu_set = self.cpu_set | cpu_set
+        return len(new_cpus)
+    
+    def add_logical_cpu(self, cpu):
+        """Adds a logical CPU to this task unless it is already assigned (constant-time check)."""
+        bit = 1 << cpu.id
+        if not self.cpu_set.mask & bit:
+            self.cpu_set = CpuSet(self.cpu_set.mask | bit)
+            self.logical_cpus.append(cpu)
 
-@dataclass
+@dataclass(slots=True)
 class Job:
     """Represents an HPC job consisting of multiple MPI tasks."""
     id: int
     name: str = "unnamed_job"
     mpi_tasks: List[MPITask] = field(default_factory=list)
+    mpich_settings: Dict[str, Any] = field(default_factory=dict)   # typed MPICH_ENV_DISPLAY settings (see mpich_env)
     
     @property
     def num_tasks(self) -> int:
@@ -213,6 +509,115 @@ class Job:
         
         return summary
 
+def parse_cpu_list(text):
+    """
+    Parses a CPU list as printed by Linux, OpenMP (%A in OMP_AFFINITY_FORMAT) or MPICH.
+    Entries are separated by commas and/or spaces and are single CPUs ("5"), ranges
+    ("0-7") or strided ranges ("0-15:2"). Each range is turned into a bitmask at once.
+    Example: "0-7,64-71" or "1 65"
+    
+    Args:
+        text: The CPU list string
+        
+    Returns:
+        A CpuSet containing the listed CPUs
+    
+    Raises:
+        ValueError: If an entry is malformed, e.g. "1-" (truncated line), "3-1" or "5:"
+    """
+    mask = 0
+    for entry in text.replace(',', ' ').split():
+        bounds, colon, stride = entry.partition(':')
+        start, dash, end = bounds.partition('-')
+        if not (start.isdigit() and (not dash or end.isdigit()) and (not colon or (dash and stride.isdigit()))):
+            raise ValueError(f"Invalid CPU list entry {entry!r} in {text.strip()!r}")
+        if dash:
+            start, end = int(start), int(end)
+            if end < start:
+                raise ValueError(f"Invalid CPU range {entry!r} in {text.strip()!r}: end before start")
+            if stride and int(stride) > 1:
+                for cpu_id in range(start, end + 1, int(stride)):
+                    mask |= 1 << cpu_id
+            else:
+                mask |= ((1 << (end - start + 1)) - 1) << start
+        else:
+            mask |= 1 << int(start)
+    return CpuSet(mask)
+
+def detect_sibling_stride(numa_cpu_sets):
+    """
+    Detect how the SMT siblings of a node are numbered from the CPU sets of its NUMA domains.
+    
+    Linux numbers the first hardware thread of every core first, then the second ones,
+    so with SMT each NUMA domain lists as many equal ranges as there are threads per
+    core, each offset by the number of physical cores from the previous one
+    (e.g. "0-15,64-79" on a 64-core node, "0-15,128-143" on a 128-core node).
+    
+    Args:
+        numa_cpu_sets: List of the CpuSet of each NUMA domain of the node
+        
+    Returns:
+        The offset between siblings (the number of physical cores), or None when the
+        layout shows no SMT (every CPU is then its own core)
+    """
+    total = sum(len(cpu_set) for cpu_set in numa_cpu_sets)
+    stride = None
+    threads = None
+    for cpu_set in numa_cpu_sets:
+        ranges = cpu_set.ranges()
+        if len(ranges) < 2 or (threads is not None and len(ranges) != threads):
+            return None
+        first, last = ranges[0]
+        offsets = {b_first - a_first for (a_first, _), (b_first, _) in zip(ranges, ranges[1:])}
+        if len(offsets) != 1 or any(end - start != last - first for start, end in ranges):
+            return None
+        offset = offsets.pop()
+        if stride is not None and offset != stride:
+            return None
+        stride, threads = offset, len(ranges)
+    if stride is None or stride * threads != total:
+        return None
+    return stride
+
+def measure_memory_budget(count=10000):
+    """
+    Measure the memory used by each topology object, including its own containers.
+    
+    Builds `count` instances of every hardware class under tracemalloc, with two
+    logical CPUs per core as on SMT-enabled nodes.
+    
+    Args:
+        count: Number of instances to allocate per class
+        
+    Returns:
+        A dictionary mapping class names to the average number of bytes per instance
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    
+    budget = {}
+    numa = NUMADomain(id=0, node=None)
+    
+    def measure(name, build):
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [build(i) for i in range(count)]
+        # Exclude the list holding the objects from the measurement
+        budget[name] = (tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(objects)) / count
+        return objects
+    
+    measure("NUMADomain", lambda i: NUMADomain(id=i, node=None))
+    # The cores are kept alive as the parents of the logical CPUs
+    cores = measure("PhysicalCore", lambda i: PhysicalCore(id=i, numa_domain=numa))
+    measure("CacheDomain", lambda i: CacheDomain(id=i, numa_domain=numa))
+    measure("LogicalCPU", lambda i: LogicalCPU(id=i % 256, core=cores[i // 2]))
+    measure("NIC", lambda i: NIC(id="cxi0", numa_domain=numa, address="0x7343"))
+    measure("GPU", lambda i: GPU(id=i % 8, numa_domain=numa, bus_id="c1"))
+    
+    if not was_tracing:
+        tracemalloc.stop()
+    return budget
+
 def print_run(cluster, job, show_detailed_cpu=False, indent="", last=True):
     """
     Print the cluster and job topology in a tree format.
@@ -273,7 +678,13 @@ def print_run(cluster, job, show_detailed_cpu=False, indent="", last=True):
             if numa.nics:
                 nic_names = [nic.id for nic in numa.nics]
                 nic_str = ", ".join(nic_names)
-                print(f"{cpu_indent}└── NICs: {nic_str}")
+                nic_prefix = "├── " if numa.gpus else "└── "
+                print(f"{cpu_indent}{nic_prefix}NICs: {nic_str}")
+            
+            # Print GPUs in this NUMA domain
+            if numa.gpus:
+                gpu_str = ", ".join(str(gpu.id) for gpu in sorted(numa.gpus, key=lambda g: g.id))
+                print(f"{cpu_indent}└── GPUs: {gpu_str}")
     
     # Print the job structure
     print(f"\n=============== Job: {job.name} (ID: {job.id}, {len(job.mpi_tasks)} MPI tasks) ===============")
@@ -287,10 +698,11 @@ def print_run(cluster, job, show_detailed_cpu=False, indent="", last=True):
     
     # Sort nodes
     sorted_nodes = sorted(tasks_by_node.keys())
+    nodes_by_name = {node.name: node for node in cluster.nodes}
     
     # Print each node's tasks
     for i, node_name in enumerate(sorted_nodes):
-        node = next(node for node in cluster.nodes if node.name == node_name)
+        node = nodes_by_name[node_name]
         is_last_node = i == len(sorted_nodes) - 1
         prefix = "└── " if is_last_node else "├── "
         print(f"{'  '}{prefix}Node: {str(node)}")
@@ -306,13 +718,11 @@ def print_run(cluster, job, show_detailed_cpu=False, indent="", last=True):
             is_last_task = j == len(tasks) - 1
             task_prefix = "└── " if is_last_task else "├── "
             
-            # Get CPU IDs used by this task
-            cpu_ids = sorted([cpu.id for cpu in task.logical_cpus])
-            
-            # Use the unified format_id_ranges function
-            cpu_str = format_id_ranges(cpu_ids)
+            # Format the CPUs used by this task as compact ranges
+            cpu_str = task.cpu_set.format_ranges()
             
-            print(f"{task_indent}{task_prefix}MPI Rank {task.id} ({len(task.logical_cpus)} CPUs: {cpu_str})")
+            gpu_str = f", GPU {', '.join(map(str, task.gpu_ids))}" if task.gpu_ids else ""
+            print(f"{task_indent}{task_prefix}MPI Rank {task.id} ({len(task.cpu_set)} CPUs: {cpu_str}{gpu_str})")
             
             # Increase indent for threads
             thread_indent = task_indent + ("    " if is_last_task else "│   ")
@@ -327,9 +737,8 @@ def print_run(cluster, job, show_detailed_cpu=False, indent="", last=True):
                     is_last_thread = k == thread_count - 1 and not task.selected_nics  # Not last if we have NICs to show
                     thread_prefix = "└── " if is_last_thread else "├── "
                     
-                    # Get CPU IDs used by this thread
-                    thread_cpu_ids = sorted([cpu.id for cpu in thread.logical_cpus])
-                    thread_cpu_str = ", ".join(map(str, thread_cpu_ids))
+                    # Format the CPUs used by this thread as compact ranges (wide places such as sockets stay short)
+                    thread_cpu_str = thread.cpu_set.format_ranges()
                     
                     # Increase indentation for threads to make them appear as sub-items
                     # Use proper vertical alignment with connecting lines
@@ -0,0 +1,100 @@
+"""
+Registry of the input formats understood by the tools.
+
+Each format provides a sniff function, which looks only at the first few KB of a
+file, and a function returning the runs of a file as (title, cluster, job)
+tuples. Every backend builds the same Cluster/Job model, so the advisor and the
+batch report work the same on all of them. New backends are added with
+register_format().
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable
+from log_reader import open_binary, is_regular_file
+from mpich_parser import MPICHParser
+from xthi_parser import XthiParser
+
+# Number of bytes read (after decompression) to detect the format of a file
+SNIFF_BYTES = 8 * 1024
+
+@dataclass(frozen=True, slots=True)
+class InputFormat:
+    """An input format: how to recognize it and how to parse it."""
+    name: str
+    description: str
+    sniff: Callable      # sniff(head_text) -> bool
+    parse_runs: Callable  # parse_runs(filename, cache=None, jobs=1, profiler=None, cores_per_l3=None, topology=None) -> [(title, cluster, job)]
+
+# Registered formats, tried in registration order when sniffing
+FORMATS = {}
+
+def register_format(input_format):
+    """Register an input format (replacing any format with the same name)."""
+    FORMATS[input_format.name] = input_format
+
+def get_format(name):
+    """Return the registered format with this name."""
+    try:
+        return FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown input format {name}, expected one of {', '.join(FORMATS)}")
+
+def read_head(filename, size=SNIFF_BYTES):
+    """Return the first bytes of a (possibly compressed) file as text."""
+    with open_binary(filename) as f:
+        return f.read(size).decode('utf-8', 'replace')
+
+def detect_format(filename, default="mpich"):
+    """
+    Detect the format of a file from its first few KB.
+
+    A pipe can only be read once: it is not sniffed and gets the default format
+    (give the format explicitly, e.g. --format xthi, to read another format from a pipe).
+
+    Args:
+        filename: Path to the file
+        default: Format used when no sniffer recognizes the head of the file
+
+    Returns:
+        The name of the format
+    """
+    if not is_regular_file(filename):
+        return default
+    head = read_head(filename)
+    for input_format in FORMATS.values():
+        if input_format.sniff(head):
+            return input_format.name
+    return default
+
+def parse_runs(filename, input_format=None, **options):
+    """
+    Parse a file with the given format, or the detected one.
+
+    Returns:
+        A list of (title, cluster, job) tuples, title being None for single-run formats
+    """
+    return get_format(input_format or detect_format(filename)).parse_runs(filename, **options)
+
+# MPICH/CCE output (mpich_parser)
+MPICH_SNIFF_PATTERN = re.compile(r'^(\[PE_\d+\]: |PE \d+: |CCE OMP: )', re.MULTILINE)
+
+def _parse_mpich_runs(filename, cache=None, jobs=1, profiler=None, cores_per_l3=None, topology=None):
+    return [(None, *MPICHParser(filename, cache=cache, jobs=jobs, profiler=profiler, cores_per_l3=cores_per_l3,
+                                topology=topology).parse())]
+
+# xthi output, raw or rendered as tables by check_binding.sh (xthi_parser)
+XTHI_SNIFF_PATTERN = re.compile(r'^(\|\s*HOSTNAME\s*\|\s*MPI TASK|Node summary for|Node\s+\d+, (rank|hostname)\s)', re.MULTILINE)
+
+def _parse_xthi_runs(filename, cache=None, jobs=1, profiler=None, cores_per_l3=None, topology=None):
+    # xthi outputs are small: they are neither cached nor split between workers, and print no node layout
+    parser = XthiParser(filename, topology=topology)
+    if profiler:
+        with profiler.phase('parse'):
+            return parser.parse_runs()
+    return parser.parse_runs()
+
+register_format(InputFormat("mpich", "Cray MPICH output (MPICH_ENV_DISPLAY, cpumask, NIC and CCE OMP lines)",
+                            MPICH_SNIFF_PATTERN.search, _parse_mpich_runs))
+register_format(InputFormat("xthi", "xthi output, raw or as the tables of Check_Binding/check_binding.sh",
+                            XTHI_SNIFF_PATTERN.search, _parse_xthi_runs))
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Columnar (NumPy) view of a parsed job, for job-wide checks on very large jobs.
+
+The advisor checks walk the Cluster/Job objects one rank at a time. JobColumns
+holds the same binding information as flat arrays:
+- rank_node: node index of every rank
+- rank_cpus: rank x CPU boolean matrix of the bound CPUs
+- cpu_numa, cpu_core, cpu_l3: CPU id -> NUMA domain, core and L3 cache domain ids
+- rank_nic: index of the NIC selected by every rank, nic_numa: NIC -> NUMA domain
+The lookup tables have one row per node type (see NodeType), not per node.
+job_metrics() then computes the locality, overlap and balance metrics of the
+whole job with array operations instead of per-rank Python loops.
+
+NumPy is optional: it is only imported when a columnar view is built.
+"""
+
+import argparse
+import sys
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, List
+from hpc_topology import format_id_ranges
+from input_formats import FORMATS, parse_runs
+from mpich_parser import PARSER_VERSION, add_l3_argument
+from parse_cache import add_cache_arguments, cache_from_args
+from profiler import Profiler, add_profile_argument
+from topology_import import add_topology_argument, topology_from_args
+
+# Longest list of flagged ranks printed per metric
+MAX_RANGES_LENGTH = 100
+
+def _numpy():
+    """Import NumPy, with an explicit message when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("the columnar view of a job needs NumPy: install the 'numpy' package") from None
+    return numpy
+
+@dataclass(slots=True)
+class JobColumns:
+    """Binding information of a job as NumPy arrays; -1 marks a missing id in the integer arrays."""
+    rank_ids: Any           # int64 [ranks] MPI rank of each row, in the order of job.mpi_tasks
+    rank_node: Any          # int32 [ranks] index of the node of each rank in node_names
+    rank_cpus: Any          # bool [ranks, cpus] CPUs bound to each rank
+    rank_nic: Any           # int32 [ranks] index of the first selected NIC in nic_names
+    node_names: List[str]
+    node_type: Any          # int32 [nodes] row of the node in the lookup tables below
+    cpu_numa: Any           # int32 [node types, cpus] NUMA domain id of each CPU
+    cpu_core: Any           # int32 [node types, cpus] id of the physical core of each CPU
+    cpu_l3: Any             # int32 [node types, cpus] id of the L3 cache domain of each CPU
+    nic_names: List[str]
+    nic_numa: Any           # int32 [node types, NICs] NUMA domain id of each NIC
+
+    @property
+    def rank_type(self):
+        """Row of the lookup tables of each rank (node type of its node)."""
+        return self.node_type[self.rank_node]
+
+def job_columns(cluster, job):
+    """
+    Build the columnar view of a parsed job.
+
+    Args:
+        cluster: Cluster of the job
+        job: Job whose MPI tasks are bound (see MPITask.cpu_set)
+
+    Returns:
+        A JobColumns
+    """
+    np = _numpy()
+    tasks = job.mpi_tasks
+
+    node_index = {}
+    for node in cluster.nodes:
+        node_index.setdefault(node.name, len(node_index))
+    for task in tasks:
+        node_index.setdefault(task.node.name, len(node_index))
+    nodes = {node.name: node for node in cluster.nodes}
+    nodes.update((task.node.name, task.node) for task in tasks)
+
+    # Node types are shared objects, one table row per distinct NodeType
+    type_index = {}
+    node_types = []
+    node_type = np.empty(len(node_index), dtype=np.int32)
+    for name, index in node_index.items():
+        layout = nodes[name].node_type
+        row = type_index.get(id(layout))
+        if row is None:
+            row = type_index[id(layout)] = len(node_types)
+            node_types.append(layout)
+        node_type[index] = row
+
+    cpu_count = max([max(layout.cpu_index, default=-1) + 1 for layout in node_types] +
+                    [task.cpu_set.mask.bit_length() for task in tasks] + [1])
+    nic_names = sorted({nic_id for layout in node_types for nic_id in layout.nic_index} |
+                       {task.selected_nics[0].id for task in tasks if task.selected_nics})
+    nic_column = {nic_id: column for column, nic_id in enumerate(nic_names)}
+
+    cpu_numa = np.full((len(node_types), cpu_count), -1, dtype=np.int32)
+    cpu_core = np.full((len(node_types), cpu_count), -1, dtype=np.int32)
+    cpu_l3 = np.full((len(node_types), cpu_count), -1, dtype=np.int32)
+    nic_numa = np.full((len(node_types), len(nic_names)), -1, dtype=np.int32)
+    for row, layout in enumerate(node_types):
+        for numa in layout.numa_domains:
+            for core in numa.cores:
+                cache_domain = core.cache_domain
+                cpu_ids = [cpu.id for cpu in core.logical_cpus]
+                cpu_numa[row, cpu_ids] = numa.id
+                cpu_core[row, cpu_ids] = core.id
+                if cache_domain is not None:
+                    cpu_l3[row, cpu_ids] = cache_domain.id
+            for nic in numa.nics:
+                nic_numa[row, nic_column[nic.id]] = numa.id
+
+    # The CPU bitmasks of all the ranks are unpacked at once from their little-endian bytes
+    mask_bytes = (cpu_count + 7) // 8
+    packed = np.frombuffer(b''.join(task.cpu_set.mask.to_bytes(mask_bytes, 'little') for task in tasks),
+                           dtype=np.uint8).reshape(len(tasks), mask_bytes)
+    rank_cpus = np.unpackbits(packed, axis=1, count=cpu_count, bitorder='little').view(bool)
+
+    return JobColumns(
+        rank_ids=np.fromiter((task.id for task in tasks), dtype=np.int64, count=len(tasks)),
+        rank_node=np.fromiter((node_index[task.node.name] for task in tasks), dtype=np.int32, count=len(tasks)),
+        rank_cpus=rank_cpus,
+        rank_nic=np.fromiter((nic_column[task.selected_nics[0].id] if task.selected_nics else -1 for task in tasks),
+                             dtype=np.int32, count=len(tasks)),
+        node_names=list(node_index),
+        node_type=node_type,
+        cpu_numa=cpu_numa,
+        cpu_core=cpu_core,
+        cpu_l3=cpu_l3,
+        nic_names=nic_names,
+        nic_numa=nic_numa,
+    )
+
+def spanned_groups(columns, table, pairs=None):
+    """
+    Return the rank x group boolean matrix of the groups holding at least one CPU of each rank.
+
+    Args:
+        columns: JobColumns
+        table: One of the CPU lookup tables (cpu_numa, cpu_core or cpu_l3); group ids index the columns
+        pairs: (rank rows, CPU ids) of the bound CPUs, i.e. numpy.nonzero(columns.rank_cpus), when
+               already computed
+
+    Returns:
+        A bool array [ranks, largest group id + 1]
+    """
+    np = _numpy()
+    ranks, cpus = pairs if pairs is not None else np.nonzero(columns.rank_cpus)
+    spanned = np.zeros((len(columns.rank_ids), int(table.max(initial=-1)) + 1), dtype=bool)
+    groups = table[columns.rank_type[ranks], cpus]
+    known = groups >= 0
+    spanned[ranks[known], groups[known]] = True
+    return spanned
+
+def _l3_sizes(columns):
+    """Return the number of physical cores of each L3 cache domain, per node type [node types, L3 domains]."""
+    np = _numpy()
+    l3_count = int(columns.cpu_l3.max(initial=-1)) + 1
+    sizes = np.zeros((len(columns.cpu_l3), l3_count), dtype=np.int32)
+    for row, (cores, domains) in enumerate(zip(columns.cpu_core, columns.cpu_l3)):
+        known = domains >= 0
+        # SMT siblings share their core id, each (core, L3 domain) pair is counted once
+        pairs = np.unique(cores[known].astype(np.int64) * l3_count + domains[known])
+        sizes[row] = np.bincount(pairs % l3_count, minlength=l3_count)
+    return sizes
+
+def _shared_cpu_ranks(columns, pairs):
+    """Return a bool array [ranks] of the ranks sharing at least one CPU with another rank of their node."""
+    np = _numpy()
+    ranks, cpus = pairs
+    cpu_count = columns.rank_cpus.shape[1]
+    # Number of ranks bound to each (node, CPU) pair
+    keys = columns.rank_node[ranks].astype(np.int64) * cpu_count + cpus
+    counts = np.bincount(keys, minlength=len(columns.node_names) * cpu_count)
+    shared = np.zeros(len(columns.rank_ids), dtype=bool)
+    shared[ranks[counts[keys] > 1]] = True
+    return shared
+
+def job_metrics(columns):
+    """
+    Compute the locality, overlap and balance metrics of every rank of a job at once.
+
+    The flags follow the advisor checks (check_nic_numa_mismatch, check_l3_split) and
+    the batch report, so they flag the same ranks.
+
+    Args:
+        columns: JobColumns
+
+    Returns:
+        A dictionary of NumPy arrays:
+            cpus, cores, numa_domains, l3_domains: per rank counts [ranks]
+            unbound, multi_numa, l3_split, nic_mismatch, shared_cpus: per rank flags [ranks]
+            ranks_per_node: [nodes]
+            ranks_per_nic: ranks selecting each NIC of each node [nodes, NICs]
+    """
+    np = _numpy()
+    rank_type = columns.rank_type
+    pairs = np.nonzero(columns.rank_cpus)
+    numa = spanned_groups(columns, columns.cpu_numa, pairs)
+    l3 = spanned_groups(columns, columns.cpu_l3, pairs)
+    cpus = columns.rank_cpus.sum(axis=1)
+    bound = cpus > 0
+    cores = spanned_groups(columns, columns.cpu_core, pairs).sum(axis=1)
+    numa_domains = numa.sum(axis=1)
+    l3_domains = l3.sum(axis=1)
+
+    # More L3 domains than ceil(cores / size of the largest spanned domain)
+    largest = (l3 * _l3_sizes(columns)[rank_type]).max(axis=1, initial=0)
+    needed = -(-cores // np.maximum(largest, 1))
+    l3_split = bound & (l3_domains >= 2) & (l3_domains > needed)
+
+    # The selected NIC is on none of the NUMA domains of the rank's CPUs
+    has_nic = columns.rank_nic >= 0
+    nic_numa = np.full(len(rank_type), -1, dtype=np.int32)
+    nic_numa[has_nic] = columns.nic_numa[rank_type[has_nic], columns.rank_nic[has_nic]]
+    checked = bound & (nic_numa >= 0) & (nic_numa < numa.shape[1])
+    nic_mismatch = bound & (nic_numa >= 0)
+    nic_mismatch[checked] = ~numa[np.flatnonzero(checked), nic_numa[checked]]
+
+    node_count = len(columns.node_names)
+    nic_count = len(columns.nic_names)
+    ranks_per_nic = np.bincount(columns.rank_node[has_nic].astype(np.int64) * nic_count + columns.rank_nic[has_nic],
+                                minlength=node_count * nic_count).reshape(node_count, nic_count)
+
+    return {
+        'cpus': cpus,
+        'cores': cores,
+        'numa_domains': numa_domains,
+        'l3_domains': l3_domains,
+        'unbound': ~bound,
+        'multi_numa': numa_domains > 1,
+        'l3_split': l3_split,
+        'nic_mismatch': nic_mismatch,
+        'shared_cpus': _shared_cpu_ranks(columns, pairs),
+        'ranks_per_node': np.bincount(columns.rank_node, minlength=node_count),
+        'ranks_per_nic': ranks_per_nic,
+    }
+
+def truncate_ranges(ranges, max_length=MAX_RANGES_LENGTH):
+    """Truncate a list of rank ranges after the last complete range that fits in max_length."""
+    if len(ranges) <= max_length:
+        return ranges
+    return ranges[:ranges.rfind(", ", 0, max_length)] + ", ..."
+
+def print_metrics(columns, metrics):
+    """Print the job-wide summary of the metrics computed by job_metrics."""
+    np = _numpy()
+    rank_ids = columns.rank_ids
+    cpus = metrics['cpus']
+    bound = ~metrics['unbound']
+    ranks_per_node = metrics['ranks_per_node']
+    print(f"{len(rank_ids)} ranks on {len(columns.node_names)} nodes ({len(columns.cpu_numa)} node types)")
+    if not len(rank_ids):
+        return
+
+    print("\nBalance:")
+    print(f"  Ranks per node: {ranks_per_node.min()}-{ranks_per_node.max()} (mean {ranks_per_node.mean():.1f})")
+    print(f"  CPUs per rank: {cpus.min()}-{cpus.max()} (mean {cpus.mean():.1f}), "
+          f"cores per rank: {metrics['cores'].min()}-{metrics['cores'].max()}")
+    used_nics = metrics['ranks_per_nic'][metrics['ranks_per_nic'] > 0]
+    if used_nics.size:
+        print(f"  Ranks per used NIC: {used_nics.min()}-{used_nics.max()} (mean {used_nics.mean():.1f})")
+
+    print("\nLocality and overlap:")
+    flags = [
+        ("Ranks without CPU binding information", 'unbound'),
+        ("Ranks spanning several NUMA domains", 'multi_numa'),
+        ("Ranks split across L3 cache domains (CCDs) they could fit in fewer of", 'l3_split'),
+        ("NIC/NUMA mismatches (selected NIC on another NUMA domain than the rank's cores)", 'nic_mismatch'),
+        ("Ranks sharing CPUs with another rank of their node", 'shared_cpus'),
+    ]
+    for title, name in flags:
+        flagged = rank_ids[metrics[name]]
+        ranks = f": ranks {truncate_ranges(format_id_ranges(sorted(flagged.tolist())))}" if flagged.size else ""
+        print(f"  {title}: {flagged.size} of {len(rank_ids)}{ranks}")
+    if bound.any():
+        spread = np.bincount(metrics['numa_domains'][bound])
+        print("  NUMA domains per bound rank: " +
+              ", ".join(f"{count} x {domains}" for domains, count in enumerate(spread) if count))
+
+def save_npz(columns, metrics, filename):
+    """Save the columns and the metrics to a compressed .npz file (names as in JobColumns and job_metrics)."""
+    np = _numpy()
+    arrays = {name: getattr(columns, name) for name in JobColumns.__slots__}
+    arrays.update((f"metric_{name}", values) for name, values in metrics.items())
+    arrays['node_names'] = np.array(columns.node_names)
+    arrays['nic_names'] = np.array(columns.nic_names)
+    np.savez_compressed(filename, **arrays)
+
+def main():
+    """Main function to parse arguments and print the job-wide metrics."""
+    arg_parser = argparse.ArgumentParser(description="Job-wide binding metrics computed on a columnar (NumPy) view of the job.")
+    arg_parser.add_argument("input_file", help="job output file (any format of input_formats, plain or compressed)")
+    arg_parser.add_argument("--format", choices=list(FORMATS), default=None,
+                            help="input format (default: detected from the first few KB of the file)")
+    arg_parser.add_argument("--npz", default=None, metavar="FILE",
+                            help="save the arrays to this .npz file (one file per run, suffixed with the step number)")
+    add_l3_argument(arg_parser)
+    add_topology_argument(arg_parser)
+    add_cache_arguments(arg_parser)
+    add_profile_argument(arg_parser)
+    args = arg_parser.parse_args()
+
+    try:
+        _numpy()
+    except ImportError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    profiler = None
+    if args.profile:
+        profiler = Profiler(tool="job_columns", inputs=[args.input_file], parser_version=PARSER_VERSION)
+    phase = profiler.phase if profiler else lambda name: nullcontext()
+
+    try:
+        runs = parse_runs(args.input_file, args.format, cache=cache_from_args(args, PARSER_VERSION), profiler=profiler,
+                          cores_per_l3=args.l3_cores, topology=topology_from_args(args))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for step, (title, cluster, job) in enumerate(runs, 1):
+        if title:
+            print(f"\nStep {step}: {title}")
+        with phase("columns"):
+            columns = job_columns(cluster, job)
+        with phase("metrics"):
+            metrics = job_metrics(columns)
+        print_metrics(columns, metrics)
+        if args.npz:
+            save_npz(columns, metrics, args.npz if len(runs) == 1 else f"{args.npz.removesuffix('.npz')}-step{step}.npz")
+
+    if profiler:
+        profiler.write_json(args.profile)
+
+if __name__ == "__main__":
+    main()
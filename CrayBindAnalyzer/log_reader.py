@@ -0,0 +1,256 @@
+"""
+Input helpers for MPICH output files.
+
+Job outputs are often archived compressed (.gz, .xz, .bz2, .zst). The helpers
+below detect the compression from the file's magic bytes and decompress it as
+a stream, so archived runs can be analysed without writing them to scratch.
+Large uncompressed files are memory-mapped and split into lines straight from
+the mapping instead of being read into one big string. The magic bytes are
+peeked from the handle that is then read, so pipes (/dev/stdin, <(zcat ...))
+work too; they can only be read once, and are never memory-mapped. The output of a running
+job can also be followed as it grows (see follow_log_lines).
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import mmap
+import os
+import stat
+import time
+from contextlib import contextmanager, nullcontext
+
+# Uncompressed files at least this large are memory-mapped
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Smallest chunk worth sending to a worker process when a file is split
+MIN_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Magic bytes identifying each supported compression format
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+]
+
+def is_regular_file(filename):
+    """Return True for a regular file, False for a pipe, a device or a missing file."""
+    try:
+        return stat.S_ISREG(os.stat(filename).st_mode)
+    except OSError:
+        return False
+
+def sniff_compression(f):
+    """
+    Detect the compression format of an open binary file from its first bytes, without consuming them.
+
+    Args:
+        f: Buffered binary file object (as returned by open(filename, 'rb'))
+
+    Returns:
+        One of 'gzip', 'xz', 'bz2', 'zstd', or None for an uncompressed file
+    """
+    head = f.peek(8)[:8]
+    for magic, compression in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+def detect_compression(filename):
+    """
+    Detect the compression format of a file from its first bytes.
+
+    The file is opened just for this: use it on regular files only, a pipe would lose the
+    bytes read (see open_binary and iter_log_lines, which sniff the handle they read).
+
+    Args:
+        filename: Path to the file
+
+    Returns:
+        One of 'gzip', 'xz', 'bz2', 'zstd', or None for an uncompressed file
+    """
+    with open(filename, 'rb') as f:
+        return sniff_compression(f)
+
+def _open_zstd(f, filename):
+    """Open a decompressing stream on a zstd-compressed binary file object."""
+    try:
+        # Python 3.14+ ships zstd in the standard library
+        from compression import zstd
+        return zstd.open(f, 'rb')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f"{filename} is zstd-compressed: install the 'zstandard' package to read it")
+    return zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+
+def _decompress(f, compression, filename):
+    """Open a decompressing stream on a binary file object; closing it leaves f open."""
+    if compression == 'gzip':
+        return gzip.open(f, 'rb')
+    if compression == 'xz':
+        return lzma.open(f, 'rb')
+    if compression == 'bz2':
+        return bz2.open(f, 'rb')
+    return _open_zstd(f, filename)
+
+@contextmanager
+def open_binary(filename):
+    """
+    Open a possibly compressed file as a decompressing binary stream (context manager).
+
+    The file is opened once, so this also works on pipes.
+
+    Args:
+        filename: Path to the file
+
+    Yields:
+        A readable binary file object yielding the uncompressed content
+    """
+    with open(filename, 'rb') as raw:
+        compression = sniff_compression(raw)
+        if compression is None:
+            yield raw
+        else:
+            with _decompress(raw, compression, filename) as stream:
+                yield stream
+
+def iter_log_lines(filename, prefixes=None):
+    """
+    Yield the lines of a log file, decompressing or memory-mapping it as needed.
+
+    Args:
+        filename: Path to the file (plain or compressed)
+        prefixes: Optional tuple of strings; when given, only lines starting with
+                  one of them are yielded. On memory-mapped files the filter runs
+                  on the raw bytes so that skipped lines are never decoded.
+
+    Yields:
+        Lines of text, including their trailing newline
+    """
+    with open(filename, 'rb') as raw:
+        compression = sniff_compression(raw)
+        st = os.fstat(raw.fileno())
+        if compression is None and stat.S_ISREG(st.st_mode) and st.st_size >= MMAP_THRESHOLD:
+            byte_prefixes = tuple(p.encode() for p in prefixes) if prefixes is not None else None
+            with mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for raw_line in iter(mm.readline, b''):
+                    if byte_prefixes is None or raw_line.startswith(byte_prefixes):
+                        yield raw_line.decode('utf-8', 'replace')
+            return
+
+        with (_decompress(raw, compression, filename) if compression else nullcontext(raw)) as stream:
+            text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+            if prefixes is None:
+                yield from text
+            else:
+                for line in text:
+                    if line.startswith(prefixes):
+                        yield line
+
+def split_line_chunks(filename, chunk_count, min_chunk_size=MIN_CHUNK_SIZE):
+    """
+    Split an uncompressed file into byte ranges that start and end at line boundaries.
+    
+    Args:
+        filename: Path to the file
+        chunk_count: Desired number of chunks
+        min_chunk_size: Chunks are made at least this large (fewer chunks for small files)
+    
+    Returns:
+        A list of (start, end) byte offsets covering the whole file, in file order
+    """
+    size = os.path.getsize(filename)
+    chunk_count = max(1, min(chunk_count, size // max(1, min_chunk_size)))
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        for i in range(1, chunk_count):
+            # Move each cut to the start of the next line
+            f.seek(size * i // chunk_count)
+            f.readline()
+            position = f.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def iter_log_range(filename, start, end, prefixes=None):
+    """
+    Yield the lines of a byte range of an uncompressed file (see split_line_chunks).
+    
+    Args:
+        filename: Path to the file
+        start: Offset of the first line
+        end: Offset just after the last line
+        prefixes: Optional tuple of strings; only lines starting with one of them are yielded
+    
+    Yields:
+        Lines of text, including their trailing newline
+    """
+    if start >= end:
+        return
+    byte_prefixes = tuple(p.encode() for p in prefixes) if prefixes is not None else None
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            raw_line = mm.readline()
+            if byte_prefixes is None or raw_line.startswith(byte_prefixes):
+                yield raw_line.decode('utf-8', 'replace')
+
+def follow_log_lines(filename, prefixes=None, poll_interval=1.0, idle_timeout=None):
+    """
+    Follow a growing log file (like tail -f) and yield the lines appended to it.
+    
+    The file is opened once and only the bytes appended since the previous poll are
+    read, so it is never re-read from the start. An incomplete last line is kept
+    until its newline arrives. If the file does not exist yet (pending job), it is
+    waited for.
+    
+    Args:
+        filename: Path to the (uncompressed) file
+        prefixes: Optional tuple of strings; when given, only lines starting with
+                  one of them are yielded
+        poll_interval: Seconds to wait between two polls when no data arrived
+        idle_timeout: Stop after this many seconds without new data (None: never stop)
+    
+    Yields:
+        Non-empty lists of new lines, including their trailing newline
+    """
+    byte_prefixes = tuple(p.encode() for p in prefixes) if prefixes is not None else None
+    idle = 0.0
+    
+    while not os.path.exists(filename):
+        if idle_timeout is not None and idle >= idle_timeout:
+            return
+        time.sleep(poll_interval)
+        idle += poll_interval
+    pending = b''
+    with open(filename, 'rb') as f:
+        if sniff_compression(f) is not None:
+            raise ValueError(f"{filename} is compressed and cannot be followed")
+        while True:
+            # Everything appended since the previous read
+            chunk = f.read()
+            if chunk:
+                idle = 0.0
+                data = pending + chunk
+                end = data.rfind(b'\n') + 1
+                pending = data[end:]
+                batch = [raw_line.decode('utf-8', 'replace')
+                         for raw_line in data[:end].splitlines(keepends=True)
+                         if byte_prefixes is None or raw_line.startswith(byte_prefixes)]
+                if batch:
+                    yield batch
+                continue
+            
+            if idle_timeout is not None and idle >= idle_timeout:
+                # The writer is done, flush a last line without newline
+                if pending and (byte_prefixes is None or pending.startswith(byte_prefixes)):
+                    yield [pending.decode('utf-8', 'replace')]
+                return
+            time.sleep(poll_interval)
+            idle += poll_interval
@@ -0,0 +1,81 @@
+"""
+Typed view of the MPICH environment settings printed with MPICH_ENV_DISPLAY=1.
+
+PE 0 prints every setting as "PE 0:   MPICH_ALLOC_MEM_PG_SZ   = 4096". The
+tokenizer keeps the raw strings; parse_mpich_settings() turns them into Python
+values so that rules can compare them:
+- flags (0/1) become booleans
+- sizes become integers in bytes ("4096", "2M", "1G")
+- other integers become integers, ranges such as "64-512" become (low, high) tuples
+- empty values and NULL become None, anything else stays a string
+"""
+
+import re
+
+# Settings that are on/off switches
+BOOL_SETTINGS = {
+    'MPICH_ABORT_ON_ERROR', 'MPICH_USE_SYSTEM_MEMCPY', 'MPICH_OPTIMIZED_MEMCPY', 'MPICH_MEMCPY_MEM_CHECK',
+    'MPICH_MALLOC_FALLBACK', 'MPICH_NO_BUFFER_ALIAS_CHECK', 'MPICH_SINGLE_HOST_ENABLED',
+    'MPICH_USE_PERSISTENT_TOPS', 'MPICH_DISABLE_PERSISTENT_RECV_TOPS', 'MPICH_ENABLE_ACTIVE_WAIT',
+    'MPICH_RMA_SHM_ACCUMULATE', 'MPICH_LOCAL_SPAWN_SERVER', 'MPICH_SPAWN_USE_RANKPOOL',
+    'MPICH_OFI_USE_SCALABLE_STARTUP', 'MPICH_OFI_SKIP_NIC_SYMMETRY_TEST', 'MPICH_COLL_OPT_OFF',
+    'MPICH_BCAST_ONLY_TREE',
+}
+# Suffixes of the names of the other switches (MPICH_ENV_DISPLAY, MPICH_CPUMASK_DISPLAY...)
+BOOL_SUFFIXES = ('_DISPLAY',)
+
+# Settings holding a size in bytes, which MPICH also accepts with a K/M/G suffix
+SIZE_SETTINGS = {
+    'MPICH_ALLOC_MEM_PG_SZ', 'MPICH_SMP_SINGLE_COPY_SIZE', 'MPICH_ALLTOALL_BLK_SIZE',
+    'MPICH_GATHERV_MAX_TMP_SIZE', 'MPICH_GATHERV_SHORT_MSG', 'MPICH_SCATTERV_SHORT_MSG',
+}
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+SIZE_PATTERN = re.compile(r'(\d+)\s*([KMG]?)B?', re.IGNORECASE)
+INT_PATTERN = re.compile(r'-?\d+')
+RANGE_PATTERN = re.compile(r'(\d+)-(\d+)')
+
+def parse_setting_value(name, raw):
+    """
+    Convert the raw value of one MPICH setting to a typed value.
+
+    Args:
+        name: Name of the setting (e.g. MPICH_ALLOC_MEM_PG_SZ)
+        raw: Value as printed by MPICH, without surrounding spaces
+
+    Returns:
+        A bool, int, (low, high) tuple, string, or None when the setting is unset
+    """
+    if raw == '' or raw.upper() == 'NULL':
+        return None
+    if (name in BOOL_SETTINGS or name.endswith(BOOL_SUFFIXES)) and raw in ('0', '1'):
+        return raw == '1'
+    if name in SIZE_SETTINGS:
+        match = SIZE_PATTERN.fullmatch(raw)
+        if match:
+            return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+    if INT_PATTERN.fullmatch(raw):
+        return int(raw)
+    match = RANGE_PATTERN.fullmatch(raw)
+    if match:
+        return int(match.group(1)), int(match.group(2))
+    return raw
+
+def parse_mpich_settings(raw_settings):
+    """
+    Convert the raw MPICH settings collected by the tokenizer.
+
+    Args:
+        raw_settings: Dictionary setting name -> raw value
+
+    Returns:
+        A dictionary setting name -> typed value (see parse_setting_value), sorted by name
+    """
+    return {name: parse_setting_value(name, raw) for name, raw in sorted(raw_settings.items())}
+
+def format_size(size):
+    """Format a size in bytes with the largest exact unit, e.g. 4096 -> "4 KB", 2097152 -> "2 MB"."""
+    for unit in ('G', 'M', 'K'):
+        if size and size % SIZE_UNITS[unit] == 0:
+            return f"{size // SIZE_UNITS[unit]} {unit}B"
+    return f"{size} B"
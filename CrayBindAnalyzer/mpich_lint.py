@@ -0,0 +1,144 @@
+"""
+Performance lint rules on the MPICH settings of a job (see mpich_env).
+
+A setting is rarely wrong on its own: it becomes slow for a given job shape
+(ranks per node, binding, NICs). Each rule therefore receives the cluster, the
+job and its typed settings, and returns a Finding when the combination is known
+to cost performance, or None. Rules are registered with the @rule decorator and
+run in registration order by lint_job().
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from mpich_env import format_size
+
+# Ranks per node up to which each rank owns a large share of the node memory
+# (at least 16 GB on a 256 GB node) and small allocation pages cost TLB misses
+LARGE_MEMORY_RANKS_PER_NODE = 16
+
+# Largest page size still considered "small" for MPICH_ALLOC_MEM_PG_SZ
+SMALL_PAGE_SIZE = 4096
+
+@dataclass(frozen=True, slots=True)
+class Finding:
+    """A performance-relevant setting, with the reason and the suggested change."""
+    rule: str
+    setting: str
+    message: str
+    suggestion: str
+
+# Registered rules: name -> rule(cluster, job, settings) -> Finding or None
+RULES = {}
+
+def rule(name):
+    """Decorator registering a lint rule under a name."""
+    def register(function):
+        RULES[name] = function
+        return function
+    return register
+
+def lint_job(cluster, job):
+    """
+    Run every registered rule on a job.
+
+    Args:
+        cluster: Cluster of the job
+        job: Job whose mpich_settings were parsed from the output
+
+    Returns:
+        A list of Finding, empty when the output has no MPICH settings or nothing is flagged
+    """
+    settings = job.mpich_settings
+    if not settings or not job.mpi_tasks:
+        return []
+    findings = []
+    for check in RULES.values():
+        finding = check(cluster, job, settings)
+        if finding:
+            findings.append(finding)
+    return findings
+
+def max_ranks_per_node(job):
+    """Return the largest number of ranks placed on one node."""
+    return max(Counter(task.node.name for task in job.mpi_tasks).values(), default=0)
+
+@rule("alloc-page-size")
+def check_alloc_page_size(cluster, job, settings):
+    """Small MPI_Alloc_mem / RMA window pages on ranks that own a large share of the node memory."""
+    page_size = settings.get('MPICH_ALLOC_MEM_PG_SZ')
+    ranks_per_node = max_ranks_per_node(job)
+    if not isinstance(page_size, int) or page_size > SMALL_PAGE_SIZE or ranks_per_node > LARGE_MEMORY_RANKS_PER_NODE:
+        return None
+    return Finding("alloc-page-size", 'MPICH_ALLOC_MEM_PG_SZ',
+                   f"{format_size(page_size)} allocation pages with {ranks_per_node} ranks per node "
+                   f"(large-memory ranks): memory allocated by MPI pays TLB misses",
+                   "load a craype-hugepages module and set MPICH_ALLOC_MEM_PG_SZ=2M")
+
+@rule("nic-policy")
+def check_nic_policy(cluster, job, settings):
+    """BLOCK NIC policy although ranks sit in one NUMA domain, so a NUMA-local NIC exists."""
+    if settings.get('MPICH_OFI_NIC_POLICY') != 'BLOCK':
+        return None
+    mismatches = 0
+    bound_ranks = 0
+    multi_numa_ranks = 0
+    numa_ranks = Counter()
+    for task in job.mpi_tasks:
+        if len(task.node.node_type.nic_index) < 2 or not task.cpu_set:
+            continue
+        numa_domains = task.node.get_numa_domains(task.cpu_set)
+        if len(numa_domains) != 1:
+            # Ranks spanning several NUMA domains have no single local NIC: only the others are checked
+            multi_numa_ranks += 1
+            continue
+        bound_ranks += 1
+        numa = numa_domains[0]
+        numa_ranks[(task.node.name, numa.id)] += 1
+        if task.selected_nics and task.selected_nics[0].numa_domain.id != numa.id:
+            mismatches += 1
+    if not bound_ranks:
+        return None
+    one_rank_per_numa = max(numa_ranks.values()) == 1
+    if not mismatches and not one_rank_per_numa:
+        return None
+    if not mismatches:
+        # The ranks use their local NIC, but only because of the rank placement
+        return Finding("nic-policy", 'MPICH_OFI_NIC_POLICY',
+                       f"BLOCK NIC policy with one rank per NUMA domain: the {bound_ranks} ranks use a local NIC "
+                       f"only because of their placement",
+                       "set MPICH_OFI_NIC_POLICY=NUMA so that the ranks keep a local NIC when the placement changes")
+    shape = "one rank per NUMA domain" if one_rank_per_numa else "every rank bound to one NUMA domain"
+    skipped = ""
+    if multi_numa_ranks:
+        shape = "ranks bound to one NUMA domain"
+        skipped = f" ({multi_numa_ranks} ranks spanning several NUMA domains not counted)"
+    return Finding("nic-policy", 'MPICH_OFI_NIC_POLICY',
+                   f"BLOCK NIC policy with {shape}: {mismatches} of {bound_ranks} ranks "
+                   f"use a NIC on another NUMA domain{skipped}",
+                   "set MPICH_OFI_NIC_POLICY=NUMA so that each rank uses the NIC closest to its cores")
+
+@rule("active-wait")
+def check_active_wait(cluster, job, settings):
+    """Active waiting while ranks run more OpenMP threads than they have CPUs."""
+    if settings.get('MPICH_ENABLE_ACTIVE_WAIT') is not True:
+        return None
+    oversubscribed = [task.id for task in job.mpi_tasks
+                      if task.cpu_set and len(task.openmp_threads) > len(task.cpu_set)]
+    if not oversubscribed:
+        return None
+    return Finding("active-wait", 'MPICH_ENABLE_ACTIVE_WAIT',
+                   f"active waiting with {len(oversubscribed)} ranks running more OpenMP threads than CPUs: "
+                   f"spinning MPI calls steal the CPUs of the threads",
+                   "unset MPICH_ENABLE_ACTIVE_WAIT or give each thread its own CPU")
+
+@rule("single-copy")
+def check_single_copy(cluster, job, settings):
+    """Single-copy intra-node transfers disabled while several ranks share a node."""
+    mode = settings.get('MPICH_SMP_SINGLE_COPY_MODE')
+    ranks_per_node = max_ranks_per_node(job)
+    if mode != 'NONE' or ranks_per_node < 2:
+        return None
+    return Finding("single-copy", 'MPICH_SMP_SINGLE_COPY_MODE',
+                   f"single-copy disabled with {ranks_per_node} ranks per node: "
+                   f"large intra-node messages are copied twice through shared memory",
+                   "unset MPICH_SMP_SINGLE_COPY_MODE (XPMEM or CMA by default)")
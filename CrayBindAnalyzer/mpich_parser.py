@@ -1,60 +1,469 @@
 #!/usr/bin/env python3
 
+import argparse
+import glob
+import hashlib
 import re
 import sys
 import os
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from hpc_topology import (
-    Cluster, Node, NUMADomain, PhysicalCore, 
-    LogicalCPU, NIC, MPITask, OpenMPThread, Job, print_run,
-    format_id_ranges, format_id_ranges_as_list
+    Cluster, Node, NodeType, NUMADomain, PhysicalCore, 
+    LogicalCPU, NIC, GPU, CacheDomain, MPITask, OpenMPThread, Job, CpuSet, print_run,
+    format_id_ranges, format_id_ranges_as_list, parse_cpu_list, detect_sibling_stride
 )
+from cpu_models import lookup_cpu_model
+from topology_import import build_node_type, add_topology_argument, topology_from_args
+from mpich_env import parse_mpich_settings
+from log_reader import iter_log_lines, iter_log_range, split_line_chunks, detect_compression, is_regular_file
+from parse_cache import add_cache_arguments, cache_from_args
+from profiler import Profiler, add_profile_argument
 
 # Global debug flag
 DEBUG = False
 
+# Version of the record format produced by the tokenizer. Bump it whenever the
+# records change so that cached parses from older versions are ignored.
+PARSER_VERSION = 4
+
+# Parser attributes holding the tokenizer records (see MPICHParser.get_records)
+RECORD_FIELDS = (
+    'mpi_task_info', 'cpumask_info', 'host_info', 'numa_info', 'numa_count',
+    'nic_info', 'nic_count', 'selected_nic_info', 'thread_info', 'env_info',
+    'gpu_info', 'gpu_binding_info', 'cpu_model_info',
+)
+
+# Patterns whose matches are counted by the tokenizer (profiling counters matched.<name>);
+# every matching line counts, including the lines repeated by each PE
+MATCH_COUNTERS = (
+    'rank', 'cpumask', 'hostname', 'numa_count', 'numa_domain', 'nic_count', 'nic',
+    'selected_nic', 'omp_thread', 'mpich_env', 'cpu_model', 'gpu_topology', 'gpu_binding',
+)
+
+# Profiling counters of the lines read (see Profiler.count_lines), returned by the scan workers
+LINE_COUNTERS = ('lines_scanned', 'lines_bytes')
+
+# Uncompressed files at least this large are tokenized in parallel chunks when
+# several worker processes are allowed
+PARALLEL_SCAN_THRESHOLD = 32 * 1024 * 1024
+
+# Identity of each list record when merging shards: two records with the same key
+# describe the same thing (e.g. the cpumask of one PE) and must agree
+RECORD_KEYS = {
+    'mpi_task_info': lambda r: r[0],                        # rank
+    'cpumask_info': lambda r: r[0],                         # PE
+    'numa_info': lambda r: (r[0], r[1]),                    # PE, NUMA domain
+    'nic_info': lambda r: (r[0], r[1]),                     # PE, NIC index
+    'selected_nic_info': lambda r: (r[0], r[2]),            # PE, NIC index
+    'thread_info': lambda r: (r[0], r[1], r[2]),            # node, PID, thread
+    'gpu_info': lambda r: (r[0], r[1]),                     # node, GPU index
+    'gpu_binding_info': lambda r: r[0],                     # rank
+}
+
+# Line patterns used by the single-pass tokenizer. Each line is first dispatched
+# on its prefix ("[PE_", "PE n:", "CCE OMP:") so that only the handful of
+# relevant lines are matched against a regular expression.
+RANK_PATTERN = re.compile(r'\[PE_\d+\]: rank (\d+) is on (nid\d+)')
+# Format: [PE_2]: cpumask set to 4 cpus on nid005187, cpumask = 0000...0110 (rightmost digit is CPU 0)
+CPUMASK_PATTERN = re.compile(r'\[PE_(\d+)\]: cpumask set to (\d+) cpus on (nid\d+), cpumask = ([01]+)')
+# Topology lines are printed by one or more PEs, each one after a "PE n: Hostname: nidX" line
+HOSTNAME_PATTERN = re.compile(r'PE (\d+): Hostname: (nid\d+)')
+NUMA_COUNT_PATTERN = re.compile(r'PE (\d+):\s+Number of NUMA domains:\s+(\d+)')
+NUMA_PATTERN = re.compile(r'PE (\d+):\s+numa_domain (\d+): cpu_list=\[([^\]]+)\]')
+NIC_COUNT_PATTERN = re.compile(r'PE (\d+):\s+Number of NICs:\s+(\d+)')
+NIC_PATTERN = re.compile(r'PE (\d+):\s+nic_index (\d+): domain_name=([^,]+), numa_domain=(\d+), addr=([^\s]+)')
+# Format: PE 3: Host nid005187 selected NIC index=1, domain_name=cxi1, numa_node=1, address=[0x73c2]
+SELECTED_NIC_PATTERN = re.compile(r'PE (\d+): Host (nid\d+) selected NIC index=(\d+), domain_name=([^,]+), numa_node=(\d+)')
+# The affinity is the OMP_AFFINITY_FORMAT %A field: any CPU list such as "1 65", "0-7,64-71" or "5"
+THREAD_PATTERN = re.compile(r'CCE OMP: host (nid\d+) pid (\d+) tid \d+ thread (\d+) affinity:\s*([0-9][0-9,\-: ]*)')
+# Processor line: "PE 0:   AMD Trento (25:48:1) (family:model:stepping)"
+CPU_MODEL_PATTERN = re.compile(r'PE (\d+):\s+(.+?) \((\d+):(\d+):(\d+)\) \(family:model:stepping\)')
+# MPICH_ENV_DISPLAY lines: "PE 0:   MPICH_ALLOC_MEM_PG_SZ    = 4096" (the value may be empty)
+ENV_PATTERN = re.compile(r'PE \d+:\s+(MPICH_\w+)\s+= ?(.*?)\s*$')
+# GPU lines printed by the GPU selection wrapper of the job script (see README), e.g.
+#   GPU topology: host nid005031 gpu 0 numa_node=3 bus_id=c1
+#   GPU binding: rank 3 on nid005031 ROCR_VISIBLE_DEVICES=3
+GPU_TOPOLOGY_PATTERN = re.compile(r'GPU topology: host (\S+) gpu (\d+) numa_node=(-?\d+)(?: bus_id=(\S+))?')
+GPU_BINDING_PATTERN = re.compile(r'GPU binding: rank (\d+) on (\S+) ROCR_VISIBLE_DEVICES=([\d,]*)')
+# hello_jobstep lines (one per OpenMP thread), GPU_ID being the ROCR_VISIBLE_DEVICES index:
+#   MPI 000 - OMP 000 - HWT 049 - Node nid005031 - RT_GPU_ID 0 - GPU_ID 0 - Bus_ID d1
+HELLO_JOBSTEP_PATTERN = re.compile(r'MPI\s+(\d+) - OMP\s+\d+ - HWT\s+[\d,]+(?: \([^)]*\))? - Node (\S+) - '
+                                   r'RT_GPU_ID [\d,]+ - GPU_ID ([\d,]+)')
+
+# Only lines starting with one of these prefixes can carry a record
+LINE_PREFIXES = ('PE ', '[PE_', 'CCE OMP:', 'GPU ', 'MPI ')
+
 class MPICHParser:
-    """Parser for MPICH output files that builds a topology model and job information."""
+    """Parser for MPICH output files that builds a topology model and job information.
     
-    def __init__(self, filename):
-        """Initialize the parser with the input filename."""
+    The file is read exactly once, line by line. Every relevant line is turned into a
+    compact record tuple by a prefix-dispatched handler, and the Cluster/Job model is
+    built from those records. Only the records are kept in memory, never the file.
+    """
+    
+    def __init__(self, filename, cache=None, jobs=1, profiler=None, cores_per_l3=None, topology=None):
+        """
+        Initialize the parser with the input filename.
+        
+        Args:
+            filename: Path to the MPICH output file (plain or compressed)
+            cache: Optional ParseCache; on a hit the file is not read at all
+            jobs: Number of worker processes used to tokenize large uncompressed files
+            profiler: Optional Profiler recording phase times and counters
+            cores_per_l3: Physical cores sharing an L3 cache (default: from the CPU model line, if known)
+            topology: Optional TopologyTemplate (see topology_import) giving the layout of the nodes
+                      that print none, or print the same NUMA domains
+        """
         self.filename = filename
-        self.content = self._read_file(filename)
+        self.cache = cache
+        self.jobs = jobs
+        self.profiler = profiler
+        self.cores_per_l3 = cores_per_l3
+        self.topology = topology
+        self.template_node_type = build_node_type(topology) if topology else None
         self.cluster = Cluster()
         self.nodes_dict = {}
-        self.numa_domains_dict = {}
+        self.node_types = {}          # layout signature -> shared NodeType
         self.job = None
+        
+        # Records collected by the tokenizer
+        self.mpi_task_info = []       # (rank_id, node_name)
+        self.cpumask_info = []        # (pe_id, node_name, cpu_count, mask)
+        self.host_info = {}           # pe_id -> node_name from "Hostname:" lines
+        self.numa_info = []           # (pe_id, numa_id, cpu_ranges)
+        self.numa_count = {}          # pe_id -> announced number of NUMA domains
+        self.nic_info = []            # (pe_id, nic_index, domain_name, numa_id, addr)
+        self.nic_count = {}           # pe_id -> announced number of NICs
+        self.selected_nic_info = []   # (pe_id, node_name, nic_index, domain_name, numa_node)
+        self.thread_info = []         # (node_name, pid, thread_id, mask)
+        self.env_info = {}            # MPICH setting name -> raw value (MPICH_ENV_DISPLAY)
+        self.gpu_info = []            # (node_name, gpu_id, numa_id, bus_id)
+        self.gpu_binding_info = []    # (rank_id, node_name, gpu_ids)
+        self.cpu_model_info = {}      # pe_id -> (name, family, model, stepping) of the processor line
+        self.match_counts = Counter() # pattern name (MATCH_COUNTERS) -> lines matched by this parser's scans
     
-    def _read_file(self, filename):
-        """Read the content of the MPICH output file."""
-        with open(filename, 'r') as f:
-            return f.read()
+    def _iter_lines(self, filename):
+        """
+        Yield the relevant lines of the MPICH output file one at a time.
+        
+        Compressed files (.gz, .xz, .bz2, .zst) are decompressed as a stream and
+        large plain files are memory-mapped (see log_reader).
+        """
+        return iter_log_lines(filename, prefixes=LINE_PREFIXES)
     
     def parse(self):
         """Parse the file and build the topology model and job."""
-        self._parse_nodes()
-        self._parse_numa_domains()
-        self._parse_nics()
-        self._parse_job()
+        self.scan()
+        return self.build()
+    
+    def scan(self):
+        """Tokenize the file, or restore its records from the cache."""
+        if self.profiler:
+            self.profiler.count('input_bytes', os.path.getsize(self.filename))
+        
+        records = None
+        if self.cache:
+            with self._phase('cache_load'):
+                records = self.cache.load(self.filename)
+        if records is not None:
+            self.load_records(records)
+            return
+        
+        with self._phase('scan'):
+            if self._use_parallel_scan():
+                self._parallel_scan()
+            else:
+                lines = self._iter_lines(self.filename)
+                if self.profiler:
+                    lines = self.profiler.count_lines(lines)
+                self._scan(lines)
+        if self.cache:
+            with self._phase('cache_store'):
+                self.cache.store(self.filename, self.get_records())
+    
+    def _phase(self, name):
+        """Context manager timing a phase when profiling, doing nothing otherwise."""
+        return self.profiler.phase(name) if self.profiler else nullcontext()
+    
+    def feed(self, lines):
+        """
+        Tokenize more lines of the output, e.g. the lines appended to a running job's output.
+        
+        The records are accumulated, so the file never needs to be read again; call
+        build() to get the model reflecting all the lines fed so far.
+        
+        Args:
+            lines: Iterable of text lines
+        """
+        self._scan(lines)
+    
+    def build(self):
+        """
+        Assemble the topology model and job from the records collected so far.
+        
+        Can be called repeatedly while lines are fed: the nodes and the shared node
+        types are kept and updated, the job is rebuilt from the records.
+        
+        Returns:
+            A tuple (cluster, job)
+        """
+        with self._phase('build.nodes'):
+            self._parse_nodes()
+        with self._phase('build.node_types'):
+            self._parse_node_types()
+        with self._phase('build.job'):
+            self._parse_job()
+        if self.profiler:
+            self._count_model()
         return self.cluster, self.job
     
-    def _parse_nodes(self):
-        """Extract node information and create Node objects."""
-        # Regular expression to extract node information
-        node_pattern = re.compile(r'\[PE_\d+\]: rank \d+ is on (nid\d+)')
-        
-        # Extract unique node names
-        node_names = set()
-        for match in node_pattern.finditer(self.content):
-            node_name = match.group(1)
-            node_names.add(node_name)
-        
-        # Create Node objects and add them to the cluster
-        for node_name in node_names:
-            node = Node(name=node_name, numa_domains=[])
+    def _count_model(self):
+        """Set the profiling counters describing the records and the model built from them."""
+        counters = self.profiler.counters
+        # Records restored from the cache were not matched again: their lines count as 0
+        for name in MATCH_COUNTERS:
+            counters[f'matched.{name}'] = self.match_counts[name]
+        
+        # Topology objects are shared by all the nodes of a node type
+        counters['objects.nodes'] = len(self.cluster.nodes)
+        counters['objects.node_types'] = len(self.node_types)
+        counters['objects.numa_domains'] = sum(len(t.numa_domains) for t in self.node_types.values())
+        counters['objects.cores'] = sum(t.core_count for t in self.node_types.values())
+        counters['objects.logical_cpus'] = sum(t.logical_cpu_count for t in self.node_types.values())
+        counters['objects.nics'] = sum(len(t.nic_index) for t in self.node_types.values())
+        counters['objects.gpus'] = sum(len(t.gpu_index) for t in self.node_types.values())
+        counters['objects.mpi_tasks'] = len(self.job.mpi_tasks)
+        counters['objects.openmp_threads'] = sum(len(task.openmp_threads) for task in self.job.mpi_tasks)
+    
+    def get_records(self):
+        """
+        Return the records collected by the tokenizer as plain, picklable data.
+        
+        Returns:
+            A dictionary with one entry per record field, plus the node names in order
+            of appearance and the number of lines matched per pattern
+        """
+        records = {name: getattr(self, name) for name in RECORD_FIELDS}
+        records['node_names'] = [node.name for node in self.cluster.nodes]
+        records['match_counts'] = dict(self.match_counts)
+        return records
+    
+    def load_records(self, records):
+        """
+        Restore the records of a previous scan (see get_records) instead of reading the file.
+        
+        Args:
+            records: Dictionary returned by get_records
+        """
+        for name in RECORD_FIELDS:
+            setattr(self, name, records[name])
+        for node_name in records['node_names']:
+            self._get_or_create_node(node_name)
+    
+    def _use_parallel_scan(self):
+        """Whether the file is large enough, and uncompressed, to be tokenized in parallel chunks."""
+        return (self.jobs > 1
+                and is_regular_file(self.filename)
+                and os.path.getsize(self.filename) >= PARALLEL_SCAN_THRESHOLD
+                and detect_compression(self.filename) is None)
+    
+    def _parallel_scan(self):
+        """
+        Tokenize the file in byte-range chunks cut at line boundaries, one worker process per chunk.
+        
+        Workers return the records of their chunk; concatenating them in chunk order
+        gives exactly the records (and the node order) of a serial scan.
+        """
+        chunks = split_line_chunks(self.filename, self.jobs * 2)
+        worker = partial(scan_chunk, self.filename, profile=bool(self.profiler))
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(chunks))) as executor:
+            chunk_records = list(executor.map(worker, *zip(*chunks)))
+        
+        for records in chunk_records:
+            for name in RECORD_FIELDS:
+                if isinstance(records[name], dict):
+                    getattr(self, name).update(records[name])
+                else:
+                    getattr(self, name).extend(records[name])
+            for node_name in records['node_names']:
+                self._get_or_create_node(node_name)
+            self.match_counts.update(records['match_counts'])
+            if self.profiler:
+                self.profiler.counters.update(records['line_counts'])
+    
+    def merge_records(self, shard_records):
+        """
+        Merge the records of several shards of the same job (see get_records).
+        
+        PE ids and node names are global to the job, so the records are reconciled
+        on their identity: duplicates (e.g. the same shard given twice) are dropped
+        and, when two shards disagree, the first one wins. The merged records are
+        ordered by PE and nodes by their lowest PE, so the result does not depend on
+        the order of the shards.
+        
+        Args:
+            shard_records: List of dictionaries returned by get_records
+        """
+        for name in RECORD_FIELDS:
+            key = RECORD_KEYS.get(name)
+            merged = {}
+            for records in shard_records:
+                items = records[name].items() if key is None else ((key(r), r) for r in records[name])
+                for record_key, record in items:
+                    previous = merged.setdefault(record_key, record)
+                    if DEBUG and previous != record:
+                        print(f"Warning: conflicting {name} records for {record_key}: {previous} / {record}")
+            if key is None:
+                setattr(self, name, dict(sorted(merged.items())))
+            else:
+                setattr(self, name, [merged[record_key] for record_key in sorted(merged)])
+        
+        # Lines matched in the shards are counted even when their records are duplicates
+        for records in shard_records:
+            self.match_counts.update(records['match_counts'])
+        
+        # Nodes are ordered by the lowest PE they host, the others follow by name
+        node_names = {name for records in shard_records for name in records['node_names']}
+        lowest_pe = {}
+        for pe_id, node_name in sorted(self._get_pe_hosts().items(), reverse=True):
+            lowest_pe[node_name] = pe_id
+        for node_name in sorted(node_names, key=lambda name: (lowest_pe.get(name, float('inf')), name)):
+            self._get_or_create_node(node_name)
+    
+    def _scan(self, lines):
+        """
+        Tokenize the output in a single pass.
+        
+        Each line is dispatched on its prefix to a handler which appends a compact
+        record; nodes are created as soon as their first rank line is seen.
+        
+        Args:
+            lines: Iterable of text lines
+        """
+        for line in lines:
+            if line.startswith('PE '):
+                self._handle_pe_line(line)
+            elif line.startswith('[PE_'):
+                self._handle_pe_bracket_line(line)
+            elif line.startswith('CCE OMP:'):
+                self._handle_omp_line(line)
+            elif line.startswith(('GPU ', 'MPI ')):
+                self._handle_gpu_line(line)
+    
+    def _handle_pe_bracket_line(self, line):
+        """Handle a "[PE_n]: ..." line (rank placement and cpumask)."""
+        if 'cpumask' in line:
+            match = CPUMASK_PATTERN.match(line)
+            if match:
+                self.match_counts['cpumask'] += 1
+                node_name = match.group(3)
+                # The binary string is converted in one call; bit n of the integer is CPU n
+                self.cpumask_info.append((int(match.group(1)), node_name, int(match.group(2)), int(match.group(4), 2)))
+                self._get_or_create_node(node_name)
+            return
+        match = RANK_PATTERN.match(line)
+        if match:
+            self.match_counts['rank'] += 1
+            rank_id = int(match.group(1))
+            node_name = match.group(2)
+            self.mpi_task_info.append((rank_id, node_name))
+            self._get_or_create_node(node_name)
+    
+    def _handle_pe_line(self, line):
+        """Handle a "PE n: ..." line (hostnames, NUMA domains, NICs, NIC selection and MPICH settings)."""
+        if 'numa_domain ' in line:
+            match = NUMA_PATTERN.match(line)
+            if match:
+                self.match_counts['numa_domain'] += 1
+                self.numa_info.append((int(match.group(1)), int(match.group(2)), match.group(3).split(',')))
+        elif 'nic_index ' in line:
+            match = NIC_PATTERN.match(line)
+            if match:
+                self.match_counts['nic'] += 1
+                self.nic_info.append((int(match.group(1)), int(match.group(2)), match.group(3),
+                                      int(match.group(4)), match.group(5)))
+        elif 'selected NIC' in line:
+            match = SELECTED_NIC_PATTERN.match(line)
+            if match:
+                self.match_counts['selected_nic'] += 1
+                self.selected_nic_info.append((int(match.group(1)), match.group(2), int(match.group(3)),
+                                               match.group(4), int(match.group(5))))
+        elif 'Number of ' in line:
+            match = NUMA_COUNT_PATTERN.match(line)
+            if match:
+                self.match_counts['numa_count'] += 1
+                self.numa_count[int(match.group(1))] = int(match.group(2))
+                return
+            match = NIC_COUNT_PATTERN.match(line)
+            if match:
+                self.match_counts['nic_count'] += 1
+                self.nic_count[int(match.group(1))] = int(match.group(2))
+        elif 'Hostname:' in line:
+            match = HOSTNAME_PATTERN.match(line)
+            if match:
+                self.match_counts['hostname'] += 1
+                self.host_info[int(match.group(1))] = match.group(2)
+                self._get_or_create_node(match.group(2))
+        elif 'MPICH_' in line:
+            match = ENV_PATTERN.match(line)
+            if match:
+                self.match_counts['mpich_env'] += 1
+                self.env_info[match.group(1)] = match.group(2)
+        elif 'family:model' in line:
+            match = CPU_MODEL_PATTERN.match(line)
+            if match:
+                self.match_counts['cpu_model'] += 1
+                self.cpu_model_info[int(match.group(1))] = (match.group(2), int(match.group(3)),
+                                                            int(match.group(4)), int(match.group(5)))
+    
+    def _handle_omp_line(self, line):
+        """Handle a "CCE OMP: ..." thread affinity line."""
+        match = THREAD_PATTERN.match(line)
+        if match:
+            self.match_counts['omp_thread'] += 1
+            try:
+                cpu_set = parse_cpu_list(match.group(4))
+            except ValueError as e:
+                # e.g. the last line of a job killed while writing it; the other lines are still used
+                if DEBUG:
+                    print(f"Warning: skipping OpenMP affinity line: {e}")
+                return
+            self.thread_info.append((match.group(1), int(match.group(2)), int(match.group(3)), cpu_set.mask))
+    
+    def _handle_gpu_line(self, line):
+        """Handle a GPU topology or binding line ("GPU topology:", "GPU binding:" or hello_jobstep)."""
+        if line.startswith('MPI '):
+            match = HELLO_JOBSTEP_PATTERN.match(line)
+        elif line.startswith('GPU binding:'):
+            match = GPU_BINDING_PATTERN.match(line)
+        else:
+            match = GPU_TOPOLOGY_PATTERN.match(line)
+            if match:
+                self.match_counts['gpu_topology'] += 1
+                # numa_node is -1 when the kernel does not know the NUMA domain of the device
+                if int(match.group(3)) >= 0:
+                    self.gpu_info.append((match.group(1), int(match.group(2)), int(match.group(3)), match.group(4)))
+            return
+        if match:
+            self.match_counts['gpu_binding'] += 1
+            gpu_ids = tuple(int(gpu_id) for gpu_id in match.group(3).split(',') if gpu_id)
+            self.gpu_binding_info.append((int(match.group(1)), match.group(2), gpu_ids))
+            self._get_or_create_node(match.group(2))
+    
+    def _get_or_create_node(self, node_name):
+        """Return the Node with this name, creating it and adding it to the cluster if needed."""
+        node = self.nodes_dict.get(node_name)
+        if node is None:
+            node = Node(name=node_name)
             self.nodes_dict[node_name] = node
             self.cluster.nodes.append(node)
-        
+        return node
+    
+    def _parse_nodes(self):
+        """Report the nodes created while scanning the rank placement lines."""
         if DEBUG:
             print(f"Created cluster with {len(self.cluster.nodes)} nodes:")
             for node in self.cluster.nodes:
@@ -62,91 +471,256 @@ class MPICHParser:
     
     def _extract_numa_domains(self):
         """
-        Extract NUMA domain information from the content.
+        Return the NUMA domain information collected while scanning, per PE.
         
         Returns:
-            A list of tuples (numa_id, cpu_ranges) where cpu_ranges is a list of
-            strings representing the ranges of CPUs in that NUMA domain.
+            A dictionary pe_id -> list of tuples (numa_id, cpu_ranges) where cpu_ranges
+            is a list of strings representing the ranges of CPUs in that NUMA domain.
         """
-        numa_info = []
+        numa_by_pe = defaultdict(list)
+        for pe_id, numa_id, cpu_ranges in self.numa_info:
+            numa_by_pe[pe_id].append((numa_id, cpu_ranges))
         
         # First determine if there's NUMA domain information in the content
-        numa_count_pattern = re.compile(r'PE 0:\s+Number of NUMA domains:\s+(\d+)')
-        numa_count_match = numa_count_pattern.search(self.content)
-        
-        if not numa_count_match:
+        if not self.numa_count:
             if DEBUG:
                 print("Warning: Could not find NUMA domain count information")
-            return numa_info
-        
-        # Extract NUMA domain information
-        numa_pattern = re.compile(r'PE 0:\s+numa_domain (\d+): cpu_list=\[([^\]]+)\]')
-        
-        for match in numa_pattern.finditer(self.content):
-            numa_id = int(match.group(1))
-            cpu_list_str = match.group(2)
-            cpu_ranges = cpu_list_str.split(',')
-            numa_info.append((numa_id, cpu_ranges))
+            return {}
         
         # Make sure the number of NUMA domains we found matches the expected count
-        expected_count = int(numa_count_match.group(1))
-        if len(numa_info) != expected_count and DEBUG:
-            print(f"Warning: Expected {expected_count} NUMA domains but found {len(numa_info)}")
+        for pe_id, expected_count in self.numa_count.items():
+            if len(numa_by_pe[pe_id]) != expected_count and DEBUG:
+                print(f"Warning: Expected {expected_count} NUMA domains but found {len(numa_by_pe[pe_id])} (PE {pe_id})")
         
-        return numa_info
+        return numa_by_pe
     
-    def _parse_numa_domains(self):
-        """Parse NUMA domain information and add it to nodes."""
-        # Extract NUMA domain information
-        numa_info = self._extract_numa_domains()
+    def _get_pe_hosts(self):
+        """
+        Return the node each PE runs on, from the "Hostname:", rank, cpumask and NIC selection lines.
+        
+        Returns:
+            A dictionary pe_id -> node_name
+        """
+        pe_hosts = {}
+        for rank_id, node_name in self.mpi_task_info:
+            pe_hosts[rank_id] = node_name
+        for pe_id, node_name, _, _ in self.cpumask_info:
+            pe_hosts.setdefault(pe_id, node_name)
+        for pe_id, node_name, _, _, _ in self.selected_nic_info:
+            pe_hosts.setdefault(pe_id, node_name)
+        pe_hosts.update(self.host_info)
+        return pe_hosts
+    
+    def _parse_node_types(self):
+        """
+        Build one shared NodeType per distinct node layout and assign it to the nodes.
         
-        if not numa_info:
+        Every host that printed its NUMA/NIC layout gets a signature computed from that
+        layout (and from its GPUs, if printed); hosts with the same signature share a
+        single NodeType. Nodes that did not print any layout use the one printed by the
+        lowest PE, or the topology template when one is given. A printed layout that
+        matches the template is replaced by it, which adds the exact SMT siblings and
+        L3 caches of the template.
+        """
+        numa_by_pe = self._extract_numa_domains()
+        nic_by_pe = self._extract_nic_info()
+        gpu_by_host = self._extract_gpu_info()
+        
+        default_node_type = self.template_node_type
+        if default_node_type is not None:
+            self.node_types[default_node_type.signature] = default_node_type
+            if DEBUG:
+                print(f"Using the node layout template {self.topology.source} (type {default_node_type.signature})")
+        elif not numa_by_pe:
             if DEBUG:
                 print("Warning: No NUMA domain information found")
             return
         
-        # For each node, create all the NUMA domains
-        for node_name, node in self.nodes_dict.items():
-            for numa_id, cpu_ranges in numa_info:
-                # Create the NUMA domain
-                numa_domain = NUMADomain(id=numa_id, node=node)
-                node.numa_domains.append(numa_domain)
-                self.numa_domains_dict[(node_name, numa_id)] = numa_domain
-                
-                # Process all CPU ranges together in a simpler way
-                self._add_cpus_to_numa_domain(numa_domain, cpu_ranges)
+        pe_hosts = self._get_pe_hosts()
+        cores_per_l3 = self._get_cores_per_l3()
+        template_layout = self.topology.numa_layout() if self.topology else None
+        layout_hosts = set()
+        
+        for pe_id in sorted(numa_by_pe):
+            node_name = pe_hosts.get(pe_id)
+            # The same host may be described by several PEs, the first one is kept
+            if node_name in layout_hosts:
+                continue
+            
+            numa_info = sorted(numa_by_pe[pe_id])
+            nic_info = sorted(nic_by_pe.get(pe_id, []))
+            gpu_info = gpu_by_host.get(node_name, [])
+            # The L3 geometry is the same for the whole job, it does not take part in the signature
+            signature = self._layout_signature(numa_info, nic_info, gpu_info)
+            node_type = self.node_types.get(signature)
+            if node_type is None and template_layout and self._matches_template(template_layout, numa_info, nic_info, gpu_info):
+                node_type = self.template_node_type
+            if node_type is None:
+                node_type = self._build_node_type(signature, numa_info, nic_info, gpu_info, cores_per_l3)
+                self.node_types[signature] = node_type
+            if default_node_type is None:
+                default_node_type = node_type
+            
+            if node_name is None:
+                continue
+            layout_hosts.add(node_name)
+            node = self._get_or_create_node(node_name)
+            node.node_type = node_type
+            node.nic_addresses = {domain_name: addr for _, domain_name, _, addr in nic_info}
+        
+        # Nodes that did not print their layout are assumed to match the default one
+        for node in self.cluster.nodes:
+            if node.name not in layout_hosts:
+                node.node_type = default_node_type
         
         if DEBUG:
             self._print_numa_summary()
+            if self.nic_info:
+                self._print_nic_summary()
     
-    def _add_cpus_to_numa_domain(self, numa_domain, cpu_ranges):
+    def _matches_template(self, template_layout, numa_info, nic_info, gpu_info):
         """
-        Add CPUs to a NUMA domain from CPU range strings.
+        Return True when a printed layout is the one of the topology template: same NUMA
+        domains and CPUs, and same NICs and GPUs when the output prints them.
         
         Args:
-            numa_domain: NUMADomain to add cores to
-            cpu_ranges: List of strings representing CPU ranges (e.g., ['0-15', '64-79'])
-        """
-        # Parse all CPU IDs from ranges
-        all_cpu_ids = []
-        for cpu_range in cpu_ranges:
-            if '-' in cpu_range:
-                start, end = map(int, cpu_range.split('-'))
-                all_cpu_ids.extend(range(start, end + 1))
-            else:
-                all_cpu_ids.append(int(cpu_range))
+            template_layout: NUMA layout of the template (see TopologyTemplate.numa_layout)
+            numa_info: Sorted list of (numa_id, cpu_ranges) tuples
+            nic_info: Sorted list of (nic_index, domain_name, numa_id, addr) tuples
+            gpu_info: Sorted list of (gpu_id, numa_id, bus_id) tuples
+        """
+        numa_layout = tuple((numa_id, parse_cpu_list(','.join(cpu_ranges)).mask) for numa_id, cpu_ranges in numa_info)
+        if numa_layout != template_layout:
+            return False
+        if nic_info and {(domain_name, numa_id) for _, domain_name, numa_id, _ in nic_info} != set(self.topology.nics):
+            return False
+        if gpu_info and {gpu[:2] for gpu in gpu_info} != {gpu[:2] for gpu in self.topology.gpus}:
+            return False
+        return True
+    
+    def _get_cores_per_l3(self):
+        """
+        Return the number of physical cores sharing an L3 cache.
         
-        # Sort CPU IDs for consistent processing
-        all_cpu_ids.sort()
+        The geometry given to the parser wins; otherwise it comes from the CPU model
+        printed by the lowest PE. Returns None when it is unknown.
+        """
+        if self.cores_per_l3 is not None:
+            return self.cores_per_l3
+        for pe_id in sorted(self.cpu_model_info):
+            name, family, model, _ = self.cpu_model_info[pe_id]
+            cpu_model = lookup_cpu_model(family, model)
+            if cpu_model:
+                return cpu_model.cores_per_l3
+            if DEBUG:
+                print(f"Warning: Unknown CPU model {name} ({family}:{model}), no L3 cache domains")
+            break
+        return None
+    
+    def _layout_signature(self, numa_info, nic_info, gpu_info=()):
+        """
+        Compute the signature of a node layout. Nodes with the same NUMA domains (and CPUs)
+        and the same NICs and GPUs attached to the same NUMA domains get the same signature;
+        NIC addresses are per-node state and do not take part in it.
         
+        Args:
+            numa_info: Sorted list of (numa_id, cpu_ranges) tuples
+            nic_info: Sorted list of (nic_index, domain_name, numa_id, addr) tuples
+            gpu_info: Sorted list of (gpu_id, numa_id, bus_id) tuples
+            
+        Returns:
+            A short hexadecimal string
+        """
+        layout = (
+            tuple((numa_id, parse_cpu_list(','.join(cpu_ranges)).mask) for numa_id, cpu_ranges in numa_info),
+            tuple((domain_name, numa_id) for _, domain_name, numa_id, _ in nic_info),
+        )
+        if gpu_info:
+            # Only layouts with GPUs get the extra element, CPU-only signatures are unchanged
+            layout += (tuple((gpu_id, numa_id) for gpu_id, numa_id, _ in gpu_info),)
+        return hashlib.sha1(repr(layout).encode()).hexdigest()[:12]
+    
+    def _build_node_type(self, signature, numa_info, nic_info, gpu_info=(), cores_per_l3=None):
+        """
+        Create the NUMA domains, L3 cache domains, cores, logical CPUs, NICs and GPUs of one node layout.
+        
+        Args:
+            signature: Layout signature (see _layout_signature)
+            numa_info: List of (numa_id, cpu_ranges) tuples
+            nic_info: List of (nic_index, domain_name, numa_id, addr) tuples
+            gpu_info: List of (gpu_id, numa_id, bus_id) tuples
+            cores_per_l3: Physical cores per L3 cache domain, or None when unknown
+            
+        Returns:
+            The new NodeType
+        """
+        # The SMT sibling numbering is a property of the whole node
+        numa_cpu_sets = [parse_cpu_list(','.join(cpu_ranges)) for _, cpu_ranges in numa_info]
+        sibling_stride = detect_sibling_stride(numa_cpu_sets)
+        
+        numa_domains = {}
+        cache_count = 0
+        for (numa_id, _), cpu_set in zip(numa_info, numa_cpu_sets):
+            # The NUMA domains are shared by every node of this type, so they have no parent node
+            numa_domain = NUMADomain(id=numa_id, node=None)
+            numa_domains[numa_id] = numa_domain
+            
+            # Process all CPU ranges together in a simpler way
+            self._add_cpus_to_numa_domain(numa_domain, cpu_set, sibling_stride)
+            if cores_per_l3 is not None:
+                cache_count = self._add_cache_domains(numa_domain, cores_per_l3, cache_count)
+        
+        if DEBUG and nic_info:
+            print("\nAdding NICs to cluster:")
+        
+        # For each NIC, add it to the appropriate NUMA domain
+        for nic_index, domain_name, numa_id, addr in nic_info:
+            if DEBUG:
+                print(f"  NIC {domain_name} (index {nic_index}) -> NUMA domain {numa_id}")
+            
+            numa_domain = numa_domains.get(numa_id)
+            if numa_domain is None:
+                if DEBUG:
+                    print(f"    Warning: Could not find NUMA domain {numa_id}")
+                continue
+            
+            # Skip if we've already added this NIC
+            if any(nic.id == domain_name for nic in numa_domain.nics):
+                continue
+            
+            # Create and add the NIC to the NUMA domain
+            nic = NIC(id=domain_name, numa_domain=numa_domain, address=addr)
+            numa_domain.nics.append(nic)
+        
+        # Attach each GPU to its NUMA domain
+        for gpu_id, numa_id, bus_id in gpu_info:
+            numa_domain = numa_domains.get(numa_id)
+            if numa_domain is None:
+                if DEBUG:
+                    print(f"    Warning: Could not find NUMA domain {numa_id} of GPU {gpu_id}")
+                continue
+            numa_domain.gpus.append(GPU(id=gpu_id, numa_domain=numa_domain, bus_id=bus_id))
+        
+        return NodeType(numa_domains=tuple(numa_domains.values()), signature=signature)
+    
+    def _add_cpus_to_numa_domain(self, numa_domain, cpu_set, sibling_stride=None):
+        """
+        Add CPUs to a NUMA domain.
+        
+        Args:
+            numa_domain: NUMADomain to add cores to
+            cpu_set: CpuSet of the NUMA domain (e.g., from the cpu_list "0-15,64-79")
+            sibling_stride: Offset between SMT siblings, i.e. the number of physical cores
+                            of the node (see detect_sibling_stride); None without SMT
+        """
         # Map physical cores by ID
         physical_cores = {}
         
-        # Create physical cores and logical CPUs
-        for cpu_id in all_cpu_ids:
-            # For AMD CPUs, typically the hyperthread for core N is at core N+64
-            is_hyperthread = cpu_id >= 64
-            core_id = cpu_id - 64 if is_hyperthread else cpu_id
+        # Create physical cores and logical CPUs (a CpuSet iterates them in sorted order)
+        for cpu_id in cpu_set:
+            # The sibling of core N is CPU N + stride (N + 64 on a 64-core AMD node)
+            is_hyperthread = sibling_stride is not None and cpu_id >= sibling_stride
+            core_id = cpu_id % sibling_stride if is_hyperthread else cpu_id
             
             # Create physical core if it doesn't exist
             if core_id not in physical_cores:
@@ -164,11 +738,33 @@ class MPICHParser:
             elif DEBUG and is_hyperthread:
                 print(f"Warning: No physical core {core_id} found for hyperthread {cpu_id}")
     
+    def _add_cache_domains(self, numa_domain, cores_per_l3, first_id):
+        """
+        Group the cores of a NUMA domain into L3 cache domains of consecutive cores.
+        
+        Args:
+            numa_domain: NUMADomain whose cores are already created
+            cores_per_l3: Physical cores per L3 cache domain
+            first_id: Node-wide index of the first cache domain of this NUMA domain
+        
+        Returns:
+            The index following the last cache domain created
+        """
+        cores = sorted(numa_domain.cores, key=lambda core: core.id)
+        for start in range(0, len(cores), cores_per_l3):
+            cache_domain = CacheDomain(id=first_id, numa_domain=numa_domain)
+            for core in cores[start:start + cores_per_l3]:
+                core.cache_domain = cache_domain
+                cache_domain.cores.append(core)
+            numa_domain.cache_domains.append(cache_domain)
+            first_id += 1
+        return first_id
+    
     def _print_numa_summary(self):
         """Print a summary of NUMA domains for debugging."""
         print("\nAdded NUMA domains to nodes:")
         for node in self.cluster.nodes:
-            print(f"  Node {node.name} has {len(node.numa_domains)} NUMA domains")
+            print(f"  Node {node.name} has {len(node.numa_domains)} NUMA domains (type {node.node_type.signature})")
             for numa in sorted(node.numa_domains, key=lambda n: n.id):
                 physical_cores = [core for core in numa.cores]
                 print(f"    NUMA {numa.id}: {len(physical_cores)} physical cores")
@@ -179,7 +775,7 @@ class MPICHParser:
                 
                 for core in physical_cores:
                     for cpu in core.logical_cpus:
-                        if cpu.id < 64:  # Assuming the threshold is 64 for physical vs HT
+                        if cpu is core.logical_cpus[0]:  # The first thread of a core, the others are SMT siblings
                             physical_cpu_ids.append(cpu.id)
                         else:
                             hyperthread_cpu_ids.append(cpu.id)
@@ -199,81 +795,44 @@ class MPICHParser:
     
     def _extract_nic_info(self):
         """
-        Extract NIC information from the content.
+        Return the NIC information collected while scanning, per PE.
         
         Returns:
-            A list of tuples (nic_index, domain_name, numa_id, addr)
+            A dictionary pe_id -> list of tuples (nic_index, domain_name, numa_id, addr)
         """
-        nic_info = []
+        nic_by_pe = defaultdict(list)
+        for pe_id, nic_index, domain_name, numa_id, addr in self.nic_info:
+            nic_by_pe[pe_id].append((nic_index, domain_name, numa_id, addr))
         
         # First determine if there's NIC information in the content
-        nic_count_pattern = re.compile(r'PE 0:\s+Number of NICs:\s+(\d+)')
-        nic_count_match = nic_count_pattern.search(self.content)
-        
-        if not nic_count_match:
+        if not self.nic_count:
             if DEBUG:
                 print("Warning: Could not find NIC count information")
-            return nic_info
-        
-        # Extract NIC information
-        nic_pattern = re.compile(r'PE 0:\s+nic_index (\d+): domain_name=([^,]+), numa_domain=(\d+), addr=([^\s]+)')
-        
-        for match in nic_pattern.finditer(self.content):
-            nic_index = int(match.group(1))
-            domain_name = match.group(2)
-            numa_id = int(match.group(3))
-            addr = match.group(4)
-            nic_info.append((nic_index, domain_name, numa_id, addr))
+            return {}
         
         # Make sure the number of NICs we found matches the expected count
-        expected_count = int(nic_count_match.group(1))
-        if len(nic_info) != expected_count and DEBUG:
-            print(f"Warning: Expected {expected_count} NICs but found {len(nic_info)}")
+        for pe_id, expected_count in self.nic_count.items():
+            if len(nic_by_pe[pe_id]) != expected_count and DEBUG:
+                print(f"Warning: Expected {expected_count} NICs but found {len(nic_by_pe[pe_id])} (PE {pe_id})")
         
-        return nic_info
+        return nic_by_pe
     
-    def _parse_nics(self):
-        """Parse NIC information and add it to NUMA domains."""
-        # Extract NIC information
-        nic_info = self._extract_nic_info()
-        
-        if not nic_info:
-            if DEBUG:
-                print("Warning: No NIC information found")
-            return
-        
-        if DEBUG:
-            print("\nAdding NICs to cluster:")
+    def _extract_gpu_info(self):
+        """
+        Return the GPU layout collected while scanning, per host.
         
-        # Dictionary to keep track of NICs already added to NUMA domains
-        added_nics = set()  # (node_name, domain_name)
+        Returns:
+            A dictionary node_name -> sorted list of tuples (gpu_id, numa_id, bus_id), one per GPU
+        """
+        gpus_by_host = defaultdict(dict)
+        for node_name, gpu_id, numa_id, bus_id in self.gpu_info:
+            # Every rank of a node may print the same layout, the first line is kept
+            gpus_by_host[node_name].setdefault(gpu_id, (gpu_id, numa_id, bus_id))
         
-        # For each NIC, add it to the appropriate NUMA domain in each node
-        for nic_index, domain_name, numa_id, addr in nic_info:
-            if DEBUG:
-                print(f"  NIC {domain_name} (index {nic_index}) -> NUMA domain {numa_id}")
-            
-            # Iterate through nodes and add the NIC to the appropriate NUMA domain
-            for node_name, node in self.nodes_dict.items():
-                # Skip if we've already added this NIC to this node
-                if (node_name, domain_name) in added_nics:
-                    continue
-                
-                # Find the corresponding NUMA domain
-                numa_key = (node_name, numa_id)
-                if numa_key in self.numa_domains_dict:
-                    numa_domain = self.numa_domains_dict[numa_key]
-                    
-                    # Create and add the NIC to the NUMA domain
-                    nic = NIC(id=domain_name, numa_domain=numa_domain)
-                    nic.address = addr  # Store the address information
-                    numa_domain.nics.append(nic)
-                    added_nics.add((node_name, domain_name))
-                elif DEBUG:
-                    print(f"    Warning: Could not find NUMA domain {numa_id} in node {node_name}")
+        if DEBUG and self.gpu_info and not self.numa_info:
+            print("Warning: GPU topology lines found without NUMA domain information, GPUs are ignored")
         
-        if DEBUG:
-            self._print_nic_summary()
+        return {node_name: sorted(gpus.values()) for node_name, gpus in gpus_by_host.items()}
     
     def _print_nic_summary(self):
         """Print a summary of NICs for debugging."""
@@ -289,72 +848,36 @@ class MPICHParser:
     
     def _extract_mpi_task_info(self):
         """
-        Extract MPI task information from the content.
+        Return the MPI task information collected while scanning.
         
         Returns:
             A list of tuples (rank_id, node_name)
         """
-        mpi_task_info = []
-        
-        # Extract MPI rank information
-        rank_pattern = re.compile(r'\[PE_\d+\]: rank (\d+) is on (nid\d+)')
-        
-        for match in rank_pattern.finditer(self.content):
-            rank_id = int(match.group(1))
-            node_name = match.group(2)
-            mpi_task_info.append((rank_id, node_name))
-        
-        return mpi_task_info
+        return self.mpi_task_info
     
     def _extract_thread_affinity_info(self):
         """
-        Extract thread affinity information from the content.
+        Return the thread affinity information collected while scanning.
         
         Returns:
-            A list of tuples (node_name, pid, thread_id, cpu_id1, cpu_id2)
+            A list of tuples (node_name, pid, thread_id, mask) where mask is the
+            CPU affinity of the thread as an integer bitmask
         """
-        thread_info = []
-        
-        # Extract thread affinity information
-        thread_pattern = re.compile(r'CCE OMP: host (nid\d+) pid (\d+) tid \d+ thread (\d+) affinity:\s+(\d+)\s+(\d+)')
-        
-        for match in thread_pattern.finditer(self.content):
-            node_name = match.group(1)
-            pid = int(match.group(2))
-            thread_id = int(match.group(3))
-            cpu_id1 = int(match.group(4))
-            cpu_id2 = int(match.group(5))
-            thread_info.append((node_name, pid, thread_id, cpu_id1, cpu_id2))
-        
-        return thread_info
+        return self.thread_info
     
     def _extract_selected_nic_info(self):
         """
-        Extract information about NICs selected by each Processing Element (PE/MPI task).
+        Return the NICs selected by each Processing Element (PE/MPI task).
         
         Returns:
             A list of tuples (pe_id, node_name, nic_index, domain_name, numa_node)
         """
-        selected_nic_info = []
-        
-        # Extract selected NIC information
-        # Format: PE 3: Host nid005187 selected NIC index=1, domain_name=cxi1, numa_node=1, address=[0x73c2]
-        nic_pattern = re.compile(r'PE (\d+): Host (nid\d+) selected NIC index=(\d+), domain_name=([^,]+), numa_node=(\d+)')
-        
-        for match in nic_pattern.finditer(self.content):
-            pe_id = int(match.group(1))
-            node_name = match.group(2)
-            nic_index = int(match.group(3))
-            domain_name = match.group(4)
-            numa_node = int(match.group(5))
-            selected_nic_info.append((pe_id, node_name, nic_index, domain_name, numa_node))
-        
         if DEBUG:
-            print(f"Found {len(selected_nic_info)} selected NICs:")
-            for info in selected_nic_info:
+            print(f"Found {len(self.selected_nic_info)} selected NICs:")
+            for info in self.selected_nic_info:
                 print(f"  PE {info[0]} on {info[1]} selected NIC {info[3]} (index={info[2]}, numa={info[4]})")
         
-        return selected_nic_info
+        return self.selected_nic_info
     
     def _parse_job(self):
         """Parse job information and create a Job object with MPI tasks and OpenMP threads."""
@@ -370,6 +893,7 @@ class MPICHParser:
         # Create a new job
         job_name = f"job_from_{filename}"
         self.job = Job(id=job_id, name=job_name)
+        self.job.mpich_settings = parse_mpich_settings(self.env_info)
         
         # Extract MPI task information
         mpi_task_info = self._extract_mpi_task_info()
@@ -389,50 +913,69 @@ class MPICHParser:
                 self.job.mpi_tasks.append(mpi_task)
                 rank_to_mpi_task[rank_id] = mpi_task
         
+        # Bind each rank to the CPUs of its cpumask (the PE id is the rank)
+        for pe_id, node_name, cpu_count, mask in self.cpumask_info:
+            node = node_name_to_obj[node_name]
+            mpi_task = rank_to_mpi_task.get(pe_id)
+            if mpi_task is None:
+                # The rank placement lines were not displayed, the cpumask line is enough
+                mpi_task = MPITask(id=pe_id, node=node, logical_cpus=[])
+                self.job.mpi_tasks.append(mpi_task)
+                rank_to_mpi_task[pe_id] = mpi_task
+            cpu_set = CpuSet(mask)
+            if DEBUG and len(cpu_set) != cpu_count:
+                print(f"Warning: cpumask of PE {pe_id} has {len(cpu_set)} CPUs, expected {cpu_count}")
+            looked_up = mpi_task.bind_cpus(cpu_set)
+            if self.profiler:
+                self.profiler.count('lookups.logical_cpu', looked_up)
+        
         # Extract and process selected NIC information
         selected_nic_info = self._extract_selected_nic_info()
         
         # Associate selected NICs with MPI tasks
         for pe_id, node_name, nic_index, domain_name, numa_node in selected_nic_info:
             # Find the MPI task with this ID
-            if pe_id in rank_to_mpi_task:
-                mpi_task = rank_to_mpi_task[pe_id]
-                
-                # Find the corresponding NIC in the node
+            mpi_task = rank_to_mpi_task.get(pe_id)
+            node = node_name_to_obj.get(node_name)
+            if mpi_task and node:
+                # Look up the NIC with the matching domain_name, it must sit in the reported NUMA domain
+                nic = node.get_nic(domain_name)
+                if self.profiler:
+                    self.profiler.count('lookups.nic')
+                if nic and nic.numa_domain.id == numa_node:
+                    # Add this NIC to the MPI task's selected NICs
+                    mpi_task.selected_nics.append(nic)
+        
+        # Attach the GPUs visible to each rank (ROCR_VISIBLE_DEVICES, or GPU_ID of hello_jobstep)
+        for rank_id, node_name, gpu_ids in self.gpu_binding_info:
+            mpi_task = rank_to_mpi_task.get(rank_id)
+            if mpi_task is None:
                 node = node_name_to_obj.get(node_name)
-                if node:
-                    # Look for the NIC with the matching domain_name in the specified NUMA domain
-                    for numa in node.numa_domains:
-                        if numa.id == numa_node:
-                            for nic in numa.nics:
-                                if nic.id == domain_name:
-                                    # Add this NIC to the MPI task's selected NICs
-                                    mpi_task.selected_nics.append(nic)
-                                    break
+                if node is None:
+                    continue
+                # Outputs with GPU lines only: the binding line places the rank
+                mpi_task = MPITask(id=rank_id, node=node, logical_cpus=[])
+                self.job.mpi_tasks.append(mpi_task)
+                rank_to_mpi_task[rank_id] = mpi_task
+            if mpi_task.gpu_ids:
+                # hello_jobstep prints one line per OpenMP thread, the first one is kept
+                continue
+            mpi_task.gpu_ids = list(gpu_ids)
+            mpi_task.gpus = [gpu for gpu in map(mpi_task.node.get_gpu, gpu_ids) if gpu]
         
         # Extract thread affinity information
         thread_info = self._extract_thread_affinity_info()
         
-        # Group thread info by PID (which will be our MPI task ID)
+        # Group thread info by process; PIDs are only unique within a node
         pid_to_threads = defaultdict(list)
-        for node_name, pid, thread_id, cpu_id1, cpu_id2 in thread_info:
-            pid_to_threads[pid].append((node_name, thread_id, cpu_id1, cpu_id2))
+        for node_name, pid, thread_id, mask in thread_info:
+            pid_to_threads[(node_name, pid)].append((node_name, thread_id, mask))
         
-        # Map PIDs to ranks and create MPI tasks for any PIDs that don't match ranks
-        pid_to_rank = {}
-        
-        # First, try to determine which PIDs correspond to which ranks
-        # This is a bit of a heuristic since the log doesn't explicitly map PIDs to ranks
-        if len(pid_to_threads) == len(mpi_task_info):
-            # If number of PIDs matches number of ranks, assume they map in order
-            sorted_pids = sorted(pid_to_threads.keys())
-            sorted_ranks = sorted([rank for rank, _ in mpi_task_info])
-            
-            for i in range(len(sorted_pids)):
-                pid_to_rank[sorted_pids[i]] = sorted_ranks[i]
+        # Map PIDs to ranks
+        pid_to_rank = self._map_pids_to_ranks(pid_to_threads, mpi_task_info)
         
         # Create MPI tasks for PIDs and add thread information
-        for pid, threads in pid_to_threads.items():
+        for (_, pid), threads in pid_to_threads.items():
             # Get the node name from the first thread (all threads of a process are on the same node)
             node_name = threads[0][0]
             node = node_name_to_obj.get(node_name)
@@ -443,36 +986,30 @@ class MPICHParser:
                 continue
             
             # Get or create the MPI task for this PID
-            if pid in pid_to_rank and pid_to_rank[pid] in rank_to_mpi_task:
-                mpi_task = rank_to_mpi_task[pid_to_rank[pid]]
+            rank_id = pid_to_rank.get((node_name, pid))
+            if rank_id in rank_to_mpi_task:
+                mpi_task = rank_to_mpi_task[rank_id]
             else:
                 # If we couldn't map PID to a rank, create a new MPITask with the PID as ID
                 mpi_task = MPITask(id=pid, node=node, logical_cpus=[])
                 self.job.mpi_tasks.append(mpi_task)
             
             # Add thread information
-            for _, thread_id, cpu_id1, cpu_id2 in threads:
-                # Find the logical CPUs
-                logical_cpus = []
-                
-                # Find the first CPU
-                cpu1 = self._find_logical_cpu_in_node(node, cpu_id1)
-                if cpu1:
-                    logical_cpus.append(cpu1)
-                    if cpu1 not in mpi_task.logical_cpus:
-                        mpi_task.logical_cpus.append(cpu1)
+            for _, thread_id, mask in threads:
+                if not mask:
+                    continue
+                cpu_set = CpuSet(mask)
                 
-                # Find the second CPU
-                cpu2 = self._find_logical_cpu_in_node(node, cpu_id2)
-                if cpu2:
-                    logical_cpus.append(cpu2)
-                    if cpu2 not in mpi_task.logical_cpus:
-                        mpi_task.logical_cpus.append(cpu2)
+                # Find the logical CPUs of the thread; the task only looks up those it was not bound to yet
+                logical_cpus = [cpu for cpu in map(node.get_logical_cpu, cpu_set) if cpu]
+                looked_up = mpi_task.bind_cpus(cpu_set)
+                if self.profiler:
+                    self.profiler.count('lookups.logical_cpu', len(cpu_set) + looked_up)
                 
                 # Create an OpenMP thread
-                if logical_cpus:
-                    omp_thread = OpenMPThread(id=thread_id, logical_cpus=logical_cpus)
-                    mpi_task.openmp_threads.append(omp_thread)
+                omp_thread = OpenMPThread(id=thread_id, logical_cpus=logical_cpus)
+                omp_thread.cpu_set = cpu_set
+                mpi_task.openmp_threads.append(omp_thread)
         
         # Sort MPI tasks by ID for cleaner output
         self.job.mpi_tasks.sort(key=lambda task: task.id)
@@ -480,6 +1017,62 @@ class MPICHParser:
         if DEBUG:
             self._print_job_summary()
     
+    def _map_pids_to_ranks(self, pid_to_threads, mpi_task_info):
+        """
+        Map the processes printing OpenMP affinity lines to MPI ranks.
+        
+        When cpumask lines are available, a process belongs to the rank whose cpumask
+        contains the CPUs of its threads on the same node. Otherwise (or if that is
+        ambiguous) the PIDs of each node are matched in order with the ranks placed on
+        that node, which is only a heuristic since the log does not map PIDs to ranks.
+        
+        Args:
+            pid_to_threads: Dictionary (node_name, pid) -> list of thread tuples
+            mpi_task_info: List of (rank_id, node_name) tuples
+            
+        Returns:
+            A dictionary (node_name, pid) -> rank_id
+        """
+        pid_to_rank = {}
+        
+        # Exact mapping from the cpumasks: (node_name, cpu_id) -> rank, None if shared
+        cpu_owner = {}
+        for pe_id, node_name, _, mask in self.cpumask_info:
+            for cpu_id in CpuSet(mask):
+                key = (node_name, cpu_id)
+                cpu_owner[key] = None if key in cpu_owner and cpu_owner[key] != pe_id else pe_id
+        
+        masks = {pe_id: mask for pe_id, _, _, mask in self.cpumask_info}
+        
+        unmapped = defaultdict(list)  # node_name -> PIDs without an exact match
+        for (node_name, pid), threads in pid_to_threads.items():
+            # The owner of the lowest CPU used by the process must own all of its CPUs
+            process_mask = 0
+            for _, _, mask in threads:
+                process_mask |= mask
+            lowest_cpu = (process_mask & -process_mask).bit_length() - 1
+            owner = cpu_owner.get((node_name, lowest_cpu))
+            if owner is not None and process_mask & ~masks[owner] == 0:
+                pid_to_rank[(node_name, pid)] = owner
+            else:
+                unmapped[node_name].append(pid)
+        
+        if unmapped:
+            # Heuristic: on each node, if the number of remaining PIDs matches the number of
+            # remaining ranks, assume they map in order
+            mapped_ranks = set(pid_to_rank.values())
+            ranks_by_node = defaultdict(list)
+            for rank_id, node_name in mpi_task_info:
+                if rank_id not in mapped_ranks:
+                    ranks_by_node[node_name].append(rank_id)
+            for node_name, pids in unmapped.items():
+                ranks = ranks_by_node.get(node_name, [])
+                if len(pids) == len(ranks):
+                    for pid, rank_id in zip(sorted(pids), sorted(ranks)):
+                        pid_to_rank[(node_name, pid)] = rank_id
+        
+        return pid_to_rank
+    
     def _find_logical_cpu_in_node(self, node, cpu_id):
         """
         Find a logical CPU with the given ID in the specified node.
@@ -491,12 +1084,7 @@ class MPICHParser:
         Returns:
             The LogicalCPU object if found, None otherwise
         """
-        for numa in node.numa_domains:
-            for core in numa.cores:
-                for cpu in core.logical_cpus:
-                    if cpu.id == cpu_id:
-                        return cpu
-        return None
+        return node.get_logical_cpu(cpu_id)
     
     def _print_job_summary(self):
         """Print a summary of the job for debugging."""
@@ -529,24 +1117,178 @@ class MPICHParser:
         """
         return format_id_ranges_as_list(cpu_ids)
 
+def scan_chunk(filename, start, end, profile=False):
+    """
+    Tokenize one byte range of a file and return its records (runs in worker processes).
+    
+    Args:
+        filename: Path to the uncompressed MPICH output file
+        start: Offset of the first line of the chunk
+        end: Offset just after the last line of the chunk
+        profile: Whether to count the lines read (LINE_COUNTERS)
+    
+    Returns:
+        The dictionary returned by MPICHParser.get_records, plus the line counters
+        of the chunk under 'line_counts' (empty unless profiling)
+    """
+    profiler = Profiler() if profile else None
+    parser = MPICHParser(filename)
+    lines = iter_log_range(filename, start, end, prefixes=LINE_PREFIXES)
+    parser._scan(profiler.count_lines(lines) if profiler else lines)
+    records = parser.get_records()
+    records['line_counts'] = {name: profiler.counters[name] for name in LINE_COUNTERS} if profiler else {}
+    return records
+
+def scan_records(filename, cache=None, profile=False):
+    """
+    Tokenize one file and return its records (runs in worker processes).
+    
+    Args:
+        filename: Path to the MPICH output file
+        cache: Optional ParseCache
+        profile: Whether to count the lines read (LINE_COUNTERS; none on a cache hit)
+    
+    Returns:
+        The dictionary returned by MPICHParser.get_records, plus the line counters
+        of the file under 'line_counts' (empty unless profiling)
+    """
+    profiler = Profiler() if profile else None
+    parser = MPICHParser(filename, cache=cache, profiler=profiler)
+    parser.scan()
+    records = parser.get_records()
+    records['line_counts'] = {name: profiler.counters[name] for name in LINE_COUNTERS} if profiler else {}
+    return records
+
+def parse_shards(filenames, cache=None, jobs=None, profiler=None, cores_per_l3=None, topology=None):
+    """
+    Parse the shards of one job (e.g. one output file per node with srun --output=%x-%j-%N.out)
+    concurrently and merge them into a single cluster and job.
+    
+    Each shard is tokenized in a worker process which only sends back its compact
+    records, so the shards never need to be concatenated.
+    
+    Args:
+        filenames: Paths of the shard files
+        cache: Optional ParseCache, used per shard
+        jobs: Number of worker processes (default: number of CPUs)
+        profiler: Optional Profiler
+        cores_per_l3: Physical cores per L3 cache domain (default: from the CPU model line)
+        topology: Optional TopologyTemplate of the nodes (see topology_import)
+    
+    Returns:
+        A tuple (cluster, job); the job id and name come from the first shard
+    """
+    filenames = sorted(filenames)
+    parser = MPICHParser(filenames[0], cache=cache, profiler=profiler, cores_per_l3=cores_per_l3, topology=topology)
+    worker = partial(scan_records, cache=cache, profile=bool(profiler))
+    jobs = min(jobs or os.cpu_count() or 1, len(filenames))
+    with parser._phase('scan'):
+        if jobs == 1:
+            shard_records = [worker(filename) for filename in filenames]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                shard_records = list(executor.map(worker, filenames))
+    
+    with parser._phase('merge'):
+        parser.merge_records(shard_records)
+    if profiler:
+        profiler.count('input_bytes', sum(os.path.getsize(filename) for filename in filenames))
+        profiler.count('shards', len(filenames))
+        for records in shard_records:
+            profiler.counters.update(records['line_counts'])
+    return parser.build()
+
+def expand_input_files(paths):
+    """
+    Expand the input arguments into files; glob patterns (quoted to reach us unexpanded) are expanded.
+    
+    Args:
+        paths: List of file paths or glob patterns
+    
+    Returns:
+        A list of file paths
+    """
+    filenames = []
+    for path in paths:
+        matches = sorted(glob.glob(path)) if glob.has_magic(path) else []
+        filenames.extend(matches or [path])
+    return filenames
+
+def parse_files(paths, cache=None, jobs=None, profiler=None, cores_per_l3=None, topology=None):
+    """
+    Parse a job output given as one file or as several shards.
+    
+    Args:
+        paths: File path, or list of file paths / glob patterns
+        cache: Optional ParseCache
+        jobs: Number of worker processes for shards and large files (default: number of CPUs)
+        profiler: Optional Profiler
+        cores_per_l3: Physical cores per L3 cache domain (default: from the CPU model line)
+        topology: Optional TopologyTemplate of the nodes (see topology_import)
+    
+    Returns:
+        A tuple (cluster, job)
+    """
+    filenames = expand_input_files([paths] if isinstance(paths, str) else paths)
+    if len(filenames) == 1:
+        return MPICHParser(filenames[0], cache=cache, jobs=jobs or os.cpu_count() or 1, profiler=profiler,
+                           cores_per_l3=cores_per_l3, topology=topology).parse()
+    return parse_shards(filenames, cache=cache, jobs=jobs, profiler=profiler, cores_per_l3=cores_per_l3,
+                        topology=topology)
+
+def positive_int(text):
+    """Parse a strictly positive integer, for argparse."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid value {text!r}, expected a positive integer")
+    return value
+
+def add_l3_argument(arg_parser):
+    """Add the --l3-cores command-line option (L3 cache geometry) to an argparse parser."""
+    arg_parser.add_argument("--l3-cores", type=positive_int, default=None, metavar="N",
+                            help="physical cores sharing an L3 cache (default: from the CPU model line, e.g. 8 on AMD Trento)")
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python mpich_parser.py <input_file> [--debug]")
-        sys.exit(1)
+    arg_parser = argparse.ArgumentParser(description="Parse an MPICH output file and display its topology and job allocation.")
+    arg_parser.add_argument("input_files", nargs="+",
+                            help="MPICH output file (plain, .gz, .xz, .bz2 or .zst), or the per-node shards of one job (files or glob)")
+    arg_parser.add_argument("--debug", action="store_true", help="print parsing details")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes used to parse shards and large files (default: number of CPUs)")
+    add_l3_argument(arg_parser)
+    add_topology_argument(arg_parser)
+    add_cache_arguments(arg_parser)
+    add_profile_argument(arg_parser)
+    arg_parser.add_argument("--export", default=None, metavar="DIR",
+                            help="also write the parsed model as tables (nodes, numa_domains, cpus, nics, gpus, ranks, "
+                                 "threads, rank_cpus) to this directory, needs pyarrow")
+    arg_parser.add_argument("--export-format", choices=["parquet", "arrow"], default="parquet",
+                            help="file format of the exported tables (default: %(default)s)")
+    args = arg_parser.parse_args()
+    
+    if args.export:
+        # Imported here: the export needs the optional pyarrow and NumPy packages
+        try:
+            import arrow_export
+            arrow_export._pyarrow()
+            arrow_export._numpy()
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
     
-    # Check for debug flag
+    # Set the debug flag
     global DEBUG
-    DEBUG = "--debug" in sys.argv
+    DEBUG = args.debug
     
-    # Remove the debug flag from the args if present
-    if DEBUG:
-        sys.argv.remove("--debug")
+    profiler = None
+    if args.profile:
+        profiler = Profiler(tool="mpich_parser", inputs=args.input_files, parser_version=PARSER_VERSION)
     
-    filename = sys.argv[1]
-    
-    # Parse the MPICH output file
-    parser = MPICHParser(filename)
-    cluster, job = parser.parse()
+    # Parse the MPICH output file(s)
+    cluster, job = parse_files(args.input_files, cache=cache_from_args(args, PARSER_VERSION), jobs=args.jobs,
+                               profiler=profiler, cores_per_l3=args.l3_cores, topology=topology_from_args(args))
     
     # Only print the topology summary in debug mode
     if DEBUG:
@@ -563,7 +1305,16 @@ def main():
     
     # Always display the tree view
     print("\n=============== Tree View of Structure ===============")
-    print_run(cluster, job, show_detailed_cpu=False)
+    with profiler.phase("render") if profiler else nullcontext():
+        print_run(cluster, job, show_detailed_cpu=False)
+    
+    if args.export:
+        with profiler.phase("export") if profiler else nullcontext():
+            arrow_export.export_job(cluster, job, args.export, args.export_format,
+                                    metadata={"source": " ".join(args.input_files), "parser_version": str(PARSER_VERSION)})
+    
+    if profiler:
+        profiler.write_json(args.profile)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+On-disk cache of parsed MPICH outputs.
+
+The cache stores the compact records produced by MPICHParser's tokenizer (plain
+tuples, pickled), from which the Cluster/Job model is rebuilt in linear time
+without reading or matching the log again. Entries are content-addressed: the
+key is a BLAKE2 hash of the file plus the parser version. A small stat index
+(path, size, mtime) avoids re-hashing unchanged files, so a hit only costs a
+stat() and the unpickling. The total size of the cache (entries and stat
+index) is bounded and the least recently used files are evicted first.
+
+Several processes may share a cache directory (e.g. the workers of batch.py):
+files are written to a separate temporary directory and renamed into place,
+files removed by another process are skipped, and a cache that cannot be read
+or written only costs a parse, it never fails the analysis.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from log_reader import is_regular_file
+
+# Default cache location, overridden by the CRAYBIND_CACHE_DIR environment variable
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "craybindanalyzer")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def file_digest(filename, block_size=1024 * 1024):
+    """Return the BLAKE2b hex digest of a file's content (as stored on disk)."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ParseCache:
+    """Size-bounded, content-addressed cache of parser records."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, version=0):
+        """
+        Args:
+            directory: Cache directory (default: $CRAYBIND_CACHE_DIR or ~/.cache/craybindanalyzer)
+            max_bytes: Maximum total size of the cached entries
+            version: Parser version; entries written by another version are never used
+        """
+        self.directory = directory or os.environ.get("CRAYBIND_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.entries_dir = os.path.join(self.directory, "entries")
+        self.index_dir = os.path.join(self.directory, "index")
+        # Temporary files live outside the scanned directories, so eviction never sees a file being written
+        self.tmp_dir = os.path.join(self.directory, "tmp")
+        for directory in (self.entries_dir, self.index_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _stat_key(self, filename):
+        """Key identifying a file by path, size and modification time."""
+        st = os.stat(filename)
+        raw = f"{os.path.realpath(filename)}\0{st.st_size}\0{st.st_mtime_ns}\0{self.version}"
+        return hashlib.blake2b(raw.encode(), digest_size=20).hexdigest()
+
+    def _entry_path(self, digest):
+        return os.path.join(self.entries_dir, f"{digest}-v{self.version}.pickle")
+
+    def _content_key(self, filename):
+        """Return the content digest of a file, using the stat index when the file is unchanged."""
+        index_path = os.path.join(self.index_dir, self._stat_key(filename))
+        try:
+            with open(index_path) as f:
+                digest = f.read().strip()
+            os.utime(index_path)
+            return digest
+        except OSError:
+            pass
+        digest = file_digest(filename)
+        self._atomic_write(index_path, digest.encode())
+        return digest
+
+    def _atomic_write(self, path, data):
+        """Write data to path through a temporary file so readers never see partial entries."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def load(self, filename):
+        """
+        Return the cached records for a file, or None on a miss or an unreadable cache.
+
+        Pipes are never cached: hashing them would consume the data to parse.
+
+        Args:
+            filename: Path of the parsed file
+        """
+        if not is_regular_file(filename):
+            return None
+        try:
+            entry_path = self._entry_path(self._content_key(filename))
+            with open(entry_path, 'rb') as f:
+                records = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        # Mark the entry as recently used for the eviction policy (it may have just been evicted by another process)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return records
+
+    def store(self, filename, records):
+        """
+        Store the records parsed from a file, then evict old entries if the cache is too large.
+
+        Failures (full or read-only file system...) are ignored: the records are simply not cached.
+
+        Args:
+            filename: Path of the parsed file
+            records: Picklable parser records
+
+        Returns:
+            True if the records were stored
+        """
+        if not is_regular_file(filename):
+            return False
+        try:
+            data = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+            self._atomic_write(self._entry_path(self._content_key(filename)), data)
+            self._evict()
+        except (OSError, pickle.PicklingError):
+            return False
+        return True
+
+    def _evict(self):
+        """Remove the least recently used entries and index files until the cache fits in max_bytes."""
+        files = []
+        total = 0
+        for directory in (self.entries_dir, self.index_dir):
+            for entry in os.scandir(directory):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    # Evicted by another process meanwhile
+                    continue
+                files.append((st.st_mtime_ns, st.st_size, entry.path))
+                total += st.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def add_cache_arguments(arg_parser):
+    """Add the cache command-line options to an argparse parser."""
+    arg_parser.add_argument("--cache", action="store_true",
+                            help="reuse parsed results cached on disk, keyed by file content and parser version")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help=f"cache directory (default: $CRAYBIND_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+    arg_parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                            help="maximum cache size in MB (default: %(default)s)")
+
+def cache_from_args(args, version):
+    """
+    Return the ParseCache selected by the command-line options, or None when caching is off.
+
+    Args:
+        args: Namespace returned by argparse (see add_cache_arguments)
+        version: Parser version stored with the entries
+    """
+    if not args.cache and not args.cache_dir:
+        return None
+    return ParseCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024, version=version)
@@ -0,0 +1,89 @@
+"""
+Phase profiling of the analyzer (--profile).
+
+A Profiler records the wall time of named phases and integer counters (bytes
+read, lines matched per pattern, model objects, lookups). The parser and the
+tools only touch it when profiling is requested, so a normal run pays nothing.
+The result is written as JSON so that runs can be compared across versions.
+"""
+
+import json
+import platform
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+class Profiler:
+    """Per-phase wall times and counters of one run."""
+
+    def __init__(self, **metadata):
+        """
+        Args:
+            metadata: Free-form values stored with the results (tool name, input files...)
+        """
+        self.metadata = dict(metadata)
+        self.phases = {}              # phase name -> seconds, in order of first use
+        self.counters = Counter()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager adding the wall time of its block to a phase (phases may be nested or repeated)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        """Add n to a counter."""
+        self.counters[name] += n
+
+    def count_lines(self, lines, name="lines"):
+        """
+        Wrap an iterable of lines, counting the lines and their bytes as they are consumed.
+
+        Args:
+            lines: Iterable of text lines
+            name: Prefix of the counters (<name>_scanned and <name>_bytes)
+        """
+        count = 0
+        size = 0
+        try:
+            for line in lines:
+                count += 1
+                size += len(line)
+                yield line
+        finally:
+            self.counters[f"{name}_scanned"] += count
+            self.counters[f"{name}_bytes"] += size
+
+    def to_dict(self):
+        """Return the results as plain data."""
+        return {
+            "metadata": dict(self.metadata, python=platform.python_version()),
+            "total_s": time.perf_counter() - self._start,
+            "phases_s": dict(self.phases),
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_json(self, path=None):
+        """
+        Write the results as JSON.
+
+        Args:
+            path: Output file, or None / "-" for the standard error (the standard output holds the report)
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path in (None, "-"):
+            print(text, file=sys.stderr)
+        else:
+            with open(path, 'w') as f:
+                f.write(text + "\n")
+
+def add_profile_argument(arg_parser):
+    """Add the --profile command-line option to an argparse parser."""
+    arg_parser.add_argument("--profile", nargs="?", const="-", default=None, metavar="JSON_FILE",
+                            help="record per-phase wall times and counters and write them as JSON "
+                                 "(to this file, or to the standard error)")
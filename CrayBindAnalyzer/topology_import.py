@@ -0,0 +1,332 @@
+"""
+Node layout templates imported from hwloc XML exports or sysfs snapshots.
+
+MPICH prints the node layout only with MPICH_CPUMASK_DISPLAY/MPICH_OFI_NIC_VERBOSE,
+and never the SMT siblings or the L3 caches. A template describes one node type
+completely, as measured on a compute node once:
+    lstopo --of xml node.xml                          (hwloc)
+    tar czf node-sys.tgz -h /sys/devices/system/cpu /sys/devices/system/node /sys/class/cxi
+The template is plain picklable data (cached by file content like the parser
+records, see parse_cache) and is turned into a NodeType by build_node_type(), which
+the parsers give to the nodes of any job log whose own layout is missing or
+matches the template.
+"""
+
+import hashlib
+import re
+import sys
+import tarfile
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from hpc_topology import NodeType, NUMADomain, PhysicalCore, LogicalCPU, NIC, GPU, CacheDomain, CpuSet, parse_cpu_list
+from parse_cache import cache_from_args
+
+# Version of the template format, stored with the cached templates
+TOPOLOGY_VERSION = 1
+
+# hwloc OS devices: Slingshot NICs (cxi domain, or its hsn network interface) and GPUs
+NIC_DEVICE_PATTERN = re.compile(r'(?:cxi|hsn)(\d+)')
+GPU_DEVICE_PATTERN = re.compile(r'(rsmi|nvml|cuda)(\d+)')
+# GPU device families by preference: ROCm SMI and NVML indices match the *_VISIBLE_DEVICES numbering
+GPU_DEVICE_PREFIXES = ('rsmi', 'nvml', 'cuda')
+
+# Files of a sysfs snapshot, whatever the directory the tarball was made from
+SYSFS_NUMA_PATTERN = re.compile(r'(?:^|/)node/node(\d+)/cpulist$')
+SYSFS_SIBLINGS_PATTERN = re.compile(r'(?:^|/)cpu/cpu(\d+)/topology/thread_siblings_list$')
+SYSFS_CACHE_PATTERN = re.compile(r'(?:^|/)cpu/cpu(\d+)/cache/index(\d+)/(level|shared_cpu_list)$')
+SYSFS_NIC_PATTERN = re.compile(r'(?:^|/)cxi/(cxi\d+)/device/numa_node$')
+
+@dataclass(frozen=True, slots=True)
+class TopologyTemplate:
+    """Layout of one node type as sorted tuples of CPU ids, independent of any job."""
+    source: str                 # File the template was read from
+    numa_domains: tuple         # ((numa_id, (cpu_id, ...)), ...)
+    cores: tuple                # ((cpu_id, ...), ...) SMT siblings of each physical core, lowest first
+    l3_caches: tuple = ()       # ((cpu_id, ...), ...) CPUs sharing each L3 cache
+    nics: tuple = ()            # ((domain_name, numa_id), ...)
+    gpus: tuple = ()            # ((gpu_id, numa_id, bus_id), ...)
+
+    def numa_layout(self):
+        """Return the ((numa_id, cpu mask), ...) tuple identifying the NUMA domains and their CPUs."""
+        return tuple((numa_id, CpuSet.from_ids(cpus).mask) for numa_id, cpus in self.numa_domains)
+
+def make_template(source, numa_cpus, cores=(), l3_caches=(), nics=None, gpus=()):
+    """
+    Normalize the layout read from an export into a TopologyTemplate.
+
+    Args:
+        source: File the layout was read from
+        numa_cpus: Dictionary numa_id -> iterable of CPU ids
+        cores: Iterable of the CPU id collections of the physical cores; CPUs of no core
+               become single-thread cores
+        l3_caches: Iterable of the CPU id collections sharing one L3 cache
+        nics: Dictionary domain_name -> numa_id
+        gpus: Iterable of (gpu_id, numa_id, bus_id) tuples
+
+    Returns:
+        The TopologyTemplate
+    """
+    numa_domains = tuple((numa_id, tuple(sorted(cpus))) for numa_id, cpus in sorted(numa_cpus.items()) if cpus)
+    if not numa_domains:
+        raise ValueError(f"{source}: no NUMA domain with CPUs found")
+    node_cpus = {cpu_id for _, cpus in numa_domains for cpu_id in cpus}
+
+    core_sets = {tuple(sorted(set(siblings) & node_cpus)) for siblings in cores}
+    core_sets.discard(())
+    in_cores = {cpu_id for siblings in core_sets for cpu_id in siblings}
+    core_sets.update((cpu_id,) for cpu_id in node_cpus - in_cores)
+
+    cache_sets = {tuple(sorted(set(cpus) & node_cpus)) for cpus in l3_caches}
+    cache_sets.discard(())
+
+    return TopologyTemplate(
+        source=source,
+        numa_domains=numa_domains,
+        cores=tuple(sorted(core_sets)),
+        l3_caches=tuple(sorted(cache_sets)),
+        nics=tuple(sorted((nics or {}).items(), key=lambda nic: (len(nic[0]), nic[0]))),
+        gpus=tuple(sorted(gpus)),
+    )
+
+def parse_hwloc_bitmap(text):
+    """Return the integer mask of an hwloc bitmap ("0x0000ffff,0xffffffff", 32-bit words, most significant first)."""
+    mask = 0
+    for word in text.split(','):
+        # "0xf...f" stands for an infinite run of set bits, only found in the sets of the whole machine
+        mask = (mask << 32) | (0 if '...' in word else int(word, 16))
+    return mask
+
+def _iter_hwloc_objects(element, ancestors=()):
+    """Yield every hwloc object below an XML element as (object, ancestors) tuples, ancestors outermost first."""
+    for child in element.findall('object'):
+        yield child, ancestors
+        yield from _iter_hwloc_objects(child, ancestors + (child,))
+
+def _hwloc_pus(element):
+    """Return the OS indices of the processing units (logical CPUs) below an hwloc object."""
+    return [int(pu.get('os_index')) for pu in element.iter('object') if pu.get('type') == 'PU']
+
+def _hwloc_numa_id(ancestors, numa_cpus):
+    """
+    Return the NUMA domain an I/O device is local to, from its closest ancestor with a locality.
+
+    Returns:
+        The NUMA id, or None when the device is local to several NUMA domains (or to none)
+    """
+    for ancestor in reversed(ancestors):
+        nodeset = ancestor.get('nodeset')
+        if nodeset:
+            # hwloc 2 gives the NUMA domains of an object as a bitmap of their os_index
+            numa_ids = CpuSet(parse_hwloc_bitmap(nodeset))
+            return next(iter(numa_ids)) if len(numa_ids) == 1 else None
+        cpuset = ancestor.get('cpuset')
+        if cpuset:
+            cpus = parse_hwloc_bitmap(cpuset)
+            matches = [numa_id for numa_id, numa_mask in numa_cpus.items() if cpus and cpus & numa_mask == cpus]
+            return matches[0] if len(matches) == 1 else None
+    return None
+
+def load_hwloc_xml(filename):
+    """
+    Read the layout of a node from an hwloc XML export (lstopo --of xml, hwloc 1.x or 2.x).
+
+    Args:
+        filename: Path to the XML file
+
+    Returns:
+        A TopologyTemplate
+    """
+    root = ElementTree.parse(filename).getroot()
+    objects = list(_iter_hwloc_objects(root))
+
+    numa_cpus = {}
+    cores = []
+    l3_caches = []
+    for element, _ in objects:
+        object_type = element.get('type')
+        if object_type == 'NUMANode':
+            numa_cpus[int(element.get('os_index'))] = parse_hwloc_bitmap(element.get('cpuset', '0x0'))
+        elif object_type == 'Core':
+            cores.append(_hwloc_pus(element))
+        elif object_type == 'L3Cache' or (object_type == 'Cache' and element.get('depth') == '3'):
+            l3_caches.append(_hwloc_pus(element))
+    if not numa_cpus:
+        # Machines without NUMA information form a single domain
+        numa_cpus[0] = CpuSet.from_ids(_hwloc_pus(root)).mask
+
+    nics = {}
+    gpus_by_prefix = {prefix: {} for prefix in GPU_DEVICE_PREFIXES}
+    for element, ancestors in objects:
+        if element.get('type') != 'OSDev':
+            continue
+        name = element.get('name', '')
+        nic_match = NIC_DEVICE_PATTERN.fullmatch(name)
+        gpu_match = GPU_DEVICE_PATTERN.fullmatch(name)
+        if not nic_match and not gpu_match:
+            continue
+        numa_id = _hwloc_numa_id(ancestors, numa_cpus)
+        if numa_id is None:
+            continue
+        if nic_match:
+            nics.setdefault(f"cxi{nic_match.group(1)}", numa_id)
+            continue
+        pci_busid = next((a.get('pci_busid') for a in reversed(ancestors) if a.get('pci_busid')), None)
+        # "0000:c1:00.0" -> "c1", as printed by the GPU topology lines
+        bus_id = pci_busid.split(':')[1] if pci_busid else None
+        gpu_id = int(gpu_match.group(2))
+        gpus_by_prefix[gpu_match.group(1)][gpu_id] = (gpu_id, numa_id, bus_id)
+    gpus = next((gpus.values() for gpus in gpus_by_prefix.values() if gpus), ())
+
+    return make_template(filename, {numa_id: CpuSet(mask) for numa_id, mask in numa_cpus.items()},
+                         cores, l3_caches, nics, gpus)
+
+def load_sysfs_tar(filename):
+    """
+    Read the layout of a node from a tarball of /sys/devices/system/{cpu,node} (optionally
+    with /sys/class/cxi for the NICs; symbolic links must be archived as files, tar -h).
+    The NUL padding that GNU tar adds to the sysfs files is ignored.
+
+    Args:
+        filename: Path to the tarball (plain or compressed with gzip, bzip2 or xz)
+
+    Returns:
+        A TopologyTemplate
+    """
+    numa_cpus = {}
+    siblings = {}
+    cache_levels = {}   # (cpu_id, index) -> cache level
+    cache_cpus = {}     # (cpu_id, index) -> CPU list sharing the cache
+    nics = {}
+    with tarfile.open(filename, 'r:*') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name = member.name
+            numa_match = SYSFS_NUMA_PATTERN.search(name)
+            siblings_match = SYSFS_SIBLINGS_PATTERN.search(name)
+            cache_match = SYSFS_CACHE_PATTERN.search(name)
+            nic_match = SYSFS_NIC_PATTERN.search(name)
+            if not (numa_match or siblings_match or cache_match or nic_match):
+                continue
+            # sysfs files report a size of one page: GNU tar pads their content with NUL bytes
+            text = tar.extractfile(member).read().rstrip(b'\0').decode().strip()
+            if numa_match:
+                numa_cpus[int(numa_match.group(1))] = parse_cpu_list(text)
+            elif siblings_match:
+                siblings[int(siblings_match.group(1))] = tuple(parse_cpu_list(text))
+            elif cache_match:
+                key = (int(cache_match.group(1)), int(cache_match.group(2)))
+                if cache_match.group(3) == 'level':
+                    cache_levels[key] = text
+                else:
+                    cache_cpus[key] = tuple(parse_cpu_list(text))
+            elif int(text) >= 0:
+                nics[nic_match.group(1)] = int(text)
+
+    l3_caches = [cpus for key, cpus in cache_cpus.items() if cache_levels.get(key) == '3']
+    return make_template(filename, numa_cpus, siblings.values(), l3_caches, nics)
+
+def load_topology(filename, cache=None):
+    """
+    Read a node layout template from an hwloc XML export or a sysfs tarball.
+
+    Raises ValueError when the file is not a valid export.
+
+    Args:
+        filename: Path to the export
+        cache: Optional ParseCache (with TOPOLOGY_VERSION as its version); the template is
+               then read again only when the content of the file changes
+
+    Returns:
+        A TopologyTemplate
+    """
+    if cache:
+        template = cache.load(filename)
+        if template is not None:
+            return template
+
+    try:
+        if tarfile.is_tarfile(filename):
+            template = load_sysfs_tar(filename)
+        else:
+            with open(filename, 'rb') as f:
+                head = f.read(4096)
+            if b'<topology' not in head:
+                raise ValueError(f"{filename} is neither an hwloc XML export nor a tarball of /sys/devices/system")
+            template = load_hwloc_xml(filename)
+    except (ElementTree.ParseError, tarfile.TarError, UnicodeDecodeError) as e:
+        raise ValueError(f"{filename}: {e}") from e
+
+    if cache:
+        cache.store(filename, template)
+    return template
+
+def build_node_type(template):
+    """
+    Create the NUMA domains, L3 cache domains, cores, logical CPUs, NICs and GPUs of a template.
+
+    Unlike the layouts printed by MPICH, the SMT siblings and the L3 caches come from the
+    export itself and need not be derived from the CPU numbering or the CPU model.
+
+    Args:
+        template: TopologyTemplate
+
+    Returns:
+        The new NodeType; its signature identifies the template
+    """
+    numa_domains = {numa_id: NUMADomain(id=numa_id, node=None) for numa_id, _ in template.numa_domains}
+    numa_of_cpu = {cpu_id: numa_id for numa_id, cpus in template.numa_domains for cpu_id in cpus}
+
+    # Cores belong to the NUMA domain of their first thread; a core is named after it, as in the parser
+    core_of_cpu = {}
+    for siblings in template.cores:
+        numa_domain = numa_domains[numa_of_cpu[siblings[0]]]
+        core = PhysicalCore(id=siblings[0], numa_domain=numa_domain)
+        for cpu_id in siblings:
+            core.logical_cpus.append(LogicalCPU(id=cpu_id, core=core))
+            core_of_cpu[cpu_id] = core
+        numa_domain.cores.append(core)
+
+    for cache_id, cpus in enumerate(template.l3_caches):
+        cores = list(dict.fromkeys(core_of_cpu[cpu_id] for cpu_id in cpus))
+        cache_domain = CacheDomain(id=cache_id, numa_domain=cores[0].numa_domain)
+        for core in cores:
+            core.cache_domain = cache_domain
+            cache_domain.cores.append(core)
+        cores[0].numa_domain.cache_domains.append(cache_domain)
+
+    for domain_name, numa_id in template.nics:
+        numa_domain = numa_domains.get(numa_id)
+        if numa_domain is not None:
+            numa_domain.nics.append(NIC(id=domain_name, numa_domain=numa_domain))
+    for gpu_id, numa_id, bus_id in template.gpus:
+        numa_domain = numa_domains.get(numa_id)
+        if numa_domain is not None:
+            numa_domain.gpus.append(GPU(id=gpu_id, numa_domain=numa_domain, bus_id=bus_id))
+
+    layout = (template.numa_domains, template.cores, template.l3_caches, template.nics,
+              tuple((gpu_id, numa_id) for gpu_id, numa_id, _ in template.gpus))
+    signature = hashlib.sha1(repr(layout).encode()).hexdigest()[:12]
+    return NodeType(numa_domains=tuple(numa_domains.values()), signature=signature)
+
+def add_topology_argument(arg_parser):
+    """Add the --topology command-line option (node layout template) to an argparse parser."""
+    arg_parser.add_argument("--topology", default=None, metavar="FILE",
+                            help="node layout of the job: hwloc XML export (lstopo --of xml) or tarball of "
+                                 "/sys/devices/system/{cpu,node}, used when the output does not print it")
+
+def topology_from_args(args):
+    """
+    Return the TopologyTemplate selected by the command-line options, or None.
+    Exits with an error message when the file cannot be read.
+
+    Args:
+        args: Namespace returned by argparse (see add_topology_argument and add_cache_arguments)
+    """
+    if not args.topology:
+        return None
+    try:
+        return load_topology(args.topology, cache=cache_from_args(args, f"topology{TOPOLOGY_VERSION}"))
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read the node layout: {e}")
+        sys.exit(1)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Parser of xthi outputs.
+
+xthi prints one line per OpenMP thread of every MPI rank:
+    Node    0, rank    0, thread   0, (affinity =    0)
+preceded by a node summary mapping node numbers to hostnames:
+    Node    0, hostname nid001641, mpi   4, omp   2, executable xthi_mpi_mp
+Check_Binding/check_binding.sh renders these lines as tables:
+    |  nid001641 |   rank 0 |      0 | 0                   |       1 |
+    | ---------- |    ,,    |      1 | 0                   |       1 |
+An output file usually holds several srun steps, each one becoming its own job.
+Both shapes are read in a single pass into the same Cluster/Job model as MPICH
+outputs. xthi does not print the node layout, so the nodes have no topology
+unless a topology template is given (see topology_import).
+"""
+
+import os
+import re
+import sys
+from hpc_topology import Cluster, Node, MPITask, OpenMPThread, Job, CpuSet, EMPTY_NODE_TYPE, parse_cpu_list, print_run
+from log_reader import iter_log_lines
+from topology_import import build_node_type
+
+# Raw xthi lines
+NODE_HOST_PATTERN = re.compile(r'Node\s+(\d+), hostname\s+(\S+?),')
+THREAD_LINE_PATTERN = re.compile(r'Node\s+(\d+), rank\s+(\d+), thread\s+(\d+), \(affinity\s*=\s*([0-9][0-9,\-: ]*)\)')
+
+# Rows of the tables rendered by check_binding.sh
+TABLE_HEADER_PATTERN = re.compile(r'\|\s*HOSTNAME\s*\|\s*MPI TASK\s*\|')
+# The affinity cell is empty when the awk script could not read a CPU list
+TABLE_ROW_PATTERN = re.compile(r'\|\s*(\S+)\s*\|\s*(rank\s+\d+|,,)\s*\|\s*(\d+)\s*\|\s*([0-9,\-: ]*?)\s*\|')
+
+# Job id printed by srun ("srun: Job 6951703 step creation ...")
+SRUN_JOB_PATTERN = re.compile(r'srun: Job (\d+)')
+
+def _affinity_mask(affinity):
+    """Return the CPU bitmask of an affinity list, or None when it is malformed (e.g. a truncated line)."""
+    try:
+        return parse_cpu_list(affinity).mask
+    except ValueError:
+        return None
+
+class XthiStep:
+    """Records of one srun step: its command line and the (host, rank, thread, mask) rows."""
+    __slots__ = ('title', 'rows', 'node_hosts')
+
+    def __init__(self, title=None):
+        self.title = title
+        self.rows = {}          # (rank, thread) -> (host, mask), in order of appearance
+        self.node_hosts = {}    # xthi node number -> hostname
+
+class XthiParser:
+    """Parser of raw xthi lines and of the tables rendered by check_binding.sh."""
+
+    def __init__(self, filename, topology=None):
+        """
+        Initialize the parser with the input filename.
+
+        Args:
+            filename: Path to the xthi output
+            topology: Optional TopologyTemplate giving the layout of every node
+        """
+        self.filename = filename
+        self.node_type = build_node_type(topology) if topology else EMPTY_NODE_TYPE
+        self.job_id = None
+        self.steps = []
+
+    def parse_runs(self):
+        """
+        Parse the file and build one cluster and job per srun step.
+
+        Returns:
+            A list of tuples (title, cluster, job), title being the srun command line
+        """
+        self._scan(iter_log_lines(self.filename))
+        return [(step.title, *self._build_step(step)) for step in self.steps if step.rows]
+
+    def parse(self):
+        """Parse the file and return the cluster and job of its first step."""
+        runs = self.parse_runs()
+        if not runs:
+            return Cluster(), Job(id=self._job_id(), name=f"job_from_{os.path.basename(self.filename)}")
+        _, cluster, job = runs[0]
+        return cluster, job
+
+    def _scan(self, lines):
+        """
+        Collect the rows of every step in a single pass.
+
+        A step starts at each srun command line. Without srun lines, a new table
+        or node summary after some rows also starts a new (untitled) step.
+        """
+        step = None
+        last_host = None
+        last_rank = None
+        for line in lines:
+            if line.startswith('|'):
+                if TABLE_HEADER_PATTERN.match(line):
+                    if step is None or step.rows:
+                        step = self._new_step(None)
+                    last_host = last_rank = None
+                    continue
+                if step is None:
+                    step = self._new_step(None)
+                match = TABLE_ROW_PATTERN.match(line)
+                if not match:
+                    continue
+                host, rank_text, thread, affinity = match.groups()
+                # "----------" and ",," repeat the host and rank of the previous row
+                if not host.startswith('-'):
+                    last_host = host
+                if rank_text != ',,':
+                    last_rank = int(rank_text.split()[1])
+                if last_host is None or last_rank is None:
+                    continue
+                mask = _affinity_mask(affinity)
+                if mask is not None:
+                    step.rows.setdefault((last_rank, int(thread)), (last_host, mask))
+            elif line.startswith('Node'):
+                if step is None or (step.rows and line.startswith('Node summary')):
+                    step = self._new_step(None)
+                match = THREAD_LINE_PATTERN.match(line)
+                if match:
+                    node_number, rank, thread, affinity = match.groups()
+                    host = step.node_hosts.get(int(node_number), f"node{node_number}")
+                    mask = _affinity_mask(affinity)
+                    if mask is not None:
+                        step.rows.setdefault((int(rank), int(thread)), (host, mask))
+                    continue
+                match = NODE_HOST_PATTERN.match(line)
+                if match:
+                    step.node_hosts[int(match.group(1))] = match.group(2)
+            elif line.startswith('srun'):
+                match = SRUN_JOB_PATTERN.match(line)
+                if match:
+                    self.job_id = self.job_id or int(match.group(1))
+                elif line.startswith('srun '):
+                    step = self._new_step(line.strip())
+
+    def _new_step(self, title):
+        """Start a new step and return it."""
+        step = XthiStep(title)
+        self.steps.append(step)
+        return step
+
+    def _job_id(self):
+        """Return the job id printed by srun, or the last number of the filename (e.g. 2024_12_06-lumi-8649458.out)."""
+        if self.job_id is not None:
+            return self.job_id
+        numbers = re.findall(r'\d+', os.path.basename(self.filename))
+        return int(numbers[-1]) if numbers else 1
+
+    def _build_step(self, step):
+        """
+        Build the cluster and job of one step.
+
+        Returns:
+            A tuple (cluster, job)
+        """
+        cluster = Cluster()
+        nodes = {}
+        tasks = {}
+        step_number = self.steps.index(step) + 1
+        job = Job(id=self._job_id(), name=f"job_from_{os.path.basename(self.filename)}_step{step_number}")
+
+        for (rank, thread_id), (host, mask) in step.rows.items():
+            node = nodes.get(host)
+            if node is None:
+                node = nodes[host] = Node(name=host, node_type=self.node_type)
+                cluster.nodes.append(node)
+            task = tasks.get(rank)
+            if task is None:
+                task = tasks[rank] = MPITask(id=rank, node=node, logical_cpus=[])
+                job.mpi_tasks.append(task)
+            thread = OpenMPThread(id=thread_id, logical_cpus=[])
+            thread.cpu_set = CpuSet(mask)
+            task.openmp_threads.append(thread)
+            task.bind_cpus(thread.cpu_set)
+
+        job.mpi_tasks.sort(key=lambda task: task.id)
+        return cluster, job
+
+def main():
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} <xthi_output_file>")
+        sys.exit(1)
+
+    for title, cluster, job in XthiParser(sys.argv[1]).parse_runs():
+        print(f"\n=============== {title or 'xthi run'} ===============")
+        print_run(cluster, job, show_detailed_cpu=False)
+
+if __name__ == "__main__":
+    main()